@@ -0,0 +1,60 @@
+"""Sampled and radius-limited betweenness on the synthetic street grid.
+
+The former calculateAccessibility listed every origin/destination pair and
+asked for each shortest path. Times the Brandes engine exactly (every
+source), sampled (ANALYSIS_SAMPLES sources) and sampled within an 800 m
+walking radius, and reports how well the sampled edge counts follow the
+exact ones where both were run.
+
+Run from the repository root:
+    python -m benchmarks.bench_betweenness
+"""
+import time
+
+import numpy as np
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, roads_response
+from utils.utils_graph import RoadGraph
+from utils.utils_network import ANALYSIS_SAMPLES, betweenness
+from utils.utils_overpass import OsmElements
+from utils.utils_pyproj import createCRS
+
+RADII = [300, 500, 1000]
+EXACT_MAX_NODES = 1500
+WALK = 800.0
+
+
+def _time(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    print(
+        f"{'radius':>7} {'nodes':>7} {'edges':>7} {'mode':>8} {'time s':>8} "
+        f"{'corr':>6}"
+    )
+    for radius in RADII:
+        elements = OsmElements.from_features(roads_response(radius)["elements"])
+        graph = RoadGraph.from_elements(elements, createCRS(CENTER_LAT, CENTER_LON))
+        runs = [
+            ("sampled", lambda: betweenness(graph, ANALYSIS_SAMPLES)),
+            ("walk", lambda: betweenness(graph, ANALYSIS_SAMPLES, radius=WALK)),
+        ]
+        exact = None
+        if graph.node_count <= EXACT_MAX_NODES:
+            runs.insert(0, ("exact", lambda: betweenness(graph)))
+        for mode, fn in runs:
+            elapsed, (_, edges) = _time(fn)
+            if mode == "exact":
+                exact = edges
+            corr = np.corrcoef(edges, exact)[0, 1] if exact is not None else np.nan
+            print(
+                f"{radius:>7} {graph.node_count:>7} {graph.edge_count:>7} {mode:>8} "
+                f"{elapsed:8.3f} {corr:6.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Columnar element store against the former per-feature dicts.
+
+Builds both representations from the same dense-city Overpass body and
+reports the time, the memory still held afterwards and the time to resolve
+every way's nodes to coordinates.
+
+Run from the repository root:
+    python -m benchmarks.bench_element_store
+"""
+import gc
+import json
+import time
+import tracemalloc
+
+from tests.overpass_fixtures import combined_response
+from utils.utils_overpass import CHUNK_SIZE, OsmElements, iterElements
+
+RADII = [500, 1000, 2000]
+DENSE_SPACING = 20.0
+
+
+def _dicts(body: bytes):
+    # the representation getBuildings/getRoads used to build per response
+    data = json.loads(body)
+    nodes, ways, tags = [], [], []
+    for feature in data["elements"]:
+        if feature["type"] == "way":
+            ways.append({"id": feature["id"], "nodes": feature["nodes"]})
+            tags.append(dict(feature.get("tags", {})))
+        elif feature["type"] == "node":
+            nodes.append({"id": feature["id"], "lat": feature["lat"], "lon": feature["lon"]})
+    return nodes, ways, tags
+
+
+def _resolve_dicts(store):
+    nodes, ways, _ = store
+    index = {n["id"]: (n["lon"], n["lat"]) for n in nodes}
+    return sum(len([index[i] for i in w["nodes"] if i in index]) for w in ways)
+
+
+def _store(body: bytes):
+    chunks = (body[i : i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+    return OsmElements.from_features(iterElements(chunks))
+
+
+def _resolve_store(store: OsmElements):
+    rows = store.node_rows(store.way_refs)
+    return int((rows >= 0).sum())
+
+
+def _measure(build, resolve, body):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = build(body)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    resolved = resolve(store)
+    return elapsed, held / 1e6, peak / 1e6, time.perf_counter() - start, resolved
+
+
+def main():
+    print(
+        f"{'radius':>7} {'repr':>7} {'build s':>8} {'held MB':>8} "
+        f"{'peak MB':>8} {'resolve s':>10}"
+    )
+    for radius in RADII:
+        body = json.dumps(combined_response(radius, DENSE_SPACING)).encode()
+        dicts = _measure(_dicts, _resolve_dicts, body)
+        store = _measure(_store, _resolve_store, body)
+        assert dicts[4] == store[4]
+        for name, m in [("dicts", dicts), ("store", store)]:
+            print(
+                f"{radius:>7} {name:>7} {m[0]:8.3f} {m[1]:8.1f} {m[2]:8.1f} {m[3]:10.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Batched footprint extrusion against the former per-building loop.
+
+Extrudes the buildings of a dense synthetic city once with the list based
+extrusion getBuildings used before, once per building from the shared
+buffers and once as a single merged mesh. Reports the extrusion time, the
+number of objects serialized for the buildings layer and their payload.
+
+Run from the repository root:
+    python -m benchmarks.bench_extrusion
+"""
+import time
+
+from specklepy.api import operations
+from specklepy.objects import Base
+from specklepy.objects.geometry import Mesh
+from specklepy.objects.other import Collection
+from specklepy.transports.memory import MemoryTransport
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, buildings_response
+from utils.utils_extrusion import Footprints, extrudeFootprints
+from utils.utils_osm import fix_orientation, getWayCoords
+from utils.utils_other import COLOR_BLD
+from utils.utils_overpass import OsmElements
+from utils.utils_pyproj import createCRS
+
+RADII = [250, 500, 1000]
+DENSE_SPACING = 20.0
+
+
+def _footprints(radius: float):
+    elements = OsmElements.from_features(
+        buildings_response(radius, DENSE_SPACING)["elements"]
+    )
+    coords = elements.node_coords(createCRS(CENTER_LAT, CENTER_LON))
+    rings = [
+        getWayCoords(elements.way_nodes(row)[:-1], elements, coords)
+        for row in elements.way_rows("building")
+    ]
+    return rings, [9.0] * len(rings)
+
+
+def _legacy(coords, height):
+    # extrudeBuildings before the batched engine
+    coords = coords.tolist()
+    vertices, faces, colors = [], [], []
+    idx = list(range(len(coords)))
+    for c in coords:
+        vertices.extend([c[0], c[1], 0])
+        colors.append(COLOR_BLD)
+    idx, inverse = fix_orientation([tuple(c) for c in coords], idx)
+    faces.extend([len(coords)] + idx)
+    idx = list(range(len(coords), 2 * len(coords)))
+    for c in coords:
+        vertices.extend([c[0], c[1], height])
+        colors.append(COLOR_BLD)
+    idx, inverse = fix_orientation([tuple(c) for c in coords], idx)
+    idx.reverse()
+    faces.extend([len(coords)] + idx)
+    for i, c in enumerate(coords):
+        n = coords[(i + 1) % len(coords)]
+        first = len(vertices) // 3
+        faces.extend([4, first, first + 1, first + 2, first + 3])
+        if inverse is False:
+            quad = [c[0], c[1], 0, c[0], c[1], height]
+            quad += [n[0], n[1], height, n[0], n[1], 0]
+        else:
+            quad = [c[0], c[1], 0, n[0], n[1], 0]
+            quad += [n[0], n[1], height, c[0], c[1], height]
+        vertices.extend(quad)
+        colors.extend([COLOR_BLD] * 4)
+    obj = Mesh.create(faces=faces, vertices=vertices, colors=colors)
+    obj.units = "m"
+    return obj
+
+
+def _payload(elements):
+    transport = MemoryTransport()
+    layer = Collection(
+        elements=elements, units="m", name="Context", collectionType="BuildingsLayer"
+    )
+    operations.serialize(layer, [transport])
+    return len(transport.objects), sum(len(o) for o in transport.objects.values())
+
+
+def main():
+    print(
+        f"{'radius':>7} {'buildings':>10} {'mode':>9} {'extrude s':>10} "
+        f"{'objects':>8} {'payload MB':>11}"
+    )
+    for radius in RADII:
+        rings, heights = _footprints(radius)
+
+        start = time.perf_counter()
+        legacy = [_legacy(r, h) for r, h in zip(rings, heights)]
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        split = extrudeFootprints(Footprints.from_rings(rings, heights)).meshes()
+        split_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        merged = extrudeFootprints(Footprints.from_rings(rings, heights)).merged()
+        merged_s = time.perf_counter() - start
+
+        for mode, elapsed, elements in [
+            ("legacy", legacy_s, [Base(units="m", displayValue=[m]) for m in legacy]),
+            ("split", split_s, [Base(units="m", displayValue=[m]) for m in split]),
+            ("merged", merged_s, [Base(units="m", displayValue=[merged])]),
+        ]:
+            objects, size = _payload(elements)
+            print(
+                f"{radius:>7} {len(rings):>10} {mode:>9} {elapsed:10.3f} "
+                f"{objects:>8} {size / 1e6:11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Scaling of OSM way resolution against the query radius.
+
+Compares the former linear scan over the ``nodes`` list with the node index
+used by ``getBuildings``/``getRoads``, on the synthetic Overpass building
+fixture. The linear scan skips reprojection entirely, the indexed timing
+includes the batched reprojection of all nodes.
+
+Run from the repository root:
+    python -m benchmarks.bench_node_lookup
+"""
+import time
+from typing import List
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, buildings_response
+from utils.utils_osm import getWayCoords
+from utils.utils_overpass import OsmElements
+from utils.utils_pyproj import createCRS
+
+RADII = [100, 200, 300, 400, 500, 750, 1000, 1500, 2000]
+MAX_LINEAR_RADIUS = 400
+
+
+def _parse(data: dict):
+    nodes = [e for e in data["elements"] if e["type"] == "node"]
+    ways = [e["nodes"] for e in data["elements"] if e["type"] == "way"]
+    return nodes, ways
+
+
+def _linear_lookup(nodes: List[dict], ways: List[list]):
+    # the way resolution getBuildings used before the node index
+    coords = []
+    for ids in ways:
+        way_coords = []
+        for k, y in enumerate(ids):
+            if k == len(ids) - 1:
+                continue
+            for n, z in enumerate(nodes):
+                if ids[k] == nodes[n]["id"]:
+                    way_coords.append({"x": nodes[n]["lon"], "y": nodes[n]["lat"]})
+                    break
+        coords.append(way_coords)
+    return coords
+
+
+def _indexed_lookup(nodes: List[dict], ways: List[list], crs):
+    elements = OsmElements.from_features(nodes)
+    node_coords = elements.node_coords(crs)
+    return [getWayCoords(ids[:-1], elements, node_coords) for ids in ways]
+
+
+def main():
+    crs = createCRS(CENTER_LAT, CENTER_LON)
+    print(f"{'radius':>7} {'nodes':>8} {'ways':>7} {'linear s':>10} {'index s':>10}")
+    for radius in RADII:
+        nodes, ways = _parse(buildings_response(radius))
+
+        linear = "-"
+        if radius <= MAX_LINEAR_RADIUS:
+            start = time.perf_counter()
+            expected = _linear_lookup(nodes, ways)
+            linear = f"{time.perf_counter() - start:10.4f}"
+
+        start = time.perf_counter()
+        result = _indexed_lookup(nodes, ways, crs)
+        indexed = time.perf_counter() - start
+
+        if radius <= MAX_LINEAR_RADIUS:
+            assert [len(c) for c in result] == [len(c) for c in expected]
+        print(f"{radius:>7} {len(nodes):>8} {len(ways):>7} {linear:>10} {indexed:10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Warm-cache fetch time against radius.
+
+The "network" is an in-process fake returning the synthetic building +
+highway response, so the cold column is a lower bound: real Overpass
+round trips add seconds to minutes on top.
+
+Run from the repository root:
+    python -m benchmarks.bench_overpass_cache
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, combined_response
+from tests.overpass_stub import FakeResponse
+from utils.utils_cache import OverpassCache
+from utils.utils_overpass import fetchElements
+
+RADII = [250, 500, 1000, 2000]
+
+
+def main():
+    print(f"{'radius':>7} {'MB json':>8} {'MB gz':>7} {'cold s':>8} {'warm s':>8}")
+    for radius in RADII:
+        data = combined_response(radius)
+        body = json.dumps(data).encode()
+        requests.get = lambda *args, **kwargs: FakeResponse(data, 1 << 16)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = OverpassCache(Path(directory))
+
+            start = time.perf_counter()
+            fetchElements(CENTER_LAT, CENTER_LON, radius, None, cache, None)
+            cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            fetchElements(CENTER_LAT, CENTER_LON, radius, None, cache, None)
+            warm = time.perf_counter() - start
+
+            stored = sum(p.stat().st_size for p in Path(directory).iterdir())
+        print(
+            f"{radius:>7} {len(body) / 1e6:8.2f} {stored / 1e6:7.2f} "
+            f"{cold:8.3f} {warm:8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
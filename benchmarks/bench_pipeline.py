@@ -0,0 +1,189 @@
+"""Stage timings of the context pipeline on small, medium and dense cities.
+
+Serves the recorded synthetic Overpass responses of tests.overpass_fixtures
+from the local Overpass stub and runs the steps of main one by one, timing
+each stage on its own:
+
+    fetch          HTTP round trip to the stub, response bytes only
+    parse          streamed JSON decoding into OsmElements
+    reprojection   node coordinates to the local CRS
+    features       building footprints and road lines from the elements
+    extrusion      buildings extruded and merged into one mesh
+    buffering      road surfaces from the buffered lines
+    assembly       layer Collections, repeated road pieces shared
+    serialization  version root written to an in-memory transport
+
+Every scenario runs REPEATS times and the fastest time of each stage is
+reported. The fetch includes the stub filtering the response in Python.
+``--save`` writes the timings to a JSON file; ``--compare`` reads such a
+file and marks the stages that got more than TOLERANCE times and MIN_DELTA
+seconds slower, exiting with status 1 if any did.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline [--save FILE] [--compare FILE]
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict
+
+import requests
+from specklepy.objects import Base
+from specklepy.objects.other import Collection
+from specklepy.transports.memory import MemoryTransport
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, combined_response
+from tests.overpass_stub import OverpassStub
+from utils.utils_cache import quantizeBbox, tileBbox
+from utils.utils_extrusion import extrudeFootprints
+from utils.utils_osm import buildingFootprints, roadLines
+from utils.utils_overpass import CHUNK_SIZE, OsmElements, iterElements, overpassQuery
+from utils.utils_pyproj import createCRS, getBbox
+from utils.utils_roads import roadSurfaces
+from utils.utils_speckle import GeometryIndex, sendObject, shareGeometry
+
+SCENARIOS = [("small", 150, 30.0), ("medium", 500, 30.0), ("dense", 500, 15.0)]
+STAGES = [
+    "fetch",
+    "parse",
+    "reprojection",
+    "features",
+    "extrusion",
+    "buffering",
+    "assembly",
+    "serialization",
+]
+KEYWORDS = ["building", "highway"]
+REPEATS = 3
+TOLERANCE = 1.5  # slowdown ratio flagged by --compare
+MIN_DELTA = 0.05  # s, smaller slowdowns are timer noise
+
+
+def _run(url: str, radius: float) -> Dict[str, float]:
+    times = {}
+    start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        times[stage] = now - start
+        start = now
+
+    bbox = tileBbox(quantizeBbox(getBbox(CENTER_LAT, CENTER_LON, radius)))
+    query = overpassQuery(bbox, KEYWORDS)
+    body = requests.get(url, params={"data": query}).content
+    lap("fetch")
+
+    elements = OsmElements()
+    chunks = (body[k : k + CHUNK_SIZE] for k in range(0, len(body), CHUNK_SIZE))
+    for element in iterElements(chunks):
+        elements.add(element)
+    lap("parse")
+
+    nodeCoords = elements.node_coords(createCRS(CENTER_LAT, CENTER_LON))
+    lap("reprojection")
+
+    footprints = buildingFootprints(
+        elements,
+        nodeCoords,
+        elements.way_rows("building"),
+        elements.tagged_relations("building"),
+    )
+    roads, lines, widths = roadLines(
+        elements,
+        nodeCoords,
+        elements.way_rows("highway"),
+        elements.tagged_relations("highway"),
+    )
+    lap("features")
+
+    buildings = [extrudeFootprints(footprints).merged()]
+    lap("extrusion")
+
+    meshes = [m for m in roadSurfaces(lines, widths) if m is not None]
+    lap("buffering")
+
+    root = Collection(
+        elements=[
+            Collection(
+                elements=[Base(units="m", displayValue=buildings)],
+                units="m",
+                name="Context",
+                collectionType="BuildingsLayer",
+            ),
+            Collection(
+                elements=roads, units="m", name="Context", collectionType="RoadsLayer"
+            ),
+            Collection(
+                elements=shareGeometry(meshes),
+                units="m",
+                name="Context",
+                collectionType="RoadMeshesLayer",
+            ),
+        ],
+        units="m",
+        name="Context",
+        collectionType="BuildingsLayer",
+    )
+    lap("assembly")
+
+    sendObject(root, [MemoryTransport()], GeometryIndex())
+    lap("serialization")
+    return times
+
+
+def measure() -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, radius, spacing in SCENARIOS:
+        with OverpassStub(combined_response(radius, spacing)) as stub:
+            runs = [_run(stub.url, radius) for _ in range(REPEATS)]
+        results[name] = {s: min(run[s] for run in runs) for s in STAGES}
+    return results
+
+
+def _seconds(timings: Dict[str, float], stage: str) -> float:
+    return sum(timings.values()) if stage == "total" else timings.get(stage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", help="write the timings to this JSON file")
+    parser.add_argument("--compare", help="compare with timings saved before")
+    args = parser.parse_args()
+
+    results = measure()
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    slower = []
+    header = f"{'stage':>14}" + "".join(f"{name:>16}" for name, _, _ in SCENARIOS)
+    print(header)
+    for stage in STAGES + ["total"]:
+        row = f"{stage:>14}"
+        for name, _, _ in SCENARIOS:
+            seconds = _seconds(results[name], stage)
+            before = _seconds(baseline[name], stage) if name in baseline else None
+            mark = ""
+            if before:
+                ratio = seconds / before
+                mark = f" {ratio:4.2f}x"
+                flagged = ratio > TOLERANCE and seconds - before > MIN_DELTA
+                if flagged and stage != "total":
+                    mark += "!"
+                    slower.append((name, stage))
+            row += f"{seconds:>10.3f}{mark:<6}"
+        print(row)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if slower:
+        print("slower than baseline: " + ", ".join(f"{n}/{s}" for n, s in slower))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""BVH ray casting against the per-face projectToPolygon loop.
+
+Casts a fan of rays from street level into the synthetic city blocks. The
+former path tests every ray against every face, one face at a time; the
+engine builds a BVH over all building triangles and intersects rays in
+NumPy batches. Distances of both are
+compared on the block where the legacy loop is still affordable.
+
+Run from the repository root:
+    python -m benchmarks.bench_raycast
+"""
+import time
+
+import numpy as np
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, buildings_response
+from utils.utils_osm import getBuildings
+from utils.utils_overpass import OsmElements
+from utils.utils_raycast import Bvh, castRays
+from utils.utils_visibility import getAllPlanes, projectToPolygon
+
+RADII = [60, 250, 1000]
+LEGACY_MAX_RADIUS = 60
+ORIGIN = np.array([24.0, 22.0, 1.5])  # street crossing
+
+
+def _fan(step: float) -> np.ndarray:
+    azimuth, elevation = np.meshgrid(
+        np.deg2rad(np.arange(0, 360, step)), np.deg2rad(np.arange(0, 60, step))
+    )
+    azimuth, elevation = azimuth.ravel(), elevation.ravel()
+    return np.column_stack(
+        [
+            np.cos(azimuth) * np.cos(elevation),
+            np.sin(azimuth) * np.cos(elevation),
+            np.sin(elevation),
+        ]
+    )
+
+
+def _legacy(meshes, directions):
+    nearest = np.full(len(directions), np.inf)
+    vectors = list(ORIGIN + directions)
+    for index, face in enumerate(getAllPlanes(meshes)):
+        points, _ = projectToPolygon(list(ORIGIN), vectors, {}, face, index)
+        for p in points:
+            nearest[p.vectorId] = min(nearest[p.vectorId], p.distance)
+    return nearest
+
+
+def _time(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    print(
+        f"{'radius':>7} {'tris':>8} {'rays':>7} {'mode':>7} {'time s':>8} "
+        f"{'hits':>7} {'max diff':>9}"
+    )
+    for radius in RADII:
+        elements = OsmElements.from_features(buildings_response(radius)["elements"])
+        meshes = getBuildings(CENTER_LAT, CENTER_LON, radius, elements)
+        build, bvh = _time(lambda: Bvh.from_meshes(meshes))
+        tris = bvh.triangles.count
+        print(f"{radius:>7} {tris:>8} {'':>7} {'build':>7} {build:8.3f}")
+        for step in [5, 1, 0.5]:
+            directions = _fan(step)
+            elapsed, hits = _time(lambda: castRays(bvh, ORIGIN, directions))
+            diff = ""
+            if radius <= LEGACY_MAX_RADIUS and step == 5:
+                legacy_time, nearest = _time(lambda: _legacy(meshes, directions))
+                found = np.isfinite(nearest)
+                print(
+                    f"{radius:>7} {tris:>8} {len(directions):>7} {'legacy':>7} "
+                    f"{legacy_time:8.3f} {int(found.sum()):>7}"
+                )
+                diff = f"{np.abs(hits.distance[found] - nearest[found]).max():9.1e}"
+            print(
+                f"{radius:>7} {tris:>8} {len(directions):>7} {'bvh':>7} "
+                f"{elapsed:8.3f} {int(hits.hit.sum()):>7} {diff:>9}"
+            )
+
+
+if __name__ == "__main__":
+    np.seterr(all="ignore")
+    main()
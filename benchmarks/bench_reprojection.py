@@ -0,0 +1,48 @@
+"""Per-node reprojection with a fresh transformer against one batched call.
+
+Run from the repository root:
+    python -m benchmarks.bench_reprojection
+"""
+import time
+
+import numpy as np
+from pyproj import Transformer
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, buildings_response
+from utils.utils_overpass import OsmElements
+from utils.utils_pyproj import createCRS
+
+RADII = [100, 250, 500, 1000, 2000]
+MAX_PER_NODE = 3000
+
+
+def _per_node(nodes, crs):
+    # what reprojectToCrs did for every node before the transformer cache
+    coords = []
+    for n in nodes[:MAX_PER_NODE]:
+        transformer = Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+        coords.append(transformer.transform(n["lon"], n["lat"]))
+    return np.array(coords)
+
+
+def main():
+    crs = createCRS(CENTER_LAT, CENTER_LON)
+    print(f"{'radius':>7} {'nodes':>8} {'per node s':>11} {'batched s':>10}")
+    for radius in RADII:
+        nodes = [e for e in buildings_response(radius)["elements"] if e["type"] == "node"]
+
+        start = time.perf_counter()
+        expected = _per_node(nodes, crs)
+        # extrapolate, a fresh transformer per node costs the same every time
+        per_node = (time.perf_counter() - start) * len(nodes) / len(expected)
+
+        start = time.perf_counter()
+        coords = OsmElements.from_features(nodes).node_coords(crs)
+        batched = time.perf_counter() - start
+
+        assert np.allclose(coords[: len(expected)], expected)
+        print(f"{radius:>7} {len(nodes):>8} {per_node:11.3f} {batched:10.4f}")
+
+
+if __name__ == "__main__":
+    main()
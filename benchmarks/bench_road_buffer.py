@@ -0,0 +1,81 @@
+"""Batched road surfaces against the former per-road GeoJSON path.
+
+Buffers the street centerlines of a dense synthetic city one LineString at
+a time through to_geojson/json.loads, as roadBuffer did, and in a single
+vectorized shapely call, with and without merging overlapping buffers.
+
+Run from the repository root:
+    python -m benchmarks.bench_road_buffer
+"""
+import json
+import time
+
+import numpy as np
+from shapely import LineString, buffer, to_geojson
+from specklepy.objects import Base
+from specklepy.objects.geometry import Mesh
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, roads_response
+from utils.utils_osm import fix_orientation, getWayCoords
+from utils.utils_other import COLOR_ROAD
+from utils.utils_overpass import OsmElements
+from utils.utils_pyproj import createCRS
+from utils.utils_roads import roadSurfaces
+
+RADII = [500, 1000, 2000]
+DENSE_SPACING = 20.0
+
+
+def _lines(radius: float):
+    elements = OsmElements.from_features(
+        roads_response(radius, DENSE_SPACING)["elements"]
+    )
+    coords = elements.node_coords(createCRS(CENTER_LAT, CENTER_LON))
+    rows = elements.way_rows("highway")
+    lines = [getWayCoords(elements.way_nodes(r), elements, coords) for r in rows]
+    widths = [12 if elements.way_tags(r)["highway"] == "primary" else 2 for r in rows]
+    return lines, widths
+
+
+def _legacy(coords, value):
+    # roadBuffer before the batched builder
+    area = json.loads(to_geojson(buffer(LineString(coords), value, cap_style="square")))
+    vertices, colors, tuples = [], [], []
+    for i, c in enumerate(area["coordinates"][0]):
+        if i != len(area["coordinates"][0]) - 1:
+            vertices.extend(c + [0])
+            tuples.append(c)
+            colors.append(COLOR_ROAD)
+    faces, _ = fix_orientation(tuples, list(range(len(tuples))))
+    faces.reverse()
+    mesh = Mesh.create(vertices=vertices, colors=colors, faces=[len(tuples)] + faces)
+    mesh.units = "m"
+    return Base(units="m", displayValue=[mesh], width=2 * value)
+
+
+def _time(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    print(f"{'radius':>7} {'roads':>7} {'mode':>8} {'time s':>8} {'surfaces':>9}")
+    for radius in RADII:
+        lines, widths = _lines(radius)
+        runs = [
+            ("legacy", lambda: [_legacy(c, w) for c, w in zip(lines, widths)]),
+            ("batched", lambda: roadSurfaces(lines, widths)),
+            ("union", lambda: roadSurfaces(lines, widths, union=True)),
+        ]
+        for mode, fn in runs:
+            elapsed, surfaces = _time(fn)
+            print(
+                f"{radius:>7} {len(lines):>7} {mode:>8} {elapsed:8.3f} "
+                f"{len(surfaces):>9}"
+            )
+
+
+if __name__ == "__main__":
+    np.seterr(all="ignore")
+    main()
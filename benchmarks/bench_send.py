@@ -0,0 +1,90 @@
+"""Bytes written per context version, stock send against shared geometry.
+
+Builds the buildings, roads and road mesh layers of the synthetic city the
+way main does and writes them to a metered in-memory server: once with the
+stock serializer, once with repeated road pieces shared and geometry stored
+by content key, and once more as a rerun that rebuilds every object but
+reuses the geometry IDs of the first run. ``written`` is what the sender
+serializes and offers to the server, ``new`` the part the server does not
+have yet and has to upload after its diff.
+
+Run from the repository root:
+    python -m benchmarks.bench_send
+"""
+import time
+
+from specklepy.objects import Base
+from specklepy.objects.other import Collection
+from specklepy.serialization.base_object_serializer import BaseObjectSerializer
+from specklepy.transports.memory import MemoryTransport
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, combined_response
+from utils.utils_osm import getBuildings, getRoads
+from utils.utils_overpass import OsmElements
+from utils.utils_speckle import (
+    GeometryIndex,
+    MeteredTransport,
+    sendObject,
+    shareGeometry,
+)
+
+RADII = [300, 600]
+
+
+def _layers(elements, radius, shared):
+    blds = getBuildings(CENTER_LAT, CENTER_LON, radius, elements, merged=True)
+    roads, meshes, _ = getRoads(CENTER_LAT, CENTER_LON, radius, elements)
+    if shared:
+        meshes = shareGeometry(meshes)
+    return Collection(
+        elements=[
+            Collection(elements=[Base(units="m", displayValue=blds)]),
+            Collection(elements=roads),
+            Collection(elements=meshes),
+        ],
+        units="m",
+    )
+
+
+def _send(server, root, geometry=None):
+    metered = MeteredTransport(MemoryTransport())
+    start = time.perf_counter()
+    if geometry is None:
+        BaseObjectSerializer(write_transports=[metered]).traverse_base(root)
+    else:
+        sendObject(root, [metered], geometry)
+    seconds = time.perf_counter() - start
+    new = {k: v for k, v in metered.transport.objects.items() if k not in server}
+    server.update(new)
+    uploaded = sum(len(v.encode()) for v in new.values())
+    return metered.objects, metered.bytes, uploaded, seconds
+
+
+def main():
+    print(
+        f"{'radius':>7} {'send':>8} {'objects':>8} {'written kB':>11} "
+        f"{'new kB':>8} {'s':>7}"
+    )
+    for radius in RADII:
+        elements = OsmElements.from_features(combined_response(radius)["elements"])
+        index = GeometryIndex()
+        runs = [
+            ("stock", {}, _layers(elements, radius, False), None),
+            ("shared", {}, _layers(elements, radius, True), index),
+            ("rerun", None, _layers(elements, radius, True), None),
+        ]
+        server = {}
+        for name, fresh, root, geometry in runs:
+            if name == "rerun":
+                geometry = GeometryIndex(known=dict(index.used))
+            else:
+                server = fresh
+            objects, written, uploaded, seconds = _send(server, root, geometry)
+            print(
+                f"{radius:>7} {name:>8} {objects:>8} {written / 1e3:>11.1f} "
+                f"{uploaded / 1e3:>8.1f} {seconds:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
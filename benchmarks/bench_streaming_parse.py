@@ -0,0 +1,45 @@
+"""Peak memory and time of decoding an Overpass body at once or streamed.
+
+Run from the repository root:
+    python -m benchmarks.bench_streaming_parse
+"""
+import json
+import time
+import tracemalloc
+
+from tests.overpass_fixtures import combined_response
+from utils.utils_overpass import CHUNK_SIZE, OsmElements, iterElements
+
+RADII = [250, 500, 1000, 2000]
+
+
+def _chunks(body: bytes):
+    for i in range(0, len(body), CHUNK_SIZE):
+        yield body[i : i + CHUNK_SIZE]
+
+
+def _measure(parse):
+    tracemalloc.start()
+    start = time.perf_counter()
+    parse()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main():
+    print(f"{'radius':>7} {'MB body':>8} {'full s':>7} {'full MB':>8} {'stream s':>9} {'stream MB':>10}")
+    for radius in RADII:
+        body = json.dumps(combined_response(radius)).encode()
+
+        full = _measure(lambda: OsmElements.from_features(json.loads(body)["elements"]))
+        streamed = _measure(lambda: OsmElements.from_features(iterElements(_chunks(body))))
+        print(
+            f"{radius:>7} {len(body) / 1e6:8.2f} {full[0]:7.3f} {full[1]:8.1f} "
+            f"{streamed[0]:9.3f} {streamed[1]:10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
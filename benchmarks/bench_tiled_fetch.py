@@ -0,0 +1,44 @@
+"""Single Overpass query against a concurrently fetched tile grid.
+
+Uses the local Overpass stub from the tests with a latency of a fixed part
+per request plus a part proportional to the answer size. The numbers show the
+effect of overlapping round trips, not real server load behaviour; on the
+public server the bigger win is that small tiles stay under its timeout.
+
+Run from the repository root:
+    python -m benchmarks.bench_tiled_fetch
+"""
+import os
+import time
+
+import utils.utils_overpass as utils_overpass
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, combined_response
+from tests.overpass_stub import OverpassStub
+from utils.utils_overpass import fetchElements
+
+RADIUS = 1000
+LATENCY = 0.3
+PER_ELEMENT = 50e-6
+CONFIGS = [(None, 1), (500, 1), (500, 2), (500, 4), (250, 4), (250, 8)]
+
+
+def main():
+    os.environ["OVERPASS_CACHE_DIR"] = "off"
+    with OverpassStub(combined_response(RADIUS), LATENCY, PER_ELEMENT) as stub:
+        utils_overpass.OVERPASS_URL = stub.url
+        print(f"{'tile m':>7} {'workers':>8} {'requests':>9} {'ways':>7} {'s':>7}")
+        for tile_meters, workers in CONFIGS:
+            before = len(stub.queries)
+            start = time.perf_counter()
+            elements = fetchElements(
+                CENTER_LAT, CENTER_LON, RADIUS, None, None, tile_meters, workers
+            )
+            elapsed = time.perf_counter() - start
+            print(
+                f"{str(tile_meters):>7} {workers:>8} {len(stub.queries) - before:>9} "
+                f"{len(elements.way_ids):>7} {elapsed:7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
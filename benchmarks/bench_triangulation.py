@@ -0,0 +1,75 @@
+"""Throughput of the roof and floor triangulation.
+
+Triangulates the footprints of a dense synthetic city (rectangles and
+convex pentagons, fanned in one vectorized pass) and a set of concave L-,
+U- and courtyard footprints of 6 to 40 vertices that go through ear
+clipping, and reports footprints and triangles per second.
+
+Run from the repository root:
+    python -m benchmarks.bench_triangulation
+"""
+import time
+
+import numpy as np
+
+from benchmarks.bench_extrusion import _footprints
+from utils.utils_extrusion import Footprints
+from utils.utils_triangulation import triangulateRings
+
+RADIUS = 1000
+CONCAVE = 5000
+
+
+def _concave(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    outers, holes = [], []
+    for i in range(count):
+        w, h = rng.uniform(10, 40, 2)
+        kind = i % 3
+        if kind == 0:  # L
+            ring = [[0, 0], [w, 0], [w, h / 2], [w / 2, h / 2], [w / 2, h], [0, h]]
+        elif kind == 1:  # U with a jagged inner side
+            teeth = int(rng.integers(3, 18))
+            inner = [[w * 0.7, h * (1 - k / teeth)] for k in range(teeth)]
+            inner = [[x + (k % 2) * 1.5, y] for k, (x, y) in enumerate(inner)]
+            ring = [[0, 0], [w, 0], [w, h]] + inner
+            ring += [[w * 0.3, h * 0.3], [w * 0.3, h], [0, h]]
+        else:  # block with a courtyard
+            ring = [[0, 0], [w, 0], [w, h], [0, h]]
+        angle = rng.uniform(0, np.pi)
+        cos, sin = np.cos(angle), np.sin(angle)
+        rot = np.array([[cos, -sin], [sin, cos]])
+        offset = rng.uniform(-1000, 1000, 2)
+        outers.append(np.asarray(ring) @ rot.T + offset)
+        court = np.array([[0.3, 0.3], [0.3, 0.7], [0.7, 0.7], [0.7, 0.3]]) * [w, h]
+        holes.append([court @ rot.T + offset] if kind == 2 else [])
+    return Footprints.from_rings(outers, [9.0] * count, holes)
+
+
+def _run(name: str, fp: Footprints, repeat: int = 3):
+    fp = fp.oriented()
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tris, _ = triangulateRings(
+            fp.coords, fp.ring_offsets, fp.ring_building, fp.ring_hole
+        )
+        best = min(best, time.perf_counter() - start)
+    print(
+        f"{name:>9} {fp.count:>10} {len(tris):>10} {best:8.3f} "
+        f"{fp.count / best:>12.0f} {len(tris) / best:>12.0f}"
+    )
+
+
+def main():
+    print(
+        f"{'set':>9} {'footprints':>10} {'triangles':>10} {'time s':>8} "
+        f"{'footprint/s':>12} {'triangle/s':>12}"
+    )
+    rings, heights = _footprints(RADIUS)
+    _run("city", Footprints.from_rings(rings, heights))
+    _run("concave", _concave(CONCAVE))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Linear way splitting against the former recursive fillList.
+
+Splits the street ways of a dense synthetic city, and a set of long ways
+that loop over the same nodes, with fillList as splitWaysByIntersection
+used it and with splitWays. fillList only cut ways at repeated nodes and
+kept scanning after every recursive cut, so its time grows exponentially
+with the length of a looping way. On the city it does less work than
+splitWays, which also cuts at junctions between ways.
+
+Run from the repository root:
+    python -m benchmarks.bench_way_split
+"""
+import sys
+import time
+from copy import copy
+
+import numpy as np
+
+from tests.overpass_fixtures import roads_response
+from utils.utils_graph import splitWays
+from utils.utils_overpass import OsmElements
+
+RADII = [500, 1000, 2000]
+DENSE_SPACING = 20.0
+LOOP_LENGTHS = [200, 400, 600]  # fillList time doubles every ~50 nodes
+
+
+def _fillList(vals, lsts):
+    # utils_other.fillList before the linear splitter
+    if len(vals) > 1:
+        lsts.append([])
+    else:
+        return
+    for i, v in enumerate(vals):
+        if v not in lsts[len(lsts) - 1]:
+            lsts[len(lsts) - 1].append(v)
+        else:
+            if len(lsts[len(lsts) - 1]) <= 1:
+                lsts.pop(len(lsts) - 1)
+            vals = copy(vals[i - 1 :])
+            _fillList(vals, lsts)
+    return lsts
+
+
+def _legacy(ways):
+    out = []
+    for ids in ways:
+        if len(set(ids)) < len(ids):
+            out.extend(_fillList(ids, []))
+        else:
+            out.append(ids)
+    return out
+
+
+def _linear(ways):
+    offsets = np.concatenate([[0], np.cumsum([len(w) for w in ways])])
+    return splitWays(offsets, np.concatenate(ways))
+
+
+def _time(fn, ways):
+    start = time.perf_counter()
+    try:
+        fn(ways)
+    except RecursionError:
+        return "recursion"
+    return f"{time.perf_counter() - start:.4f}"
+
+
+def main():
+    print(f"{'input':>16} {'ways':>7} {'fillList s':>11} {'splitWays s':>12}")
+    for radius in RADII:
+        elements = OsmElements.from_features(
+            roads_response(radius, DENSE_SPACING)["elements"]
+        )
+        rows = elements.way_rows("highway")
+        ways = [elements.way_nodes(r).tolist() for r in rows]
+        print(
+            f"{f'city r={radius}':>16} {len(ways):>7} {_time(_legacy, ways):>11} "
+            f"{_time(_linear, ways):>12}"
+        )
+    for length in LOOP_LENGTHS:
+        loop = np.arange(50)
+        ways = [list(np.tile(loop + 100 * k, length // 50)) for k in range(20)]
+        print(
+            f"{f'loops n={length}':>16} {len(ways):>7} {_time(_legacy, ways):>11} "
+            f"{_time(_linear, ways):>12}"
+        )
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(1000)
+    main()
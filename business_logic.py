@@ -3,7 +3,7 @@ import requests
 from attrs import define
 from specklepy.objects import Base
 
-from utils.utils_pyproj import create_coordinate_reference_system, reprojectToCrs
+from utils.utils_pyproj import createCRS, reprojectToCrs
 
 
 @define
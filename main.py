@@ -3,6 +3,8 @@
 use the automation_context module to wrap your function in an Autamate context helper
 """
 # from flatten import flatten_base
+from typing import Optional, Tuple
+
 import numpy as np
 from attrs import define
 from pydantic import Field
@@ -11,11 +13,30 @@ from speckle_automate import (
     AutomationContext,
     execute_automate_function,
 )
+from specklepy.logging.exceptions import SpeckleException
 from specklepy.objects import Base
 from specklepy.objects.other import Collection
+from specklepy.transports.server import ServerTransport
 
-from utils.utils_osm import getBuildings, getRoads
+from business_logic import get_project_location
+from utils.utils_incremental import (
+    ContextRecords,
+    ContextState,
+    contextKey,
+    incrementalContext,
+)
+from utils.utils_osm import extrudedBuildings, getRoads
 from utils.utils_other import RESULT_BRANCH
+from utils.utils_overpass import fetchElements
+from utils.utils_speckle import (
+    GeometryIndex,
+    MeteredTransport,
+    ObjectIdCache,
+    SentObject,
+    sendObject,
+    shareGeometry,
+)
+from utils.utils_visibility import EYE_HEIGHT, visibilityLayer
 
 
 class FunctionInputs(AutomateBase):
@@ -32,6 +53,158 @@ class FunctionInputs(AutomateBase):
             "Radius from the Model location," " derived from Revit model lat, lon."
         ),
     )
+    visibility_analysis: bool = Field(
+        default=False,
+        title="Visibility analysis",
+        description=(
+            "Add a layer of the building surfaces visible from the Model location"
+            " and its sky-view factor."
+        ),
+    )
+    road_analysis: bool = Field(
+        default=False,
+        title="Road analysis",
+        description=(
+            "Add a layer of the road segments colored by how much through-movement"
+            " they carry."
+        ),
+    )
+    incremental_update: bool = Field(
+        default=False,
+        title="Incremental update",
+        description=(
+            "Only rebuild the parts of the context whose OpenStreetMap data changed"
+            " since the last run for this project and location. Needs"
+            " CONTEXT_STATE_DIR to point at storage that persists between runs."
+        ),
+    )
+
+
+def ensure_result_branch(automate_context: AutomationContext, project_id: str) -> str:
+    """ID of the result branch, created if needed."""
+    existing_branch = automate_context.speckle_client.branch.get(
+        project_id, RESULT_BRANCH, 1
+    )
+    if existing_branch is None:
+        return automate_context.speckle_client.branch.create(
+            stream_id=project_id, name=RESULT_BRANCH, description=""
+        )
+    return existing_branch.id
+
+
+def set_result_view(automate_context: AutomationContext, br_id: str) -> None:
+    automate_context._automation_result.result_view = f"{automate_context.automation_run_data.speckle_server_url}/projects/{automate_context.automation_run_data.project_id}/models/{automate_context.automation_run_data.model_id},{br_id}"
+
+
+def create_version_of_object(
+    automate_context: AutomationContext,
+    object_id: str,
+    model_id: str,
+    model_name: str,
+    version_message: str,
+) -> str:
+    """AutomationContext.create_new_version_in_project for an object already sent.
+
+    The SDK method sends the root object itself, which cannot write the
+    references of a reference-aware send. This one takes the ID of the sent
+    root and keeps the SDK's checks.
+    """
+    run_data = automate_context.automation_run_data
+    if model_id == run_data.model_id:
+        raise ValueError(
+            f"The target model id: {model_id} cannot match the model id"
+            f" that triggered this automation: {run_data.model_id}"
+        )
+
+    version_id = automate_context.speckle_client.commit.create(
+        stream_id=run_data.project_id,
+        object_id=object_id,
+        branch_name=model_name,
+        message=version_message,
+        source_application="SpeckleAutomate",
+    )
+    if isinstance(version_id, SpeckleException):
+        raise version_id
+    # the SDK has no public way to report a version it did not create
+    automate_context._automation_result.result_versions.append(version_id)
+    return version_id
+
+
+@define
+class VersionSender:
+    """Sends the objects of one version, reusing geometry sent to the project before."""
+
+    automate_context: AutomationContext
+    project_id: str
+    server: MeteredTransport
+    cache: Optional[ObjectIdCache]
+    geometry: GeometryIndex
+
+    @classmethod
+    def from_context(cls, automate_context: AutomationContext) -> "VersionSender":
+        project_id = automate_context.automation_run_data.project_id
+        cache = ObjectIdCache.from_env()
+        server = ServerTransport(project_id, automate_context.speckle_client)
+        geometry = GeometryIndex()
+        if cache is not None:
+            geometry = cache.load(server.url, project_id)
+            geometry.verify(server)
+        return cls(
+            automate_context=automate_context,
+            project_id=project_id,
+            server=MeteredTransport(server),
+            cache=cache,
+            geometry=geometry,
+        )
+
+    def send(self, obj: Base) -> SentObject:
+        return sendObject(obj, [self.server], self.geometry)
+
+    def create_version(self, root: Base, model_id: str, message: str) -> str:
+        """Send the root and create a version of it on the result branch."""
+        root_id, _ = self.send(root)
+        version_id = create_version_of_object(
+            self.automate_context, root_id, model_id, RESULT_BRANCH, message
+        )
+        if self.cache is not None:
+            self.cache.save(self.server.transport.url, self.project_id, self.geometry)
+        return version_id
+
+    def summary(self) -> str:
+        return f"sent {self.server.objects} objects, {self.server.bytes} bytes"
+
+
+def send_incremental_version(
+    sender: VersionSender,
+    function_inputs: FunctionInputs,
+    elements,
+    lat: float,
+    lon: float,
+    model_id: str,
+) -> Tuple[int, int]:
+    """Send the context reusing the objects of unchanged tiles from the last run.
+
+    Returns how many tiles were rebuilt and how many reused.
+    """
+    radius = function_inputs.radius_in_meters
+    visibility = function_inputs.visibility_analysis
+    analysis = function_inputs.road_analysis
+
+    state = ContextState.from_env()
+    key = contextKey(lat, lon, radius, visibility, analysis)
+    server = sender.server.transport.url
+    previous = ContextRecords(key)
+    if state is not None:
+        previous = state.load(server, sender.project_id, key)
+        previous.verify(sender.server)
+
+    context = incrementalContext(
+        lat, lon, radius, elements, previous, sender.send, visibility, analysis
+    )
+    sender.create_version(context.root, model_id, "Context from Automate")
+    if state is not None:
+        state.save(server, sender.project_id, context.records)
+    return context.rebuilt, context.reused
 
 
 def automate_function(
@@ -55,61 +228,102 @@ def automate_function(
 
         project_location = get_project_location(base)
 
-        blds = getBuildings(
-            project_location.latitude,
-            project_location.longitude,
-            function_inputs.radius_in_meters,
+        lat = project_location.latitude
+        lon = project_location.longitude
+
+        # one Overpass round trip for both layers
+        elements = fetchElements(
+            lat, lon, function_inputs.radius_in_meters, ["building", "highway"]
         )
-        bases = [Base(units="m", displayValue=[b]) for b in blds]
+
+        sender = VersionSender.from_context(automate_context)
+        if function_inputs.incremental_update:
+            br_id = ensure_result_branch(automate_context, project_id)
+            rebuilt, reused = send_incremental_version(
+                sender, function_inputs, elements, lat, lon, br_id
+            )
+            set_result_view(automate_context, br_id)
+            automate_context.mark_run_success(
+                f"Created 3D context: rebuilt {rebuilt} tiles, reused {reused},"
+                f" {sender.summary()}"
+            )
+            return
+
+        # all buildings as one merged mesh instead of thousands of small objects
+        radius = function_inputs.radius_in_meters
+        extruded = extrudedBuildings(lat, lon, radius, elements)
         bldObj = Collection(
-            elements=bases, units="m", name="Context", collectionType="BuildingsLayer"
+            elements=[Base(units="m", displayValue=[extruded.merged()])],
+            units="m",
+            name="Context",
+            collectionType="BuildingsLayer",
         )
 
         roads, meshes, analysisMeshes = getRoads(
-            lat, lon, function_inputs.radius_in_meters
+            lat,
+            lon,
+            function_inputs.radius_in_meters,
+            elements,
+            analysis=function_inputs.road_analysis,
         )
         roadObj = Collection(
             elements=roads, units="m", name="Context", collectionType="RoadsLayer"
         )
+        # repeated road pieces share one definition
         roadMeshObj = Collection(
-            elements=meshes, units="m", name="Context", collectionType="RoadMeshesLayer"
+            elements=shareGeometry(meshes),
+            units="m",
+            name="Context",
+            collectionType="RoadMeshesLayer",
+        )
+        analysisObj = Collection(
+            elements=analysisMeshes,
+            units="m",
+            name="Context",
+            collectionType="RoadAnalysisLayer",
         )
 
         commitObj = Collection(
             elements=[], units="m", name="Context", collectionType="BuildingsLayer"
         )
 
+        if function_inputs.visibility_analysis:
+            # separate building meshes, so the one at the location can be ignored
+            visibility = visibilityLayer(
+                extruded.meshes(),
+                [[0, 0, EYE_HEIGHT]],
+                function_inputs.radius_in_meters,
+            )
+            visibilityObj = Collection(
+                elements=[visibility],
+                units="m",
+                name="Context",
+                collectionType="VisibilityLayer",
+            )
+
         # add objects to new Collection
         commitObj.elements.append(bldObj)
         commitObj.elements.append(roadObj)
         commitObj.elements.append(roadMeshObj)
+        if function_inputs.road_analysis:
+            commitObj.elements.append(analysisObj)
+        if function_inputs.visibility_analysis:
+            commitObj.elements.append(visibilityObj)
 
         # create branch if needed
-        existing_branch = automate_context.speckle_client.branch.get(
-            project_id, RESULT_BRANCH, 1
-        )
-        if existing_branch is None:
-            br_id = automate_context.speckle_client.branch.create(
-                stream_id=project_id, name=RESULT_BRANCH, description=""
-            )
-        else:
-            br_id = existing_branch.id
+        br_id = ensure_result_branch(automate_context, project_id)
         # commitObj.elements.append(base)
 
         print(f"Branch_id={br_id}")
         # print(f"CommitObj={commitObj}")
 
-        automate_context.create_new_version_in_project(
-            commitObj, br_id, "Context from Automate"
-        )
-        print(
-            f"Created id={automate_context._automation_result.result_versions[len(automate_context._automation_result.result_versions)-1]}"
-        )
+        version_id = sender.create_version(commitObj, br_id, "Context from Automate")
+        print(f"Created id={version_id}")
         # automate_context.compose_result_view()
-        automate_context._automation_result.result_view = f"{automate_context.automation_run_data.speckle_server_url}/projects/{automate_context.automation_run_data.project_id}/models/{automate_context.automation_run_data.model_id},{br_id}"
+        set_result_view(automate_context, br_id)
         # https://latest.speckle.systems/
 
-        automate_context.mark_run_success("Created 3D context")
+        automate_context.mark_run_success(f"Created 3D context: {sender.summary()}")
     except Exception as ex:
         automate_context.mark_run_failed(f"Failed to create 3d context cause: {ex}")
 
@@ -0,0 +1,197 @@
+"""Synthetic Overpass responses for tests and benchmarks.
+
+The generated payloads mimic what overpass-api.de returns for the
+``[out:json]; (...); out body; >; out skel qt;`` queries used in
+``utils.utils_osm``: tagged ways and relations first, followed by the
+untagged nodes and way parts pulled in by the recursion. Generation is
+deterministic, so a given (radius, spacing) pair always yields the same
+"recorded" response.
+"""
+import math
+from typing import Dict, List
+
+CENTER_LAT = 52.5200
+CENTER_LON = 13.4050
+
+METERS_PER_DEGREE = 111320.0
+
+
+def _to_lat_lon(x: float, y: float, lat: float, lon: float) -> tuple[float, float]:
+    d_lat = y / METERS_PER_DEGREE
+    d_lon = x / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+    return lat + d_lat, lon + d_lon
+
+
+class _ElementWriter:
+    def __init__(self, lat: float, lon: float, id_offset: int = 0):
+        self.lat = lat
+        self.lon = lon
+        self.tagged: List[dict] = []
+        self.parts: List[dict] = []
+        self.nodes: Dict[int, dict] = {}
+        self._next_node = 1 + id_offset
+        self._next_way = 1_000_000 + id_offset
+        self._next_relation = 5_000_000 + id_offset
+        self._node_at: Dict[tuple, int] = {}
+
+    def node(self, x: float, y: float, shared: bool = False) -> int:
+        key = (round(x, 3), round(y, 3))
+        if shared and key in self._node_at:
+            return self._node_at[key]
+        node_id = self._next_node
+        self._next_node += 1
+        lat, lon = _to_lat_lon(x, y, self.lat, self.lon)
+        self.nodes[node_id] = {"type": "node", "id": node_id, "lat": lat, "lon": lon}
+        if shared:
+            self._node_at[key] = node_id
+        return node_id
+
+    def way(self, node_ids: List[int], tags: dict | None = None) -> int:
+        way_id = self._next_way
+        self._next_way += 1
+        way = {"type": "way", "id": way_id, "nodes": node_ids}
+        if tags is not None:
+            way["tags"] = tags
+            self.tagged.append(way)
+        else:
+            self.parts.append(way)
+        return way_id
+
+    def relation(self, members: List[dict], tags: dict) -> int:
+        rel_id = self._next_relation
+        self._next_relation += 1
+        self.tagged.append(
+            {"type": "relation", "id": rel_id, "members": members, "tags": tags}
+        )
+        return rel_id
+
+    def response(self) -> dict:
+        return {
+            "version": 0.6,
+            "generator": "Overpass API (synthetic fixture)",
+            "elements": self.tagged + self.parts + list(self.nodes.values()),
+        }
+
+
+def _building_tags(index: int) -> dict:
+    if index % 7 == 0:
+        return {"building": "yes", "height": str(12 + index % 5 * 3)}
+    if index % 5 == 0:
+        return {"building": "apartments", "building:levels": str(2 + index % 6)}
+    if index % 13 == 0:
+        return {"building": "roof", "layer": "-1"}
+    return {"building": "yes"}
+
+
+def buildings_response(
+    radius: float,
+    spacing: float = 30.0,
+    lat: float = CENTER_LAT,
+    lon: float = CENTER_LON,
+) -> dict:
+    """Overpass ``building`` response for a square of half-size ``radius``.
+
+    Buildings sit on a regular grid with ``spacing`` metres between
+    footprints. Every 5th footprint has an extra vertex, and every 40th
+    building is a multipolygon relation whose outer ring is split into two
+    untagged way parts (optionally with a courtyard inner ring).
+    """
+    w = _ElementWriter(lat, lon)
+    steps = max(1, int(radius // spacing))
+    size = spacing * 0.6
+    index = 0
+    for i in range(-steps, steps):
+        for j in range(-steps, steps):
+            x0, y0 = i * spacing, j * spacing
+            x1, y1 = x0 + size, y0 + size * 0.8
+            tags = _building_tags(index)
+            if index % 40 == 39:
+                a = w.node(x0, y0)
+                b = w.node(x1, y0)
+                c = w.node(x1, y1)
+                d = w.node(x0, y1)
+                first = w.way([a, b, c])
+                second = w.way([c, d, a])
+                members = [
+                    {"type": "way", "ref": first, "role": "outer"},
+                    {"type": "way", "ref": second, "role": "outer"},
+                ]
+                if index % 80 == 79:
+                    m = size * 0.3
+                    h = [
+                        w.node(x0 + m, y0 + m),
+                        w.node(x1 - m, y0 + m),
+                        w.node(x1 - m, y1 - m),
+                        w.node(x0 + m, y1 - m),
+                    ]
+                    inner = w.way(h + [h[0]])
+                    members.append({"type": "way", "ref": inner, "role": "inner"})
+                w.relation(members, dict(tags, type="multipolygon"))
+            else:
+                ring = [w.node(x0, y0), w.node(x1, y0)]
+                if index % 5 == 0:
+                    ring.append(w.node(x1 + size * 0.2, (y0 + y1) / 2))
+                ring += [w.node(x1, y1), w.node(x0, y1)]
+                w.way(ring + [ring[0]], tags)
+            index += 1
+    return w.response()
+
+
+def roads_response(
+    radius: float,
+    spacing: float = 30.0,
+    lat: float = CENTER_LAT,
+    lon: float = CENTER_LON,
+) -> dict:
+    """Overpass ``highway`` response: a street grid between the building rows.
+
+    Streets share their nodes at every crossing, each street is split into
+    ways of three blocks, every 4th street is ``primary``/``secondary`` and
+    there is one closed ring road and one ``area=yes`` plaza relation.
+    """
+    w = _ElementWriter(lat, lon, id_offset=100_000_000)
+    steps = max(1, int(radius // spacing))
+    offset = -spacing * 0.2
+    coords = [k * spacing + offset for k in range(-steps, steps + 1)]
+    classes = ["primary", "residential", "secondary", "residential"]
+    for axis in (0, 1):
+        for s, fixed in enumerate(coords):
+            highway = classes[s % len(classes)]
+            ids = [
+                w.node(*((fixed, c) if axis == 0 else (c, fixed)), shared=True)
+                for c in coords
+            ]
+            for k in range(0, len(ids) - 1, 3):
+                w.way(ids[k : k + 4], {"highway": highway})
+    # a roundabout-like closed ring road around the center
+    ring = [
+        w.node(spacing * 0.4 * math.cos(a), spacing * 0.4 * math.sin(a))
+        for a in [k * math.pi / 6 for k in range(12)]
+    ]
+    w.way(ring + [ring[0]], {"highway": "tertiary", "junction": "roundabout"})
+    # a pedestrian plaza mapped as an area relation
+    p = [w.node(x, y) for x, y in [(0, 0), (6, 0), (6, 6), (0, 6)]]
+    outer = w.way(p + [p[0]])
+    w.relation(
+        [{"type": "way", "ref": outer, "role": "outer"}],
+        {"highway": "pedestrian", "area": "yes", "type": "multipolygon"},
+    )
+    return w.response()
+
+
+def combined_response(
+    radius: float,
+    spacing: float = 30.0,
+    lat: float = CENTER_LAT,
+    lon: float = CENTER_LON,
+) -> dict:
+    """Union ``building`` + ``highway`` response, as one Overpass query returns it."""
+    buildings = buildings_response(radius, spacing, lat, lon)["elements"]
+    roads = roads_response(radius, spacing, lat, lon)["elements"]
+    first = [e for e in buildings + roads if e["type"] != "node"]
+    nodes = [e for e in buildings + roads if e["type"] == "node"]
+    return {
+        "version": 0.6,
+        "generator": "Overpass API (synthetic fixture)",
+        "elements": first + nodes,
+    }
@@ -0,0 +1,149 @@
+"""A local stand-in for the Overpass interpreter endpoint.
+
+Serves a fixture response filtered to the bbox and keywords of each query,
+the way overpass-api.de answers ``(node/way/relation[k](bbox)); out body;
+>; out skel qt;``: matching tagged elements first, then the way parts and
+nodes they reference.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import parse_qs, urlparse
+
+BBOX = re.compile(r"\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)")
+KEYWORD = re.compile(r'way\["([^"]+)"\]')
+
+
+def filter_response(data: dict, query: str) -> dict:
+    south, west, north, east = [float(v) for v in BBOX.search(query).groups()]
+    keywords = set(KEYWORD.findall(query))
+
+    nodes = {e["id"]: e for e in data["elements"] if e["type"] == "node"}
+    ways = {e["id"]: e for e in data["elements"] if e["type"] == "way"}
+
+    def inside(node_id: int) -> bool:
+        n = nodes.get(node_id)
+        return n is not None and south <= n["lat"] <= north and west <= n["lon"] <= east
+
+    def way_inside(way: dict) -> bool:
+        return any(inside(i) for i in way["nodes"])
+
+    matched = []
+    for e in data["elements"]:
+        if not keywords.intersection(e.get("tags", {})):
+            continue
+        if e["type"] == "way" and way_inside(e):
+            matched.append(e)
+        elif e["type"] == "relation" and any(
+            m["type"] == "way" and m["ref"] in ways and way_inside(ways[m["ref"]])
+            for m in e["members"]
+        ):
+            matched.append(e)
+        elif e["type"] == "node" and inside(e["id"]):
+            matched.append(e)
+
+    matched_ids = {(e["type"], e["id"]) for e in matched}
+    parts = []
+    for e in matched:
+        if e["type"] != "relation":
+            continue
+        for m in e["members"]:
+            if m["type"] == "way" and ("way", m["ref"]) not in matched_ids:
+                matched_ids.add(("way", m["ref"]))
+                parts.append(ways[m["ref"]])
+
+    node_ids = []
+    for w in matched + parts:
+        if w["type"] == "way":
+            node_ids.extend(w["nodes"])
+    skel = [
+        {"type": "node", "id": i, "lat": nodes[i]["lat"], "lon": nodes[i]["lon"]}
+        for i in dict.fromkeys(node_ids)
+        if i in nodes
+    ]
+    return {"version": 0.6, "elements": matched + parts + skel}
+
+
+class FakeResponse:
+    """In-process replacement for the streamed ``requests`` response."""
+
+    def __init__(self, data: dict, chunk_size: int = 4096):
+        self.content = json.dumps(data).encode()
+        self._chunk_size = chunk_size
+
+    def __enter__(self) -> "FakeResponse":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def iter_content(self, chunk_size: int = 1):
+        size = self._chunk_size or chunk_size
+        for i in range(0, len(self.content), size):
+            yield self.content[i : i + size]
+
+
+class OverpassStub:
+    """Threaded HTTP server answering Overpass queries from a fixture.
+
+    ``delay`` seconds per request plus ``per_element`` seconds per returned
+    element are slept to mimic server latency, which on overpass-api.de grows
+    with the size of the answer. The queries received and the peak number of
+    concurrent requests are recorded.
+    """
+
+    def __init__(self, data: dict, delay: float = 0.0, per_element: float = 0.0):
+        self.data = data
+        self.delay = delay
+        self.per_element = per_element
+        self.queries: List[str] = []
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)["data"][0]
+                with stub._lock:
+                    stub.queries.append(query)
+                    stub._in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub._in_flight)
+                try:
+                    response = filter_response(stub.data, query)
+                    elements = len(response["elements"])
+                    time.sleep(stub.delay + stub.per_element * elements)
+                    body = json.dumps(response).encode()
+                finally:
+                    with stub._lock:
+                        stub._in_flight -= 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/interpreter"
+
+    def __enter__(self) -> "OverpassStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
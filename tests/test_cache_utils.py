@@ -0,0 +1,113 @@
+import os
+import time
+
+import pytest
+import requests
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, buildings_response
+from tests.overpass_stub import FakeResponse
+from utils.utils_cache import OverpassCache, quantizeBbox, splitTiles, tileBbox
+from utils.utils_overpass import fetchElements
+
+
+@pytest.fixture()
+def counting_overpass(monkeypatch):
+    calls = []
+
+    def get(url, params, **kwargs):
+        calls.append(params["data"])
+        return FakeResponse(buildings_response(60))
+
+    monkeypatch.setattr(requests, "get", get)
+    return calls
+
+
+def test_quantized_bbox_covers_the_original():
+    bbox = (52.51234, 13.40012, 52.52345, 13.41099)
+
+    south, west, north, east = tileBbox(quantizeBbox(bbox))
+
+    assert (south, west, north, east) == (52.512, 13.4, 52.524, 13.411)
+    assert quantizeBbox((52.51201, 13.40001, 52.5233, 13.4109)) == quantizeBbox(bbox)
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = OverpassCache(tmp_path)
+    key = OverpassCache.key((1, 2, 3, 4), ["highway", "building"], 1)
+
+    assert cache.get(key) is None
+    cache.put(key, b'{"elements": []}')
+
+    assert key == "v1_building+highway_1_2_3_4"
+    assert cache.get(key) == b'{"elements": []}'
+
+
+def test_cache_entries_expire(tmp_path):
+    cache = OverpassCache(tmp_path, ttl_seconds=60)
+    cache.put("a", b"1")
+    path = tmp_path / "a.json.gz"
+    old = time.time() - 120
+    os.utime(path, (old, old))
+
+    assert cache.get("a") is None
+    assert not path.exists()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = OverpassCache(tmp_path, max_bytes=10**9)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, os.urandom(100))
+        t = time.time() - 100 + i
+        os.utime(tmp_path / f"{key}.json.gz", (t, t))
+    cache.get("a")  # "b" is now the least recently used entry
+
+    cache.max_bytes = 2 * (tmp_path / "a.json.gz").stat().st_size
+    cache.evict()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.json.gz", "c.json.gz"]
+
+
+def test_cache_evicts_stale_temporary_files(tmp_path):
+    cache = OverpassCache(tmp_path, ttl_seconds=60)
+    stale = tmp_path / "a.json.tmp11-22"
+    stale.write_bytes(b"partial")
+    old = time.time() - 120
+    os.utime(stale, (old, old))
+    writer = cache.writer("b")
+    writer.write(b"in progress")
+
+    cache.evict()
+
+    assert not stale.exists()
+    assert [p.name for p in tmp_path.iterdir()] == [writer._tmp.name]
+    writer.abort()
+
+
+def test_repeated_fetch_is_served_from_cache(tmp_path, counting_overpass):
+    cache = OverpassCache(tmp_path)
+
+    first = fetchElements(CENTER_LAT, CENTER_LON, 60, ["building"], cache)
+    second = fetchElements(CENTER_LAT + 1e-5, CENTER_LON, 60, ["building"], cache)
+    fetchElements(CENTER_LAT, CENTER_LON, 60, ["highway"], cache)
+
+    assert len(counting_overpass) == 2
+    assert second.way_refs.tolist() == first.way_refs.tolist()
+
+
+def test_split_tiles_covers_the_range_with_shared_borders():
+    grid = splitTiles((0, 10, 9, 20), 2)
+
+    assert grid == [(0, 10, 4, 15), (0, 15, 4, 20), (4, 10, 9, 15), (4, 15, 9, 20)]
+    assert splitTiles((0, 0, 1, 1), 5) == [(0, 0, 1, 1)]
+    assert splitTiles((3, 3, 3, 3), 2) == [(3, 3, 3, 3)]
+
+
+def test_responses_with_a_remark_are_not_cached(tmp_path, monkeypatch):
+    partial = dict(buildings_response(60), remark="runtime error: Query timed out")
+    monkeypatch.setattr(requests, "get", lambda *args, **kwargs: FakeResponse(partial))
+    cache = OverpassCache(tmp_path)
+
+    elements = fetchElements(CENTER_LAT, CENTER_LON, 60, ["building"], cache)
+
+    assert len(elements.way_ids) > 0
+    assert list(tmp_path.iterdir()) == []
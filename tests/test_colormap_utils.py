@@ -0,0 +1,33 @@
+import numpy as np
+
+from utils.utils_colormap import JET, colorize, segmentLut
+
+
+def _rgb(argb):
+    return [(int(c) >> 16 & 255, int(c) >> 8 & 255, int(c) & 255) for c in argb]
+
+
+def test_jet_runs_from_dark_blue_to_dark_red():
+    assert JET.shape == (256, 3)
+    assert tuple(JET[0]) == (0, 0, 127)
+    assert tuple(JET[-1]) == (127, 0, 0)
+    assert tuple(JET[128]) == (124, 255, 121)
+
+
+def test_values_are_scaled_to_the_maximum_and_packed_opaque():
+    colors = colorize(np.array([0.0, 5.0, 10.0]))
+
+    assert (colors >> 24 == 255).all()
+    assert _rgb(colors) == [tuple(JET[0]), tuple(JET[128]), tuple(JET[-1])]
+
+
+def test_gamma_out_of_range_and_missing_values():
+    grey = segmentLut((((0, 0), (1, 1)),) * 3, size=5)
+
+    colors = colorize([-1, np.nan, 0.25, 4], maxValue=1, gamma=0.5, lut=grey)
+
+    assert _rgb(colors) == [(0, 0, 0), (0, 0, 0), (127, 127, 127), (255, 255, 255)]
+
+
+def test_all_zero_values_take_the_lowest_color():
+    assert _rgb(colorize(np.zeros(3))) == [tuple(JET[0])] * 3
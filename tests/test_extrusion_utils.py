@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from utils.utils_extrusion import Footprints, extrudeFootprints
+
+SQUARE_CW = np.array([[0, 0], [0, 1], [1, 1], [1, 0]], dtype=float)
+COURTYARD = np.array([[0.3, 0.3], [0.7, 0.3], [0.7, 0.7], [0.3, 0.7]])
+
+
+def _faces(flat):
+    faces, i = [], 0
+    while i < len(flat):
+        faces.append(list(flat[i + 1 : i + 1 + flat[i]]))
+        i += flat[i] + 1
+    return faces
+
+
+def _normals(mesh):
+    vertices = np.array(mesh.vertices).reshape(-1, 3)
+    normals = []
+    for face in _faces(mesh.faces):
+        p = vertices[face]
+        n = np.zeros(3)
+        for a, b in zip(p, np.roll(p, -1, axis=0)):  # Newell's method
+            n += np.cross(a, b)
+        area = np.linalg.norm(n) / 2
+        normals.append((n / (2 * area), p.mean(axis=0), area))
+    return normals
+
+
+def test_rings_are_oriented_outer_ccw_inner_cw():
+    fp = Footprints.from_rings([SQUARE_CW], [3], [[COURTYARD]]).oriented()
+
+    outer, inner = fp.coords[:4], fp.coords[4:]
+    def signed(r):
+        return np.sum(r[:, 0] * np.roll(r[:, 1], -1) - np.roll(r[:, 0], -1) * r[:, 1])
+
+    assert signed(outer) > 0
+    assert signed(inner) < 0
+
+
+def test_prism_faces_point_outwards_and_into_courtyard():
+    fp = Footprints.from_rings([SQUARE_CW], [3], [[COURTYARD]])
+    mesh = extrudeFootprints(fp).merged()
+    center = np.array([0.5, 0.5, 1.5])
+
+    faces = _normals(mesh)
+    floor = [f for f in faces if f[1][2] == 0]
+    roof = [f for f in faces if f[1][2] == 3]
+    walls = [f for f in faces if 0 < f[1][2] < 3]
+    # floor and roof are triangulated around the courtyard
+    for cap, up in [(floor, -1), (roof, 1)]:
+        assert all(f[0] == pytest.approx([0, 0, up]) for f in cap)
+        assert sum(f[2] for f in cap) == pytest.approx(1 - 0.4 * 0.4)
+    assert len(walls) == 8
+    for n, c, _ in walls[:4]:
+        assert np.dot(n, c - center) > 0
+    for n, c, _ in walls[4:]:
+        assert np.dot(n, c - center) < 0
+
+
+def test_per_building_meshes_match_merged_buffers():
+    fp = Footprints.from_rings(
+        [SQUARE_CW, SQUARE_CW + 5, np.zeros((2, 2)), SQUARE_CW[::-1] - 5],
+        [3, 9, 1, 6],
+        [[], [COURTYARD + 5], [], []],
+    )
+    extruded = extrudeFootprints(fp)
+    meshes = extruded.meshes()
+    merged = extruded.merged()
+
+    assert [len(m.vertices) // 3 for m in meshes] == [24, 48, 0, 24]
+    assert sum((m.vertices for m in meshes), []) == merged.vertices
+    offset = 0
+    rebased = []
+    for m in meshes:
+        rebased += [[i + offset for i in f] for f in _faces(m.faces)]
+        offset += len(m.vertices) // 3
+    assert rebased == _faces(merged.faces)
+    assert max(np.array(meshes[1].vertices)[2::3]) == 9
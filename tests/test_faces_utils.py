@@ -0,0 +1,194 @@
+import numpy as np
+import pytest
+from shapely.geometry import Point as ShapelyPoint
+from shapely.geometry import Polygon
+from specklepy.objects.geometry import Mesh
+
+from utils.utils_faces import (
+    FaceFrames,
+    MeshGeometry,
+    decodeFaces,
+    meshGeometries,
+    meshGeometry,
+    planeHits,
+)
+from utils.utils_visibility import containsPoint, getAllPlanes, projectToPolygon
+
+# L-shaped, concave, in the xy plane
+L_SHAPE = [[0, 0, 0], [4, 0, 0], [4, 1, 0], [1, 1, 0], [1, 3, 0], [0, 3, 0]]
+
+
+def _tilt(polygon, angle):
+    # rotate around the x axis and lift off the origin
+    c, s = np.cos(angle), np.sin(angle)
+    rotation = np.array([[1, 0, 0], [0, c, -s], [0, s, c]])
+    return (np.asarray(polygon, dtype=float) @ rotation.T + [5, -2, 3]).tolist()
+
+
+def test_frames_of_a_tilted_face():
+    face = _tilt(L_SHAPE, 0.7)
+
+    frames = FaceFrames.from_polygons([face])
+
+    assert frames.count == 1
+    assert np.abs(frames.normal[0]) == pytest.approx([0, np.sin(0.7), np.cos(0.7)])
+    assert frames.u[0] == pytest.approx([1, 0, 0])
+    assert frames.coords2d == pytest.approx(np.abs(np.asarray(L_SHAPE)[:, :2]))
+
+
+@pytest.mark.parametrize("angle", [0.0, 0.7, np.pi / 2])
+def test_concave_containment_matches_shapely(angle):
+    rng = np.random.default_rng(1)
+    xy = rng.uniform(-0.5, 4.5, size=(2000, 2))
+    points = _tilt(np.column_stack([xy, np.zeros(len(xy))]), angle)
+    frames = FaceFrames.from_polygons([_tilt(L_SHAPE, angle)])
+
+    inside = frames.contains(points, np.zeros(len(points), dtype=np.int64))
+
+    polygon = Polygon([p[:2] for p in L_SHAPE])
+    expected = [polygon.contains(ShapelyPoint(x, y)) for x, y in xy]
+    assert inside.tolist() == expected
+
+
+def test_points_are_paired_with_their_own_face():
+    square = [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]
+    wall = [[10, 0, 0], [12, 0, 0], [12, 0, 2], [10, 0, 2]]
+    frames = FaceFrames.from_polygons([square, L_SHAPE, wall])
+    points = [[0.5, 0.5, 0], [0.5, 0.5, 0], [2, 2, 0], [11, 0, 1], [0.5, 0.5, 0]]
+
+    inside = frames.contains(points, [0, 1, 1, 2, 2])
+
+    assert inside.tolist() == [True, True, False, True, False]
+
+
+def test_containment_is_chunked(monkeypatch):
+    monkeypatch.setattr("utils.utils_faces.PAIR_CHUNK", 7)
+    rng = np.random.default_rng(2)
+    xy = rng.uniform(-0.5, 4.5, size=(500, 2))
+    points = np.column_stack([xy, np.zeros(len(xy))])
+    frames = FaceFrames.from_polygons([L_SHAPE])
+    faces = np.zeros(len(points), dtype=np.int64)
+
+    chunked = frames.contains(points, faces)
+    monkeypatch.undo()
+
+    assert chunked.tolist() == frames.contains(points, faces).tolist()
+    assert containsPoint(np.array([0.5, 2.5, 0]), L_SHAPE)
+    assert not containsPoint(np.array([2.5, 2.5, 0]), L_SHAPE)
+
+
+def test_plane_hits_in_front_behind_and_parallel():
+    frames = FaceFrames.from_polygons([L_SHAPE])
+    origins = np.array([[0.5, 0.5, 2.0]])
+    directions = np.array([[0, 0, -1], [0, 0, 1], [1, 0, 0], [0.5, 0, -0.5]])
+
+    t = planeHits(origins, directions, frames, np.zeros(4, dtype=np.int64))
+
+    assert t[[0, 1, 3]].tolist() == [2.0, -2.0, 4.0]
+    assert np.isnan(t[2])
+
+
+def test_project_to_polygon_keeps_rays_in_front_of_the_point():
+    origin = [0.5, 0.5, 2.0]
+    ends = [[0.5, 0.5, 1.0], [0.5, 0.5, 3.0], [3.0, 3.0, 1.0], [0.5, 1.5, 1.0]]
+
+    hits, used = projectToPolygon(origin, ends, {3: 1}, L_SHAPE, 7)
+
+    assert [p.vectorId for p in hits] == [0, 3]
+    assert [p.meshId for p in hits] == [7, 7]
+    assert [p.distance for p in hits] == pytest.approx([2.0, np.hypot(2, 2)])
+    coords = np.array([[p.x, p.y, p.z] for p in hits])
+    assert coords == pytest.approx(np.array([[0.5, 0.5, 0], [0.5, 2.5, 0]]))
+    assert used == {0: 1, 3: 2}
+
+
+def _decode_one_by_one(faces):
+    decoded, i = [], 0
+    while i < len(faces):
+        n = {0: 3, 1: 4}.get(faces[i], faces[i])
+        decoded.append(faces[i + 1 : i + n + 1])
+        i += n + 1
+    return decoded
+
+
+def test_face_lists_are_decoded_in_bulk():
+    rng = np.random.default_rng(3)
+    faces = []
+    for _ in range(3000):
+        n = int(rng.integers(0, 9))
+        if n == 2:
+            continue
+        # vertex indices that look like counts must not be taken for them
+        faces += [n] + rng.integers(0, 12, {0: 3, 1: 4}.get(n, n)).tolist()
+
+    offsets, index = decodeFaces(faces)
+
+    decoded = [index[a:b].tolist() for a, b in zip(offsets[:-1], offsets[1:])]
+    assert decoded == _decode_one_by_one(faces)
+    assert decodeFaces([])[0].tolist() == [0]
+
+
+def _box_mesh():
+    vertices = [0, 0, 0, 2, 0, 0, 2, 1, 0, 0, 1, 0, 0, 0, 3, 2, 0, 3]
+    faces = [4, 0, 1, 2, 3, 4, 0, 1, 5, 4, 0, 2, 3, 4]
+    return Mesh.create(vertices=vertices, faces=faces)
+
+
+def test_mesh_geometry_faces_and_boxes():
+    geometry = meshGeometry(_box_mesh())
+
+    assert geometry.face_count == 3
+    assert geometry.polygons()[1] == [[0, 0, 0], [2, 0, 0], [2, 0, 3], [0, 0, 3]]
+    assert geometry.lo.tolist() == [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    assert geometry.hi.tolist() == [[2, 1, 0], [2, 0, 3], [2, 1, 3]]
+    assert [b.tolist() for b in geometry.bbox()] == [[0, 0, 0], [2, 1, 3]]
+    assert np.abs(geometry.frames.normal[:2]).tolist() == [[0, 0, 1], [0, 1, 0]]
+    assert geometry.triangles.tolist() == [
+        [0, 1, 2],
+        [0, 2, 3],
+        [0, 1, 5],
+        [0, 5, 4],
+        [2, 3, 4],
+    ]
+    assert getAllPlanes([_box_mesh()]) == geometry.polygons()
+
+
+def test_mesh_geometry_is_built_once_per_mesh():
+    mesh = _box_mesh()
+
+    first = meshGeometry(mesh)
+
+    assert meshGeometry(mesh) is first
+    mesh.faces = [3, 0, 1, 2]
+    assert meshGeometry(mesh) is not first
+    assert meshGeometry(mesh).face_count == 1
+
+
+def test_meshes_compiled_together_match_one_by_one():
+    triangle = Mesh.create(vertices=[5, 5, 5, 6, 5, 5, 5, 6, 5], faces=[0, 2, 1, 0])
+    empty = Mesh.create(vertices=[], faces=[])
+    meshes = [_box_mesh(), empty, triangle, _box_mesh()]
+
+    together = MeshGeometry.from_meshes(meshes)
+
+    for mesh, geometry in zip(meshes, together):
+        (alone,) = MeshGeometry.from_meshes([mesh])
+        assert geometry.polygons() == alone.polygons()
+        if mesh.faces:
+            assert geometry.triangles.tolist() == alone.triangles.tolist()
+            assert geometry.triangle_face.tolist() == alone.triangle_face.tolist()
+            assert geometry.frames.coords2d == pytest.approx(alone.frames.coords2d)
+    assert together[2].triangles.tolist() == [[2, 1, 0]]
+    assert meshGeometries(meshes)[1].face_count == 0
+
+
+def test_projection_against_prepared_frames():
+    frames = FaceFrames.from_polygons([_tilt(L_SHAPE, 0.3), L_SHAPE])
+    origin = [0.5, 0.5, 2.0]
+    ends = [[0.5, 0.5, 1.0], [0.5, 1.5, 1.0]]
+
+    prepared, _ = projectToPolygon(origin, ends, {}, L_SHAPE, 4, frames, 1)
+    single, _ = projectToPolygon(origin, ends, {}, L_SHAPE, 4)
+
+    assert [p.vectorId for p in prepared] == [p.vectorId for p in single] == [0, 1]
+    assert [p.distance for p in prepared] == [p.distance for p in single]
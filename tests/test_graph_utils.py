@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, roads_response
+from utils.utils_graph import RoadGraph, splitWays
+from utils.utils_overpass import OsmElements
+from utils.utils_pyproj import createCRS
+
+
+def _edges(ways, network=None):
+    offsets = np.concatenate([[0], np.cumsum([len(w) for w in ways])])
+    edge_offsets, edge_refs, edge_way = splitWays(
+        offsets, np.concatenate(ways), network
+    )
+    edges = [
+        edge_refs[a:b].tolist() for a, b in zip(edge_offsets[:-1], edge_offsets[1:])
+    ]
+    return edges, edge_way.tolist()
+
+
+def test_ways_are_split_at_shared_interior_nodes():
+    # 2 crosses the middle of way 0, way 1 continues way 0 at its end
+    edges, way = _edges([[1, 2, 3, 4], [4, 5], [6, 2, 7]])
+
+    assert edges == [[1, 2], [2, 3, 4], [4, 5], [6, 2], [2, 7]]
+    assert way == [0, 0, 1, 2, 2]
+
+
+def test_part_of_a_network_is_split_at_its_junctions_with_the_rest():
+    ways = [[1, 2, 3, 4], [4, 5], [6, 2, 7]]
+
+    edges, way = _edges(ways[:1], np.concatenate(ways))
+
+    assert edges == [[1, 2], [2, 3, 4]]
+    assert way == [0, 0]
+
+
+def test_loops_are_split_at_self_intersections():
+    edges, _ = _edges([[1, 2, 3, 4, 2, 5]])
+
+    assert edges == [[1, 2], [2, 3, 4, 2], [2, 5]]
+
+
+def test_closed_rings_without_junctions_stay_whole():
+    edges, _ = _edges([[1, 2, 3, 1], [7, 8]])
+
+    assert edges == [[1, 2, 3, 1], [7, 8]]
+
+
+def test_long_looping_way_is_split_without_recursion():
+    loop = np.tile(np.arange(1, 101), 1000)
+
+    edges, _ = _edges([loop])
+
+    # every interior node repeats, so every segment becomes an edge
+    assert len(edges) == len(loop) - 1
+    assert all(len(e) == 2 for e in edges)
+
+
+def _graph(ways, coords, classes=None):
+    offsets = np.concatenate([[0], np.cumsum([len(w) for w in ways])])
+    refs = np.concatenate(ways)
+    classes = classes or ["residential"] * len(ways)
+    names, way_class = np.unique(classes, return_inverse=True)
+    return RoadGraph.from_ways(
+        offsets,
+        refs,
+        np.array([coords[n] for n in refs], dtype=float),
+        np.arange(len(ways)) + 100,
+        way_class,
+        names.tolist(),
+    )
+
+
+def _neighbours(graph, node_id):
+    n = int(np.searchsorted(graph.node_ids, node_id))
+    return sorted(graph.node_ids[graph.indices[graph.indptr[n] : graph.indptr[n + 1]]])
+
+
+def test_graph_nodes_are_junctions_and_dead_ends():
+    coords = {1: (0, 0), 2: (3, 0), 3: (3, 4), 4: (6, 4), 5: (3, -2), 6: (9, 4)}
+    # way 1 branches off the middle of way 0
+    graph = _graph([[1, 2, 3, 4, 6], [5, 2]], coords, ["primary", "service"])
+
+    assert graph.node_ids.tolist() == [1, 2, 5, 6]
+    assert graph.degree().tolist() == [1, 3, 1, 1]
+    assert _neighbours(graph, 2) == [1, 5, 6]
+    assert graph.edge_length.tolist() == [3, 10, 2]
+    assert [graph.classes[c] for c in graph.edge_class] == [
+        "primary",
+        "primary",
+        "service",
+    ]
+    assert graph.edge_way.tolist() == [100, 100, 101]
+    assert graph.edge_coords(1).tolist() == [[3, 0], [3, 4], [6, 4], [9, 4]]
+
+
+def test_graph_adjacency_points_back_to_its_edges():
+    coords = {1: (0, 0), 2: (1, 0), 3: (1, 1), 4: (0, 1)}
+    graph = _graph([[1, 2, 3], [3, 4, 1], [2, 4]], coords)
+
+    for n in range(graph.node_count):
+        for k in range(graph.indptr[n], graph.indptr[n + 1]):
+            ends = set(graph.edge_nodes[graph.adjacent_edges[k]].tolist())
+            assert ends == {n, graph.indices[k]}
+    assert len(graph.indices) == 2 * graph.edge_count
+
+
+def test_graph_from_overpass_grid():
+    spacing = 30.0
+    elements = OsmElements.from_features(roads_response(90, spacing)["elements"])
+
+    graph = RoadGraph.from_elements(elements, createCRS(CENTER_LAT, CENTER_LON))
+
+    # 7 x 7 crossings, every street split at each one, plus the ring road
+    n = 7
+    assert graph.node_count == n * n + 1
+    assert graph.edge_count == 2 * n * (n - 1) + 1
+    streets = graph.edge_nodes[:, 0] != graph.edge_nodes[:, 1]
+    assert graph.edge_length[streets] == pytest.approx(spacing, rel=0.01)
+    assert "pedestrian" not in graph.classes
+    assert set(graph.classes) == {"primary", "residential", "secondary", "tertiary"}
@@ -0,0 +1,213 @@
+import copy
+import json
+import logging
+
+import numpy as np
+from specklepy.api.operations import receive, send
+from specklepy.objects import Base
+from specklepy.objects.geometry import Mesh
+from specklepy.objects.other import Collection
+from specklepy.transports.memory import MemoryTransport
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, combined_response
+from utils import utils_incremental
+from utils.utils_incremental import (
+    ContextRecords,
+    ContextState,
+    contextKey,
+    incrementalContext,
+    tileGrid,
+    tileOwners,
+)
+from utils.utils_osm import extrudedBuildings, getRoads
+from utils.utils_overpass import OsmElements
+from utils.utils_speckle import ObjectReference, sendObject
+
+RADIUS = 300
+
+
+def _tile():
+    mesh = Mesh.create(vertices=[0, 0, 0, 1, 0, 0, 0, 1, 0], faces=[3, 0, 1, 2])
+    return Base(units="m", displayValue=[mesh])
+
+
+def test_references_serialize_like_the_objects_they_stand_for():
+    transport = MemoryTransport()
+    tile_id, closure = sendObject(_tile(), [transport])
+
+    nested = Collection(elements=[Collection(elements=[_tile()])])
+    full = send(nested, [transport], use_default_cache=False)
+    reference = ObjectReference.create(tile_id, closure)
+    nested = Collection(elements=[Collection(elements=[reference])])
+    root_id, _ = sendObject(nested, [transport])
+
+    assert root_id == full
+    root = json.loads(transport.get_object(root_id))
+    assert root["__closure"][tile_id] == 2
+    received = receive(root_id, local_transport=transport)
+    assert received.elements[0].elements[0].displayValue[0].faces == [3, 0, 1, 2]
+
+
+def test_points_are_owned_by_the_nearest_tile():
+    grid = [(0, 0, 2, 2), (0, 2, 2, 4), (2, 0, 4, 2), (2, 2, 4, 4)]
+    step = 0.001
+
+    owners = tileOwners(
+        np.array([0.5, 0.5, 3.5, 2.0, -9.0, 9.0]) * step,
+        np.array([0.5, 3.5, 0.5, 2.0, -9.0, 9.0]) * step,
+        grid,
+    )
+
+    assert owners.tolist() == [0, 1, 2, 3, 0, 3]
+
+
+def _context(elements, previous, transport, analysis=False):
+    return incrementalContext(
+        CENTER_LAT,
+        CENTER_LON,
+        RADIUS,
+        elements,
+        previous,
+        lambda obj: sendObject(obj, [transport]),
+        visibility=False,
+        analysis=analysis,
+    )
+
+
+def _elements(data):
+    return OsmElements.from_features(data["elements"])
+
+
+def test_rerun_reuses_every_tile():
+    data = combined_response(RADIUS)
+    transport = MemoryTransport()
+    key = contextKey(CENTER_LAT, CENTER_LON, RADIUS, False, False)
+
+    first = _context(_elements(data), ContextRecords(key), transport)
+    first_id, _ = sendObject(first.root, [transport])
+    sent = len(transport.objects)
+    second = _context(_elements(data), first.records, transport)
+    second_id, _ = sendObject(second.root, [transport])
+
+    tiles = len(tileGrid(CENTER_LAT, CENTER_LON, RADIUS))
+    assert tiles == first.rebuilt == 9
+    assert (second.rebuilt, second.reused) == (0, tiles)
+    assert second_id == first_id
+    assert len(transport.objects) == sent
+
+
+def test_only_the_changed_tile_is_rebuilt():
+    data = combined_response(RADIUS)
+    transport = MemoryTransport()
+    first = _context(_elements(data), ContextRecords("key"), transport, True)
+
+    changed = copy.deepcopy(data)
+    building = next(e for e in changed["elements"] if "building" in e.get("tags", {}))
+    building["tags"]["height"] = "40"
+    second = _context(_elements(changed), first.records, transport, True)
+
+    assert (second.rebuilt, second.reused) == (1, first.rebuilt - 1)
+    changed_tiles = [
+        t for t, r in second.records.tiles.items() if r != first.records.tiles[t]
+    ]
+    assert len(changed_tiles) == 1
+    # the road analysis covers the whole area and follows any change
+    assert second.records.area.hash != first.records.area.hash
+    buildings = second.root.elements[0].elements
+    assert len(buildings) == len(first.root.elements[0].elements)
+
+
+def test_road_analysis_is_optional():
+    elements = _elements(combined_response(RADIUS))
+    transport = MemoryTransport()
+
+    plain = _context(elements, ContextRecords("a"), transport)
+    analysed = _context(elements, ContextRecords("b"), transport, analysis=True)
+
+    assert len(plain.root.elements) == 3
+    assert list(analysed.records.area.objects) == ["analysis"]
+    assert contextKey(0, 0, 1, False, True) != contextKey(0, 0, 1, False, False)
+
+
+def test_missing_state_is_logged(tmp_path, caplog):
+    state = ContextState(tmp_path)
+
+    with caplog.at_level(logging.WARNING, logger="utils.utils_incremental"):
+        records = state.load("https://s", "project", "a")
+
+    assert records == ContextRecords("a")
+    assert "CONTEXT_STATE_DIR" in caplog.text
+
+
+def test_state_roundtrip_per_project(tmp_path):
+    state = ContextState(tmp_path)
+    transport = MemoryTransport()
+    records = _context(
+        _elements(combined_response(RADIUS)), ContextRecords("a"), transport
+    ).records
+
+    state.save("https://s", "project/1", records)
+
+    assert state.load("https://s/", "project/1", "a") == records
+    assert state.load("https://s", "project/1", "b") == ContextRecords("b")
+    assert state.load("https://s", "project/2", "a") == ContextRecords("a")
+    assert state.load("https://t", "project/1", "a") == ContextRecords("a")
+
+
+def test_tiles_missing_from_the_target_are_rebuilt():
+    data = combined_response(RADIUS)
+    transport = MemoryTransport()
+    first = _context(_elements(data), ContextRecords("key"), transport)
+    target = MemoryTransport()
+    target.objects = dict(transport.objects)
+    tile = next(r for r in first.records.tiles.values() if r.objects)
+    missing, _ = tile.objects["roads"]
+    del target.objects[missing]
+
+    previous = copy.deepcopy(first.records)
+    previous.verify(target)
+    second = _context(_elements(data), previous, target)
+
+    assert (second.rebuilt, second.reused) == (1, first.rebuilt - 1)
+    assert missing in target.objects
+    assert second.records == first.records
+
+
+def test_tiles_add_up_to_the_full_run():
+    elements = _elements(combined_response(RADIUS))
+    transport = MemoryTransport()
+
+    context = _context(elements, ContextRecords("key"), transport)
+    roads, meshes, _ = getRoads(CENTER_LAT, CENTER_LON, RADIUS, elements)
+
+    tiles = [
+        receive(ref.referencedId, local_transport=transport)
+        for ref in context.root.elements[1].elements
+    ]
+    tiled = [p.value for tile in tiles for p in tile.elements]
+    assert sorted(tiled) == sorted(p.value for p in roads)
+
+
+def test_visibility_reuses_the_tile_extrusion(monkeypatch):
+    elements = _elements(combined_response(RADIUS))
+    extruded = []
+
+    def counting(*args, **kwargs):
+        meshes = extrudedBuildings(*args, **kwargs)
+        extruded.append(len(meshes.vertex_offsets) - 1)
+        return meshes
+
+    monkeypatch.setattr(utils_incremental, "extrudedBuildings", counting)
+    context = incrementalContext(
+        CENTER_LAT,
+        CENTER_LON,
+        RADIUS,
+        elements,
+        ContextRecords("key"),
+        lambda obj: sendObject(obj, [MemoryTransport()]),
+        visibility=True,
+    )
+
+    everything = extrudedBuildings(CENTER_LAT, CENTER_LON, RADIUS, elements)
+    assert sum(extruded) == len(everything.meshes())
+    assert list(context.records.area.objects) == ["visibility"]
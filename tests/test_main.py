@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+from specklepy.logging.exceptions import SpeckleException
+
+from main import create_version_of_object
+
+
+class FakeCommits:
+    def __init__(self, result):
+        self.result = result
+        self.created = []
+
+    def create(self, **kwargs):
+        self.created.append(kwargs)
+        return self.result
+
+
+def _context(result):
+    return SimpleNamespace(
+        automation_run_data=SimpleNamespace(project_id="project", model_id="source"),
+        speckle_client=SimpleNamespace(commit=FakeCommits(result)),
+        _automation_result=SimpleNamespace(result_versions=[]),
+    )
+
+
+def test_version_is_created_on_the_target_model_and_reported():
+    context = _context("version")
+
+    version_id = create_version_of_object(context, "root", "target", "automate", "m")
+
+    assert version_id == "version"
+    (created,) = context.speckle_client.commit.created
+    assert created["object_id"] == "root"
+    assert created["branch_name"] == "automate"
+    assert context._automation_result.result_versions == ["version"]
+
+
+def test_version_is_not_created_on_the_triggering_model():
+    context = _context("version")
+
+    with pytest.raises(ValueError, match="cannot match the model id"):
+        create_version_of_object(context, "root", "source", "automate", "m")
+
+    assert context.speckle_client.commit.created == []
+
+
+def test_failed_version_raises_the_server_error():
+    context = _context(SpeckleException("no access"))
+
+    with pytest.raises(SpeckleException, match="no access"):
+        create_version_of_object(context, "root", "target", "automate", "m")
+
+    assert context._automation_result.result_versions == []
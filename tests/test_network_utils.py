@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, roads_response
+from utils.utils_graph import RoadGraph
+from utils.utils_network import betweenness, colorSegments
+from utils.utils_overpass import OsmElements
+from utils.utils_pyproj import createCRS
+
+
+def _graph(ways, coords):
+    offsets = np.concatenate([[0], np.cumsum([len(w) for w in ways])])
+    refs = np.concatenate(ways)
+    return RoadGraph.from_ways(
+        offsets,
+        refs,
+        np.array([coords[n] for n in refs], dtype=float),
+        np.arange(len(ways)),
+        np.zeros(len(ways), dtype=np.int64),
+        ["residential"],
+    )
+
+
+def _edge(graph, a, b):
+    ends = graph.node_ids[graph.edge_nodes].tolist()
+    return ends.index([a, b]) if [a, b] in ends else ends.index([b, a])
+
+
+def test_betweenness_of_a_path():
+    graph = _graph([[1, 2], [2, 3]], {1: (0, 0), 2: (1, 0), 3: (3, 0)})
+
+    nodes, edges = betweenness(graph)
+
+    assert nodes.tolist() == [0, 1, 0]
+    # both edges carry the pair they join and the pair (1, 3)
+    assert edges.tolist() == [2, 2]
+
+
+def test_equally_short_paths_share_the_movement():
+    square = {1: (0, 0), 2: (1, 0), 3: (1, 1), 4: (0, 1)}
+    graph = _graph([[1, 2], [2, 3], [3, 4], [4, 1]], square)
+
+    nodes, edges = betweenness(graph)
+
+    assert nodes == pytest.approx([0.5] * 4)
+    assert edges == pytest.approx([2] * 4)
+
+
+def test_radius_drops_longer_paths():
+    coords = {k: (k * 10, 0) for k in range(1, 5)}
+    graph = _graph([[1, 2], [2, 3], [3, 4]], coords)
+
+    _, edges = betweenness(graph, radius=20)
+
+    # pairs up to two edges apart: the middle edge carries (2,3), (1,3), (2,4)
+    assert edges[_edge(graph, 2, 3)] == 3
+    assert edges[_edge(graph, 1, 2)] == 2
+
+
+def test_sampling_and_pool_estimate_the_exact_values():
+    elements = OsmElements.from_features(roads_response(150)["elements"])
+    graph = RoadGraph.from_elements(elements, createCRS(CENTER_LAT, CENTER_LON))
+
+    exact_nodes, exact_edges = betweenness(graph, workers=1)
+    pool_nodes, pool_edges = betweenness(graph, workers=2)
+    _, sampled = betweenness(graph, samples=graph.node_count // 2, seed=1)
+
+    assert pool_nodes == pytest.approx(exact_nodes)
+    assert pool_edges == pytest.approx(exact_edges)
+    # the centre of the grid carries more than its edge, also when sampled
+    assert np.corrcoef(sampled, exact_edges)[0, 1] > 0.8
+    assert sampled.sum() == pytest.approx(exact_edges.sum(), rel=0.2)
+
+
+def test_segments_carry_edge_counts():
+    elements = OsmElements.from_features(roads_response(90)["elements"])
+
+    lines, lengths, counts, maxCount = colorSegments(
+        CENTER_LAT, CENTER_LON, 90, elements
+    )
+
+    # every street between two crossings and the ring road, streets are 30 m long
+    assert len(lines) == len(lengths) == len(counts) == 2 * 7 * 6 + 1
+    assert counts.max() == maxCount > 0
+    streets = lengths < 40
+    assert lengths[streets] == pytest.approx(30, rel=0.01)
+    assert [len(line) for line, s in zip(lines, streets) if s] == [2] * (2 * 7 * 6)
+    ring = lines[int(np.flatnonzero(~streets)[0])]
+    assert (ring[0] == ring[-1]).all() and len(ring) == 13
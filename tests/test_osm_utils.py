@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+import requests
+
+from tests.overpass_fixtures import (
+    CENTER_LAT,
+    CENTER_LON,
+    buildings_response,
+    combined_response,
+    roads_response,
+)
+from tests.overpass_stub import FakeResponse
+from utils.utils_osm import (
+    extrudedBuildings,
+    getBuildings,
+    getRoadGraph,
+    getRoads,
+    getWayCoords,
+    splitWaysByIntersection,
+)
+from utils.utils_overpass import OsmElements, fetchElements
+
+
+@pytest.fixture()
+def fake_overpass(monkeypatch):
+    monkeypatch.setenv("OVERPASS_CACHE_DIR", "off")
+
+    def install(data: dict):
+        monkeypatch.setattr(requests, "get", lambda *args, **kwargs: FakeResponse(data))
+
+    return install
+
+
+def test_way_coords_skip_unknown_nodes():
+    elements = OsmElements.from_features(
+        [
+            {"type": "node", "id": 2, "lat": 0.0, "lon": 1.0},
+            {"type": "node", "id": 1, "lat": 0.0, "lon": 0.0},
+        ]
+    )
+    coords = np.column_stack([elements.node_lon, elements.node_lat])
+
+    assert getWayCoords([1, 3, 2, 1], elements, coords).tolist() == [
+        [0, 0],
+        [1, 0],
+        [0, 0],
+    ]
+
+
+def test_get_buildings_from_overpass_response(fake_overpass):
+    fake_overpass(buildings_response(60))
+
+    meshes = getBuildings(CENTER_LAT, CENTER_LON, 60)
+
+    assert len(meshes) == 16
+    # the rectangular footprints are 18 x 14.4 m
+    xs = meshes[1].vertices[0:12:3]
+    ys = meshes[1].vertices[1:12:3]
+    assert max(xs) - min(xs) == pytest.approx(18, abs=0.05)
+    assert max(ys) - min(ys) == pytest.approx(14.4, abs=0.05)
+
+
+def test_multipolygon_buildings_are_stitched_with_courtyards(fake_overpass):
+    fake_overpass(buildings_response(150))
+
+    meshes = getBuildings(CENTER_LAT, CENTER_LON, 150)
+
+    # relations come last: building 39 has two outer parts, 79 also a courtyard
+    plain, courtyard = meshes[-2:]
+    # floor ring, roof ring and 4 vertices per wall for every ring vertex
+    assert len(plain.vertices) == 3 * 6 * 4
+    assert len(courtyard.vertices) == 3 * 6 * (4 + 4)
+    xs = plain.vertices[0:12:3]
+    ys = plain.vertices[1:12:3]
+    assert max(xs) - min(xs) == pytest.approx(18, abs=0.05)
+    assert max(ys) - min(ys) == pytest.approx(14.4, abs=0.05)
+
+
+def test_combined_elements_match_separate_queries(fake_overpass):
+    fake_overpass(buildings_response(60))
+    buildings = getBuildings(CENTER_LAT, CENTER_LON, 60)
+    fake_overpass(roads_response(60))
+    roads, road_meshes, _ = getRoads(CENTER_LAT, CENTER_LON, 60)
+
+    elements = OsmElements.from_features(combined_response(60)["elements"])
+    combined_buildings = getBuildings(CENTER_LAT, CENTER_LON, 60, elements)
+    combined_roads, combined_meshes, _ = getRoads(CENTER_LAT, CENTER_LON, 60, elements)
+
+    assert [m.vertices for m in combined_buildings] == [m.vertices for m in buildings]
+    assert [p.value for p in combined_roads] == [p.value for p in roads]
+    assert len(combined_meshes) == len(road_meshes)
+
+
+def test_extruded_buildings_give_both_layers_from_one_pass():
+    elements = OsmElements.from_features(buildings_response(60)["elements"])
+
+    extruded = extrudedBuildings(CENTER_LAT, CENTER_LON, 60, elements)
+
+    separate = getBuildings(CENTER_LAT, CENTER_LON, 60, elements)
+    merged = getBuildings(CENTER_LAT, CENTER_LON, 60, elements, merged=True)
+    assert [m.vertices for m in extruded.meshes()] == [m.vertices for m in separate]
+    assert extruded.merged().vertices == merged[0].vertices
+
+
+def test_split_ways_keeps_order_and_areas_whole():
+    ways = [
+        {"id": 1, "nodes": [1, 2, 3]},
+        {"id": 2, "nodes": [2, 4, 5, 2]},
+        {"id": 3, "nodes": [9, 3, 8, 9]},
+    ]
+    tags = [
+        {"highway": "primary"},
+        {"highway": "service"},
+        {"highway": "pedestrian", "area": "yes"},
+    ]
+
+    split, split_tags = splitWaysByIntersection(ways, tags)
+
+    assert [w["nodes"] for w in split] == [[1, 2], [2, 3], [2, 4, 5, 2], [9, 3, 8, 9]]
+    assert [w["id"] for w in split] == [1, 1, 2, 3]
+    assert split_tags[1] is tags[0]
+
+
+def test_road_graph_reuses_the_road_elements(fake_overpass):
+    fake_overpass(roads_response(90))
+    elements = fetchElements(CENTER_LAT, CENTER_LON, 90, ["highway"])
+    fake_overpass({"elements": []})
+
+    graph = getRoadGraph(CENTER_LAT, CENTER_LON, 90, elements)
+
+    assert graph.edge_count == 2 * 7 * 6 + 1
+
+
+def test_road_analysis_layer_colors_every_segment(fake_overpass):
+    fake_overpass(roads_response(90))
+
+    _, _, analysis = getRoads(CENTER_LAT, CENTER_LON, 90, analysis=True)
+
+    assert len(analysis) == 2 * 7 * 6 + 1
+    counts = [a.displayValue[0].count for a in analysis]
+    assert max(counts) == 1
+    # the busiest segment is red, the quietest blue
+    busiest = analysis[int(np.argmax(counts))].displayValue[0].colors[0]
+    quietest = analysis[int(np.argmin(counts))].displayValue[0].colors[0]
+    assert busiest >> 16 & 255 > busiest & 255
+    assert quietest & 255 > quietest >> 16 & 255
@@ -0,0 +1,53 @@
+import numpy as np
+from specklepy.objects.geometry import Point
+
+from utils.utils_other import findMeshesNearby, nearbyMeshIds, sortPtsByMesh
+
+
+def _points(coords, meshIds):
+    points = []
+    for c, m in zip(coords, meshIds):
+        p = Point.from_list(list(c))
+        p.meshId = int(m)
+        points.append(p)
+    return points
+
+
+def _brute_force(coords, meshIds):
+    nearby = []
+    for c in coords:
+        dist = np.linalg.norm(coords - c, axis=1)
+        other = dist > 0
+        close = other & (dist < 2 * dist[other].min())
+        nearby.append(sorted(set(meshIds[close].tolist())))
+    return nearby
+
+
+def test_nearby_meshes_match_the_pairwise_search():
+    rng = np.random.default_rng(5)
+    # hit points on a few walls, densely and sparsely sampled
+    walls = []
+    for k, (count, spread) in enumerate([(400, 2.0), (50, 30.0), (5, 100.0)]):
+        xz = rng.uniform(0, spread, size=(count, 2))
+        walls.append(np.column_stack([xz[:, 0], np.full(count, 10.0 * k), xz[:, 1]]))
+    coords = np.concatenate(walls)
+    meshIds = rng.integers(0, 12, len(coords))
+
+    assert nearbyMeshIds(coords, meshIds) == _brute_force(coords, meshIds)
+
+
+def test_duplicate_points_are_not_their_own_neighbours():
+    coords = [[0, 0, 0], [0, 0, 0], [1, 0, 0], [5, 0, 0]]
+
+    nearby = findMeshesNearby(_points(coords, [1, 2, 3, 4]))
+
+    assert nearby == [[3], [3], [1, 2], [1, 2, 3]]
+
+
+def test_points_are_grouped_by_mesh_in_order():
+    points = _points(np.zeros((5, 3)), [7, 2, 7, 3, 2])
+
+    groups = sortPtsByMesh(points)
+
+    assert [[p.meshId for p in g] for g in groups] == [[7, 7], [2, 2], [3]]
+    assert groups[0][1] is points[2]
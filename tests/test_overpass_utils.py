@@ -0,0 +1,197 @@
+import json
+
+import pytest
+
+import utils.utils_overpass as utils_overpass
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, combined_response
+from tests.overpass_stub import OverpassStub
+from utils.utils_overpass import (
+    OsmElements,
+    fetchElements,
+    iterElements,
+    overpassQuery,
+    stitchRings,
+)
+from utils.utils_pyproj import createCRS, reprojectToCrs
+
+
+def test_query_unions_all_keywords():
+    query = overpassQuery((1.0, 2.0, 3.0, 4.0), ["building", "highway"])
+
+    assert query.startswith("[out:json];")
+    for keyword in ["building", "highway"]:
+        for element in ["node", "way", "relation"]:
+            assert f'{element}["{keyword}"](1.0,2.0,3.0,4.0);' in query
+    assert query.endswith("out body;>;out skel qt;")
+
+
+def test_elements_are_parsed_once_and_routed_by_type():
+    elements = OsmElements.from_features(
+        [
+            {"type": "way", "id": 10, "nodes": [1, 2, 1], "tags": {"building": "yes"}},
+            {"type": "way", "id": 11, "nodes": [1, 2], "tags": {"highway": "primary"}},
+            {"type": "way", "id": 12, "nodes": [2, 1]},
+            {
+                "type": "relation",
+                "id": 20,
+                "members": [{"type": "way", "ref": 12, "role": "outer"}],
+                "tags": {"building": "yes"},
+            },
+            {"type": "node", "id": 1, "lat": 1.0, "lon": 2.0},
+            {"type": "node", "id": 2, "lat": 3.0, "lon": 4.0},
+            {"type": "node", "id": 1, "lat": 1.0, "lon": 2.0},
+        ]
+    )
+
+    assert elements.way_ids[elements.way_rows("building")].tolist() == [10]
+    assert elements.way_ids[elements.way_rows("highway")].tolist() == [11]
+    assert elements.way_ids[elements.way_rows("building", tagged=False)].tolist() == [11, 12]
+    assert elements.way_rows("shop").tolist() == []
+    assert elements.way_nodes(1).tolist() == [1, 2]
+    assert elements.way_tags(0) == {"building": "yes"}
+    assert elements.way_tags(2) == {}
+    assert [r.id for r in elements.tagged_relations("building")] == [20]
+    assert elements.tagged_relations("highway") == []
+    assert elements.relations[0].members[0].ref == 12
+    assert elements.node_ids.tolist() == [1, 2]
+    assert elements.node_lat.tolist() == [1.0, 3.0]
+    assert elements.node_rows([2, 5, 1, 0]).tolist() == [1, -1, 0, -1]
+
+
+def test_stitch_rings_orders_and_reverses_segments():
+    segments = [[3, 4, 1], [1, 2], [3, 2], [10, 11, 12, 10]]
+
+    rings = stitchRings(segments)
+
+    assert sorted(map(len, rings)) == [4, 5]
+    ring = next(r for r in rings if 1 in r)
+    assert ring[0] == ring[-1]
+    # each consecutive pair is an edge of one of the input segments
+    edges = {frozenset(e) for s in segments for e in zip(s, s[1:])}
+    assert all(frozenset(e) in edges for e in zip(ring, ring[1:]))
+
+
+def test_stitch_rings_closes_open_chains():
+    assert stitchRings([[1, 2], [2, 3]]) == [[1, 2, 3, 1]]
+
+
+def test_relation_rings_split_outer_and_inner_members():
+    ring = lambda ids: [{"type": "node", "id": i, "lat": 0.0, "lon": 0.0} for i in ids]
+    elements = OsmElements.from_features(
+        [
+            {
+                "type": "relation",
+                "id": 1,
+                "members": [
+                    {"type": "way", "ref": 11, "role": "outer"},
+                    {"type": "way", "ref": 12, "role": ""},
+                    {"type": "way", "ref": 13, "role": "inner"},
+                    {"type": "way", "ref": 99, "role": "outer"},
+                ],
+                "tags": {"building": "yes"},
+            },
+            {"type": "way", "id": 12, "nodes": [3, 4, 1]},
+            {"type": "way", "id": 11, "nodes": [1, 2, 3]},
+            {"type": "way", "id": 13, "nodes": [5, 6, 7, 5]},
+            *ring(range(1, 8)),
+        ]
+    )
+
+    outer, inner = elements.relation_rings(elements.relations[0])
+
+    assert outer == [[1, 2, 3, 4, 1]]
+    assert inner == [[5, 6, 7, 5]]
+    assert elements.way_rows_by_id([13, 99, 11]).tolist() == [2, -1, 1]
+
+
+def test_tag_strings_are_interned():
+    elements = OsmElements.from_features(
+        [
+            {"type": "way", "id": i, "nodes": [1, 2], "tags": {"building": "yes"}}
+            for i in range(100)
+        ]
+    )
+
+    assert len(elements.way_rows("building")) == 100
+    assert len(elements._string_list) == 2
+
+
+def test_node_index_matches_single_point_reprojection():
+    crs = createCRS(CENTER_LAT, CENTER_LON)
+    nodes = [
+        {"type": "node", "id": i, "lat": CENTER_LAT + i * 1e-4, "lon": CENTER_LON - i * 1e-4}
+        for i in range(20)
+    ]
+    elements = OsmElements.from_features(nodes)
+
+    coords = elements.node_coords(crs)
+
+    assert coords.shape == (20, 2)
+    assert coords[elements.node_rows([0])[0]] == pytest.approx([0, 0], abs=1e-6)
+    for n in nodes:
+        x, y = reprojectToCrs(n["lat"], n["lon"], "EPSG:4326", crs)
+        assert coords[elements.node_rows([n["id"]])[0]] == pytest.approx([x, y])
+    assert elements.node_coords(crs) is coords
+
+
+@pytest.fixture()
+def overpass_stub(monkeypatch):
+    monkeypatch.setenv("OVERPASS_CACHE_DIR", "off")
+    stubs = []
+
+    def start(data: dict, delay: float = 0.0) -> OverpassStub:
+        stub = OverpassStub(data, delay).__enter__()
+        stubs.append(stub)
+        monkeypatch.setattr(utils_overpass, "OVERPASS_URL", stub.url)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.__exit__()
+
+
+def test_tiled_fetch_merges_tiles_into_one_result(overpass_stub):
+    stub = overpass_stub(combined_response(300), delay=0.05)
+
+    single = fetchElements(CENTER_LAT, CENTER_LON, 300, cache=None, tileMeters=None)
+    tiled = fetchElements(
+        CENTER_LAT, CENTER_LON, 300, cache=None, tileMeters=300, maxWorkers=4
+    )
+
+    assert len(stub.queries) == 1 + 4
+    assert stub.max_in_flight > 1
+    assert sorted(tiled.way_ids) == sorted(single.way_ids)
+    assert sorted(r.id for r in tiled.relations) == sorted(r.id for r in single.relations)
+    assert tiled.node_ids.tolist() == single.node_ids.tolist()
+    assert len(tiled.way_ids) == len(set(tiled.way_ids))
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+def test_streamed_elements_match_full_decode(chunk_size):
+    data = combined_response(60)
+    body = json.dumps(data, indent=1).encode()
+
+    streamed = list(iterElements(_chunks(body, chunk_size)))
+
+    assert streamed == data["elements"]
+
+
+def test_stream_reads_remark_after_elements():
+    body = b'{"version": 0.6, "elements": [{"type": "node", "id": 1, "lat": 1, "lon": 2}],\n "remark": "runtime error: Query timed out"}'
+    meta = {}
+
+    elements = list(iterElements(_chunks(body, 5), meta))
+
+    assert elements == [{"type": "node", "id": 1, "lat": 1, "lon": 2}]
+    assert meta == {"remark": "runtime error: Query timed out"}
+
+
+def test_stream_rejects_truncated_body():
+    body = json.dumps(combined_response(60)).encode()
+
+    with pytest.raises(ValueError):
+        list(iterElements(_chunks(body[: len(body) // 2], 100)))
@@ -42,3 +42,19 @@ def test_reprojector_from_location():
     projected = re.reproject(Location(2, 2))
 
     assert projected == (1, 2)
+
+
+def test_reprojector_reproject_arrays_passes_whole_arrays():
+    calls = []
+
+    def fake_transformer(xx, yy, direction="FORWARD"):
+        calls.append(direction)
+        return xx * 2, yy * 3
+
+    re = Reprojector(fake_transformer)
+
+    xs, ys = re.reproject_arrays([1, 2], [3, 4])
+
+    assert calls == ["FORWARD"]
+    assert xs.tolist() == [2, 4]
+    assert ys.tolist() == [9, 12]
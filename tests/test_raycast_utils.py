@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from specklepy.objects.geometry import Mesh
+
+from tests.overpass_fixtures import CENTER_LAT, CENTER_LON, buildings_response
+from utils import utils_raycast
+from utils.utils_osm import getBuildings
+from utils.utils_overpass import OsmElements
+from utils.utils_raycast import (
+    Bvh,
+    Triangles,
+    castRays,
+    faceTriangles,
+    intersectTriangles,
+)
+
+
+def _box(x, y, size, height):
+    vertices = [
+        [x, y, 0], [x + size, y, 0], [x + size, y + size, 0], [x, y + size, 0],
+        [x, y, height], [x + size, y, height], [x + size, y + size, height],
+        [x, y + size, height],
+    ]  # fmt: skip
+    faces = [4, 0, 1, 5, 4, 4, 1, 2, 6, 5, 4, 2, 3, 7, 6, 4, 3, 0, 4, 7, 3, 4, 5, 6]
+    return Mesh.create(vertices=np.ravel(vertices).tolist(), faces=faces)
+
+
+def test_face_lists_are_fanned_into_triangles():
+    tris, face = faceTriangles([3, 0, 1, 2, 5, 3, 4, 5, 6, 7, 1, 8, 9, 10, 11])
+
+    assert tris.tolist() == [
+        [0, 1, 2],
+        [3, 4, 5],
+        [3, 5, 6],
+        [3, 6, 7],
+        [8, 9, 10],
+        [8, 10, 11],
+    ]
+    assert face.tolist() == [0, 1, 1, 1, 2, 2]
+
+
+def test_nearest_wall_is_hit_with_its_face_and_mesh():
+    meshes = [_box(10, -5, 10, 6), _box(30, -5, 10, 20)]
+    bvh = Bvh.from_meshes(meshes, leafSize=2)
+    directions = [[1, 0, 0], [4, 0, 1], [1, 0, 0.5], [-1, 0, 0], [0, 0, 1]]
+
+    hits = castRays(bvh, [0, 0, 2], directions)
+
+    assert hits.mesh.tolist() == [0, 0, 1, -1, -1]
+    # the 4th face is the wall facing the origin
+    assert hits.face.tolist() == [3, 3, 3, -1, -1]
+    assert hits.distance[0] == pytest.approx(10)
+    assert hits.distance[1] == pytest.approx(np.hypot(10, 2.5))
+    assert hits.distance[2] == pytest.approx(np.hypot(30, 15))
+    assert np.isinf(hits.distance[3:]).all()
+
+
+def test_hits_beyond_the_max_distance_are_ignored():
+    bvh = Bvh.from_meshes([_box(10, -5, 10, 6)])
+
+    hits = castRays(bvh, [0, 0, 2], [[1, 0, 0]], maxDistance=9)
+
+    assert not hits.hit.any()
+
+
+def test_rays_miss_an_empty_bvh():
+    hits = castRays(Bvh.from_meshes([]), [0, 0, 0], [[1, 0, 0], [0, 1, 0]])
+
+    assert not hits.hit.any()
+    assert hits.distance.tolist() == [np.inf, np.inf]
+    assert hits.face.tolist() == hits.triangle.tolist() == [-1, -1]
+
+
+def test_bvh_matches_testing_every_triangle():
+    elements = OsmElements.from_features(buildings_response(120)["elements"])
+    meshes = getBuildings(CENTER_LAT, CENTER_LON, 120, elements)
+    rng = np.random.default_rng(3)
+    directions = rng.normal(size=(500, 3))
+    directions[:, 2] = np.abs(directions[:, 2]) * 0.3
+    origin = np.array([24.0, 22.0, 1.5])
+
+    hits = castRays(Bvh.from_meshes(meshes), origin, directions)
+
+    tris = Triangles.from_meshes(meshes)
+    unit = directions / np.linalg.norm(directions, axis=1)[:, None]
+    pairs = np.repeat(np.arange(len(unit)), tris.count)
+    t = intersectTriangles(
+        np.broadcast_to(origin, (len(pairs), 3)),
+        unit[pairs],
+        tris.take(np.tile(np.arange(tris.count), len(unit))),
+    ).reshape(len(unit), tris.count)
+    nearest = t.argmin(axis=1)
+    expected = t[np.arange(len(unit)), nearest]
+
+    assert hits.hit.sum() > 100
+    assert hits.distance == pytest.approx(expected)
+    hit = np.isfinite(expected)
+    assert (hits.mesh[hit] == tris.mesh[nearest[hit]]).all()
+
+
+def test_process_pool_gives_the_same_hits(monkeypatch):
+    monkeypatch.setattr(utils_raycast, "POOL_MIN_RAYS", 0)
+    bvh = Bvh.from_meshes([_box(10, -5, 10, 6), _box(-20, -5, 10, 20)])
+    directions = np.random.default_rng(0).normal(size=(300, 3))
+
+    serial = castRays(bvh, [0, 0, 2], directions)
+    pooled = castRays(bvh, [0, 0, 2], directions, workers=2)
+
+    assert serial.hit.sum() > 20
+    assert (pooled.triangle == serial.triangle).all()
+    assert pooled.distance == pytest.approx(serial.distance)
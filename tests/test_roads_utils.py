@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import shapely
+
+from utils.utils_roads import roadSurfaces
+
+
+def _area(mesh):
+    vertices = np.array(mesh.vertices).reshape(-1, 3)
+    faces = np.array(mesh.faces).reshape(-1, 4)
+    assert (faces[:, 0] == 3).all()
+    a, b, c = (vertices[faces[:, k]] for k in (1, 2, 3))
+    normals = np.cross(b - a, c - a)
+    assert (normals[:, 2] >= 0).all()
+    return normals[:, 2].sum() / 2
+
+
+def test_each_road_is_buffered_into_an_upward_surface():
+    lines = [np.array([[0, 0], [10, 0]]), np.array([[0, 20], [0, 30], [10, 30]])]
+
+    surfaces = roadSurfaces(lines, [2, 1], colors=[1, 2])
+
+    assert _area(surfaces[0].displayValue[0]) == pytest.approx(14 * 4)
+    assert surfaces[0].width == 4
+    expected = shapely.buffer(shapely.LineString(lines[1]), 1, cap_style="square")
+    assert _area(surfaces[1].displayValue[0]) == pytest.approx(expected.area)
+    assert set(surfaces[1].displayValue[0].colors) == {2}
+
+
+def test_ring_roads_keep_their_hole():
+    ring = np.array([[0, 0], [20, 0], [20, 20], [0, 20], [0, 0]])
+
+    (surface,) = roadSurfaces([ring], [2])
+
+    expected = shapely.buffer(shapely.LineString(ring), 2, cap_style="square")
+    assert len(expected.interiors) == 1
+    assert _area(surface.displayValue[0]) == pytest.approx(expected.area)
+
+
+def test_roads_without_width_or_length_are_skipped():
+    surfaces = roadSurfaces(
+        [np.array([[0, 0], [1, 0]]), np.array([[5, 5]]), np.array([[0, 0], [0, 1]])],
+        [None, 2, 2],
+    )
+
+    assert surfaces[0] is None and surfaces[1] is None
+    assert surfaces[2] is not None
+
+
+def test_union_merges_crossing_roads():
+    lines = [np.array([[-10, 0], [10, 0]]), np.array([[0, -10], [0, 10]])]
+
+    surfaces = roadSurfaces(lines, [1, 1], union=True)
+
+    assert len(surfaces) == 1
+    assert _area(surfaces[0].displayValue[0]) == pytest.approx(2 * 22 * 2 - 4)
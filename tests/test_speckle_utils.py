@@ -0,0 +1,168 @@
+import inspect
+import json
+from importlib.metadata import version
+from types import SimpleNamespace
+
+import numpy as np
+from specklepy.api.operations import receive
+from specklepy.objects import Base
+from specklepy.objects.geometry import Mesh, Polyline
+from specklepy.objects.other import BlockInstance, Collection
+from specklepy.serialization.base_object_serializer import BaseObjectSerializer
+from specklepy.transports.memory import MemoryTransport
+from specklepy.transports.server import ServerTransport
+
+from utils.utils_speckle import (
+    GeometryIndex,
+    MeteredTransport,
+    ObjectIdCache,
+    existingObjects,
+    geometryKey,
+    sendObject,
+    shareGeometry,
+)
+
+
+def _piece(x: float, y: float = 0.0, width: float = 2.0) -> Base:
+    vertices = [x, y, 0, x + 1, y, 0, x + 1, y + 1, 0, x, y + 1, 0]
+    mesh = Mesh.create(vertices=vertices, faces=[4, 0, 1, 2, 3])
+    mesh.units = "m"
+    return Base(units="m", displayValue=[mesh], width=width)
+
+
+def _line(x: float) -> Polyline:
+    return Polyline.from_list([x, 0, 0, x + 5, 0, 0])
+
+
+def test_geometry_key_ignores_jitter_below_the_quantum():
+    mesh = _piece(0).displayValue[0]
+    jittered = _piece(1e-4).displayValue[0]
+    moved = _piece(0.01).displayValue[0]
+    quad = _piece(0).displayValue[0]
+    quad.faces = [3, 0, 1, 2, 3, 0, 2, 3]
+
+    assert geometryKey(mesh) == geometryKey(jittered)
+    assert geometryKey(mesh) != geometryKey(moved)
+    assert geometryKey(mesh) != geometryKey(quad)
+    assert geometryKey(_line(0)) != geometryKey(_line(1))
+    assert geometryKey(Base(units="m")) is None
+
+
+def test_repeated_meshes_share_one_definition():
+    objects = [_piece(0), _piece(10, 5, width=3), _piece(0.5, 20)]
+    objects[2].displayValue[0].faces = [3, 0, 1, 2, 3, 0, 2, 3]
+
+    shared = shareGeometry(objects)
+
+    first, second, single = shared
+    assert isinstance(first, BlockInstance) and isinstance(second, BlockInstance)
+    assert first.definition is second.definition
+    assert single is objects[2]
+    assert second.transform.matrix[3::4][:3] == [10, 5, 0]
+    assert (first.width, second.width) == (2.0, 3)
+    local = first.definition.geometry[0]
+    assert local.vertices[:3] == [0, 0, 0]
+
+
+def test_instances_receive_as_the_original_geometry():
+    transport = MemoryTransport()
+    shared = shareGeometry([_piece(0), _piece(10, 5)])
+    root_id, _ = sendObject(Collection(elements=shared), [transport], GeometryIndex())
+
+    received = receive(root_id, local_transport=transport).elements[1]
+    matrix = np.array(received.transform.matrix).reshape(4, 4)
+    local = np.array(received.definition.geometry[0].vertices).reshape(-1, 3)
+    placed = local @ matrix[:3, :3].T + matrix[:3, 3]
+    expected = np.array(_piece(10, 5).displayValue[0].vertices).reshape(-1, 3)
+    assert np.allclose(placed, expected)
+    definitions = [
+        o for o in transport.objects.values() if "BlockDefinition" in o
+    ]
+    assert len(definitions) == 1
+
+
+def _layers():
+    return Collection(
+        elements=[
+            Collection(elements=[_piece(x) for x in range(3)]),
+            Collection(elements=[_line(x) for x in range(3)]),
+        ]
+    )
+
+
+def test_rerun_links_geometry_sent_before():
+    first = MemoryTransport()
+    index = GeometryIndex()
+    first_id, closure = sendObject(_layers(), [first], index)
+
+    second = MeteredTransport(MemoryTransport())
+    rerun = GeometryIndex(known=dict(index.used))
+    second_id, second_closure = sendObject(_layers(), [second], rerun)
+
+    assert second_id == first_id
+    assert second_closure == closure
+    written = [json.loads(o)["speckle_type"] for o in second.transport.objects.values()]
+    assert "Objects.Geometry.Mesh" not in written
+    assert "Objects.Geometry.Polyline" not in written
+    assert second.objects == len(written)
+    assert second.bytes == sum(len(o) for o in second.transport.objects.values())
+    assert rerun.used == index.used
+
+
+def test_object_id_cache_keeps_the_geometry_of_the_last_run(tmp_path):
+    cache = ObjectIdCache(tmp_path)
+    index = GeometryIndex(known={"old": ("a", {})})
+    index.add("new", ("b", {"c": 1}))
+
+    cache.save("https://a.example", "project/1", index)
+
+    loaded = cache.load("https://a.example/", "project/1")
+    assert loaded == GeometryIndex(known={"new": ("b", {"c": 1})})
+    assert cache.load("https://a.example", "project/2") == GeometryIndex()
+    assert cache.load("https://b.example", "project/1") == GeometryIndex()
+
+
+def test_geometry_missing_from_the_target_is_sent_in_full():
+    first = MemoryTransport()
+    index = GeometryIndex()
+    sendObject(_layers(), [first], index)
+    target = MemoryTransport()
+    target.objects = dict(first.objects)
+    missing = next(objId for objId, _ in index.used.values())
+    del target.objects[missing]
+
+    rerun = GeometryIndex(known=dict(index.used))
+    rerun.verify(MeteredTransport(target))
+    sendObject(_layers(), [target], rerun)
+
+    assert len(rerun.known) == len(index.used) - 1
+    assert missing in target.objects
+    assert target.objects == first.objects
+
+
+def test_server_objects_are_checked_through_the_diff_endpoint():
+    class FakeSession:
+        def post(self, url, data):
+            self.request = (url, json.loads(data["objects"]))
+            return SimpleNamespace(
+                raise_for_status=lambda: None, json=lambda: {"a": True, "b": False}
+            )
+
+    server = ServerTransport.__new__(ServerTransport)
+    server.url, server.stream_id, server.session = "https://s", "p", FakeSession()
+
+    present = existingObjects(MeteredTransport(server), ["a", "b"])
+
+    assert present == {"a": True, "b": False}
+    assert server.session.request == ("https://s/api/diff/p", ["a", "b"])
+
+
+def test_serializer_internals_reference_serializer_relies_on():
+    # ReferenceSerializer extends private specklepy code, re-check it on upgrades
+    assert version("specklepy") == "2.17.3"
+    serializer = BaseObjectSerializer()
+    assert isinstance(serializer.detach_lineage, list)
+    assert isinstance(serializer.lineage, list)
+    assert isinstance(serializer.family_tree, dict)
+    assert "base" in inspect.signature(serializer._traverse_base).parameters
+    assert "ref_id" in inspect.signature(serializer.detach_helper).parameters
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from utils.utils_triangulation import triangulatePolygon, triangulateRings
+
+SQUARE = np.array([[0, 0], [10, 0], [10, 10], [0, 10]], dtype=float)
+L_SHAPE = np.array([[0, 0], [2, 0], [2, 1], [1, 1], [1, 2], [0, 2]], dtype=float)
+COMB = np.array(
+    [[0, 0], [5, 0], [5, 3], [4, 3], [4, 1], [3, 1]]
+    + [[3, 3], [2, 3], [2, 1], [1, 1], [1, 3], [0, 3]],
+    dtype=float,
+)
+
+
+def _areas(points, triangles):
+    a, b, c = (points[triangles[:, k]] for k in range(3))
+    ab, ac = b - a, c - a
+    return 0.5 * (ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0])
+
+
+@pytest.mark.parametrize("polygon, area", [(L_SHAPE, 3.0), (COMB, 11.0)])
+def test_concave_polygons_are_covered_by_ccw_triangles(polygon, area):
+    triangles = triangulatePolygon(polygon)
+
+    assert len(triangles) == len(polygon) - 2
+    areas = _areas(polygon, triangles)
+    assert (areas > 0).all()
+    assert areas.sum() == pytest.approx(area)
+
+
+def test_holes_are_cut_out():
+    holes = [
+        np.array([[2, 2], [2, 4], [4, 4], [4, 2]], dtype=float),
+        np.array([[6, 6], [6, 8], [8, 8], [8, 6]], dtype=float),
+    ]
+
+    triangles = triangulatePolygon(SQUARE, holes)
+
+    areas = _areas(np.concatenate([SQUARE] + holes), triangles)
+    assert (areas > 0).all()
+    assert areas.sum() == pytest.approx(100 - 2 * 4)
+
+
+def test_grid_of_holes_bridged_through_shared_vertices():
+    # aligned holes make later bridges land on vertices duplicated by earlier ones
+    cell = np.array([[0, 0], [0, 2], [2, 2], [2, 0]], dtype=float)
+    holes = [cell + [1 + 3 * i, 1 + 3 * j] for i in range(3) for j in range(3)]
+
+    triangles = triangulatePolygon(SQUARE, holes)
+
+    areas = _areas(np.concatenate([SQUARE] + holes), triangles)
+    assert (areas > 0).all()
+    assert areas.sum() == pytest.approx(100 - 9 * 4)
+
+
+def test_collinear_and_repeated_vertices_are_skipped():
+    polygon = np.array([[0, 0], [1, 0], [2, 0], [2, 0], [2, 2], [0, 2]], dtype=float)
+
+    triangles = triangulatePolygon(polygon)
+
+    assert len(triangles) == 2
+    assert _areas(polygon, triangles).sum() == pytest.approx(4)
+
+
+def test_rings_mix_fans_and_ear_clipping():
+    hole = np.array([[4, 4], [4, 6], [6, 6], [6, 4]], dtype=float)
+    coords = np.concatenate([SQUARE, L_SHAPE + 20, SQUARE + 40, hole + 40])
+    offsets = np.array([0, 4, 10, 14, 18])
+
+    triangles, polygon = triangulateRings(
+        coords, offsets, np.array([0, 1, 2, 2]), np.array([False, False, False, True])
+    )
+
+    areas = _areas(coords, triangles)
+    assert (areas > 0).all()
+    totals = np.bincount(polygon, weights=areas)
+    assert totals == pytest.approx([100, 3, 96])
@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+import pytest
+from specklepy.objects.geometry import Mesh
+
+from utils import utils_raycast
+from utils.utils_other import COLOR_VISIBILITY
+from utils.utils_visibility import M, rayFan, rodrigues, rotate_vector, visibilityLayer
+
+
+def test_rotation_matrix_is_closed_form_rodrigues():
+    axis = np.array([1.0, 2.0, 2.0])
+    v = np.array([0.5, -1.0, 3.0])
+
+    rotated = M(axis, 0.7).dot(v)
+
+    assert rotated == pytest.approx(rodrigues(v, axis, np.array(0.7)))
+    assert M([0, 0, 2], math.pi / 2).dot([1, 0, 0]) == pytest.approx([0, 1, 0])
+    assert np.linalg.norm(rotated) == pytest.approx(np.linalg.norm(v))
+
+
+def _legacy_fan(vector, half_angle_degrees, step):
+    # the per-angle construction rayFan replaces
+    half_angle = np.deg2rad(half_angle_degrees)
+    count = int(half_angle_degrees / step)
+    vectors = [np.array(vector, dtype=float)]
+    for c in range(1, count + 1):
+        x = vector[0] * math.cos(half_angle * c / count) - vector[1] * math.sin(
+            half_angle * c / count
+        )
+        y = vector[0] * math.sin(half_angle * c / count) + vector[1] * math.cos(
+            half_angle * c / count
+        )
+        coeff = 1 - math.pow((count + 1 - c) / (count + 1), 100)
+        step2 = max(int(coeff * (count + 1 - c) * step), 1)
+        for a in range(0, 360, step2):
+            vectors.append(M(vector, a * math.pi / 180).dot([x, y, vector[2]]))
+    return np.array(vectors)
+
+
+@pytest.mark.parametrize("half_angle, step", [(70, 10), (45, 1), (30, 7)])
+def test_fan_matches_the_per_angle_rotations(half_angle, step):
+    vector = [1.0, 0.5, 0.2]
+
+    fan = rayFan(vector, half_angle, step)
+
+    assert fan.shape[1] == 3
+    assert fan == pytest.approx(_legacy_fan(vector, half_angle, step))
+
+
+def test_fan_rays_stay_within_the_cone():
+    vector = np.array([0.0, 1.0, 0.0])
+
+    fan = rayFan(vector, 60, 2)
+
+    cos = fan @ vector / np.linalg.norm(fan, axis=1)
+    assert np.degrees(np.arccos(np.clip(cos, -1, 1))).max() == pytest.approx(60)
+    assert (rotate_vector([1, 2, 3], vector, 60, 2) - [1, 2, 3]) == pytest.approx(fan)
+
+
+def _box(x0, y0, x1, y1, height):
+    vertices = [
+        [x0, y0, 0], [x1, y0, 0], [x1, y1, 0], [x0, y1, 0],
+        [x0, y0, height], [x1, y0, height], [x1, y1, height], [x0, y1, height],
+    ]  # fmt: skip
+    faces = [4, 0, 1, 5, 4, 4, 1, 2, 6, 5, 4, 2, 3, 7, 6, 4, 3, 0, 4, 7, 3, 4, 5, 6]
+    return Mesh.create(vertices=np.ravel(vertices).tolist(), faces=faces)
+
+
+def test_open_ground_sees_the_whole_sky():
+    layer = visibilityLayer([_box(100, 100, 110, 110, 5)], [[0, 0, 1.6]], radius=50)
+
+    assert layer.skyViewFactor == [1]
+    assert layer.visibleFaces == 0
+
+
+def test_street_canyon_sees_the_facing_walls_and_less_sky():
+    # a 10 m wide street between two long blocks, 21.6 m high
+    meshes = [
+        _box(-25, -500, -5, 500, 21.6),
+        _box(5, -500, 25, 500, 21.6),
+        _box(-1, -1, 1, 1, 30),
+    ]
+
+    layer = visibilityLayer(meshes, [[0, 0, 1.6]], radius=1000, rays=4000)
+
+    # the viewpoint stands inside the third block, which is ignored
+    (mesh,) = layer.displayValue
+    vertices = np.array(mesh.vertices).reshape(-1, 3)
+    assert layer.visibleFaces == 2
+    assert set(np.round(vertices[:, 0], 2)) == {-4.95, 4.95}
+    assert set(mesh.colors) == {COLOR_VISIBILITY}
+    # walls 20 m above the eye and 5 m away on both sides
+    expected = np.cos(np.arctan(20 / 5))
+    assert layer.skyViewFactor[0] == pytest.approx(expected, abs=0.02)
+
+
+def test_default_layer_casts_on_the_process_pool(monkeypatch):
+    pools = []
+
+    class SpyPool(utils_raycast.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(args)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(utils_raycast, "ProcessPoolExecutor", SpyPool)
+    meshes = [_box(-25, -50, -5, 50, 21.6), _box(5, -50, 25, 50, 21.6)]
+
+    pooled = visibilityLayer(meshes, [[0, 0, 1.6]], radius=100, workers=2)
+    serial = visibilityLayer(meshes, [[0, 0, 1.6]], radius=100, workers=1)
+
+    assert len(pools) == 1
+    assert pooled.visibleFaces == serial.visibleFaces == 2
+    assert pooled.skyViewFactor == serial.skyViewFactor
+
+
+def test_hits_next_to_another_building_are_refined():
+    # two blocks with a 10 cm joint in one facade, and a lone block behind
+    meshes = [
+        _box(5, -50, 10, -0.05, 10),
+        _box(5, 0.05, 10, 50, 10),
+        _box(-30, -5, -20, 5, 3),
+    ]
+
+    layer = visibilityLayer(meshes, [[0, 0, 1.6]], radius=100, workers=1)
+    lone = visibilityLayer(meshes[2:], [[0, 0, 1.6]], radius=100, workers=1)
+
+    assert sorted(layer.visibleBuildings) == [0, 1, 2]
+    assert layer.edgeRays > 0 and layer.edgeRays % 6 == 0
+    assert lone.visibleBuildings == [0]
+    assert lone.edgeRays == 0
+
+
+@pytest.mark.parametrize(
+    "meshes", [[], [_box(-5, -5, 5, 5, 10)]], ids=["no buildings", "own building"]
+)
+def test_no_obstacles_leave_the_whole_sky(meshes):
+    layer = visibilityLayer(meshes, [[0, 0, 1.6]], radius=100)
+
+    assert layer.skyViewFactor == [1]
+    assert layer.visibleFaces == 0
+    assert layer.displayValue[0].vertices == []
+
+
+def test_no_viewpoints_give_an_empty_layer():
+    layer = visibilityLayer([_box(10, 10, 20, 20, 5)], [], radius=100)
+
+    assert layer.viewpoints == layer.skyViewFactor == []
+    assert layer.visibleFaces == 0
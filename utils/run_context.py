@@ -5,9 +5,9 @@ from specklepy.objects import Base
 from specklepy.objects.other import Collection
 from specklepy.api.models import Branch 
 
-#from utils.utils_network import calculateAccessibility
 from utils.utils_osm import getBuildings, getRoads
 from utils.utils_other import RESULT_BRANCH
+from utils.utils_overpass import fetchElements
 
 def run(client, server_transport, base, radius_in_meters): 
     try:
@@ -27,11 +27,12 @@ def run(client, server_transport, base, radius_in_meters):
         crsObj = None
         commitObj = Collection(elements = [], units = "m", name = "Context", collectionType = "BuildingsLayer")
 
-        blds = getBuildings(lat, lon, radius_in_meters)
-        bases = [Base(units = "m", displayValue = [b]) for b in blds]
-        bldObj = Collection(elements = bases, units = "m", name = "Context", collectionType = "BuildingsLayer")
+        elements = fetchElements(lat, lon, radius_in_meters, ["building", "highway"])
+
+        blds = getBuildings(lat, lon, radius_in_meters, elements, merged = True)
+        bldObj = Collection(elements = [Base(units = "m", displayValue = blds)], units = "m", name = "Context", collectionType = "BuildingsLayer")
             
-        roads, meshes, analysisMeshes = getRoads(lat, lon, radius_in_meters)
+        roads, meshes, analysisMeshes = getRoads(lat, lon, radius_in_meters, elements, analysis = True)
         roadObj = Collection(elements = roads, units = "m", name = "Context", collectionType = "RoadsLayer")
         roadMeshObj = Collection(elements = meshes, units = "m", name = "Context", collectionType = "RoadMeshesLayer")
         analysisObj = Collection(elements = analysisMeshes, units = "m", name = "Context", collectionType = "RoadAnalysisLayer")
@@ -45,6 +46,7 @@ def run(client, server_transport, base, radius_in_meters):
         commitObj.elements.append(bldObj)
         commitObj.elements.append(roadObj)
         commitObj.elements.append(roadMeshObj)
+        commitObj.elements.append(analysisObj)
 
         objId = send(commitObj, transports=[server_transport]) 
         commit_id = client.commit.create(
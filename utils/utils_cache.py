@@ -0,0 +1,186 @@
+import gzip
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple
+
+from attrs import define
+
+TILE_DEGREES = 0.001  # ~110 m, location jitter below that reuses the same entry
+CACHE_DIR_ENV = "OVERPASS_CACHE_DIR"
+DISABLED = ("", "off", "0", "false")
+
+
+def quantizeBbox(
+    bbox: Tuple[float, float, float, float], step: float = TILE_DEGREES
+) -> Tuple[int, int, int, int]:
+    """Snap (south, west, north, east) outwards to whole tiles of the grid."""
+    south, west, north, east = bbox
+    return (
+        math.floor(south / step),
+        math.floor(west / step),
+        math.ceil(north / step),
+        math.ceil(east / step),
+    )
+
+
+def tileBbox(
+    tiles: Tuple[int, int, int, int], step: float = TILE_DEGREES
+) -> Tuple[float, float, float, float]:
+    """Bbox covered by the tile range of quantizeBbox."""
+    return tuple(round(t * step, 7) for t in tiles)  # type: ignore
+
+
+def splitTiles(
+    tiles: Tuple[int, int, int, int], splits: int
+) -> List[Tuple[int, int, int, int]]:
+    """Split a tile range into a grid of at most splits x splits sub-ranges.
+
+    Neighbouring sub-ranges share their border, Overpass bboxes are inclusive
+    so elements on a border come back from both sides.
+    """
+    south, west, north, east = tiles
+    ys = _cuts(south, north, splits)
+    xs = _cuts(west, east, splits)
+    return [
+        (ys[i], xs[j], ys[i + 1], xs[j + 1])
+        for i in range(len(ys) - 1)
+        for j in range(len(xs) - 1)
+    ]
+
+
+def _cuts(start: int, end: int, splits: int) -> List[int]:
+    if end <= start:
+        return [start, end]
+    splits = max(1, min(splits, end - start))
+    return sorted({start + (end - start) * k // splits for k in range(splits + 1)})
+
+
+@define
+class OverpassCache:
+    """Gzipped Overpass responses on disk with a TTL and a size bound.
+
+    Entries expire ``ttl_seconds`` after they were written. When the
+    directory grows past ``max_bytes`` the least recently read entries are
+    evicted first; the access time is set explicitly on every hit so this
+    also works on ``noatime`` mounts.
+    """
+
+    directory: Path
+    ttl_seconds: float = 7 * 24 * 3600
+    max_bytes: int = 512 * 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> Optional["OverpassCache"]:
+        """Cache in OVERPASS_CACHE_DIR, or the user cache dir; None if disabled."""
+        directory = os.environ.get(CACHE_DIR_ENV)
+        if directory is None:
+            directory = str(Path.home() / ".cache" / "speckle_context" / "overpass")
+        if directory.strip().lower() in DISABLED:
+            return None
+        return cls(Path(directory))
+
+    @staticmethod
+    def key(
+        tiles: Tuple[int, int, int, int], keywords: List[str], version: int
+    ) -> str:
+        features = "+".join(sorted(keywords))
+        return f"v{version}_{features}_" + "_".join(str(t) for t in tiles)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json.gz"
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """Decompressing reader over the response body, None when missing or expired."""
+        path = self._path(key)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - stat.st_mtime > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path, (now, stat.st_mtime))
+        return gzip.open(path, "rb")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Raw response body for key, or None when missing, expired or corrupt."""
+        reader = self.open(key)
+        if reader is None:
+            return None
+        try:
+            with reader:
+                return reader.read()
+        except (OSError, EOFError):
+            self.discard(key)
+            return None
+
+    def discard(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def writer(self, key: str) -> "CacheWriter":
+        """Stream a response body into the cache, visible only after commit()."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return CacheWriter(self, self._path(key))
+
+    def put(self, key: str, body: bytes) -> None:
+        writer = self.writer(key)
+        writer.write(body)
+        writer.commit()
+
+    def evict(self) -> None:
+        """Drop expired entries, then least recently used ones above max_bytes.
+
+        Temporary files older than the TTL are left by writers that died
+        before commit or abort, and are dropped as well.
+        """
+        now = time.time()
+        for path in self.directory.glob("*.tmp*"):
+            try:
+                if now - path.stat().st_mtime > self.ttl_seconds:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+
+        entries = []
+        for path in self.directory.glob("*.json.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class CacheWriter:
+    """Compresses chunks into a temporary file that replaces the entry on commit."""
+
+    def __init__(self, cache: OverpassCache, path: Path):
+        self._cache = cache
+        self._path = path
+        self._tmp = path.with_suffix(f".tmp{os.getpid()}-{threading.get_ident()}")
+        self._file = gzip.open(self._tmp, "wb", compresslevel=6)
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def commit(self) -> None:
+        self._file.close()
+        os.replace(self._tmp, self._path)
+        self._cache.evict()
+
+    def abort(self) -> None:
+        self._file.close()
+        self._tmp.unlink(missing_ok=True)
@@ -0,0 +1,42 @@
+import numpy as np
+
+LUT_SIZE = 256
+
+# (position, value) breakpoints per channel of the "jet" colormap
+_JET = (
+    ((0.0, 0.0), (0.35, 0.0), (0.66, 1.0), (0.89, 1.0), (1.0, 0.5)),
+    ((0.0, 0.0), (0.125, 0.0), (0.375, 1.0), (0.64, 1.0), (0.91, 0.0), (1.0, 0.0)),
+    ((0.0, 0.5), (0.11, 1.0), (0.34, 1.0), (0.65, 0.0), (1.0, 0.0)),
+)
+
+
+def segmentLut(channels, size: int = LUT_SIZE) -> np.ndarray:
+    """(size, 3) uint8 RGB table of a piecewise linear colormap."""
+    x = np.linspace(0.0, 1.0, size)
+    rgb = [np.interp(x, *np.transpose(points)) for points in channels]
+    return (np.column_stack(rgb) * 255).astype(np.uint8)
+
+
+JET = segmentLut(_JET)
+
+
+def colorize(
+    values: np.ndarray,
+    maxValue: float = None,
+    gamma: float = 1.0,
+    lut: np.ndarray = JET,
+) -> np.ndarray:
+    """Packed opaque ARGB ints of values through a colormap table.
+
+    Values are divided by ``maxValue`` (their maximum by default), clipped
+    to [0, 1] and raised to ``gamma``; NaNs take the lowest color.
+    """
+    values = np.asarray(values, dtype=float)
+    if maxValue is None:
+        maxValue = np.nanmax(values) if values.size else 0.0
+    fractions = values / maxValue if maxValue > 0 else np.zeros_like(values)
+    fractions = np.clip(np.nan_to_num(fractions), 0.0, 1.0) ** gamma
+
+    index = np.minimum((fractions * len(lut)).astype(np.int64), len(lut) - 1)
+    rgb = lut[index].astype(np.int64)
+    return (255 << 24) + (rgb[..., 0] << 16) + (rgb[..., 1] << 8) + rgb[..., 2]
@@ -0,0 +1,238 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+from attrs import define
+from specklepy.objects.geometry import Mesh
+
+from utils.utils_other import COLOR_BLD
+from utils.utils_triangulation import triangulateRings
+
+
+@define
+class Footprints:
+    """Building footprints as flat ring arrays.
+
+    Ring vertices of all buildings are stacked in ``coords`` (not closed, the
+    first vertex is not repeated). ``ring_offsets`` delimits the rings, rings
+    are grouped by building and ``ring_building`` gives the building of each.
+    """
+
+    coords: np.ndarray  # (N, 2)
+    ring_offsets: np.ndarray  # (R + 1,)
+    ring_building: np.ndarray  # (R,) non-decreasing
+    ring_hole: np.ndarray  # (R,) bool, inner rings
+    heights: np.ndarray  # (B,)
+
+    @classmethod
+    def from_rings(
+        cls,
+        outers: Sequence[np.ndarray],
+        heights: Sequence[float],
+        holes: Optional[Sequence[Sequence[np.ndarray]]] = None,
+    ) -> "Footprints":
+        """Footprints from one outer ring and a list of inner rings per building.
+
+        Rings with fewer than 3 vertices are dropped, a building left without
+        an outer ring extrudes to an empty mesh.
+        """
+        rings, building, hole = [], [], []
+        for b, outer in enumerate(outers):
+            for k, ring in enumerate([outer] + list(holes[b] if holes else [])):
+                ring = np.asarray(ring, dtype=float).reshape(-1, 2)
+                if len(ring) < 3:
+                    if k == 0:
+                        break
+                    continue
+                rings.append(ring)
+                building.append(b)
+                hole.append(k > 0)
+
+        lengths = [len(r) for r in rings]
+        return cls(
+            coords=np.concatenate(rings) if rings else np.empty((0, 2)),
+            ring_offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            ring_building=np.asarray(building, dtype=np.int64),
+            ring_hole=np.asarray(hole, dtype=bool),
+            heights=np.asarray(heights, dtype=float),
+        )
+
+    @property
+    def count(self) -> int:
+        return len(self.heights)
+
+    def ring_of_vertex(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.ring_building)), np.diff(self.ring_offsets))
+
+    def oriented(self) -> "Footprints":
+        """Copy with outer rings counter-clockwise and inner rings clockwise."""
+        ring = self.ring_of_vertex()
+        start = self.ring_offsets[:-1][ring]
+        end = self.ring_offsets[1:][ring]
+        nxt = np.arange(len(self.coords)) + 1
+        nxt[nxt == end] = start[nxt == end]
+
+        x, y = self.coords[:, 0], self.coords[:, 1]
+        cross = x * y[nxt] - x[nxt] * y
+        area = np.bincount(ring, weights=cross, minlength=len(self.ring_building))
+        flip = (area > 0) == self.ring_hole
+
+        order = np.arange(len(self.coords))
+        flipped = flip[ring]
+        order[flipped] = (start + end - 1 - order)[flipped]
+        return Footprints(
+            self.coords[order],
+            self.ring_offsets,
+            self.ring_building,
+            self.ring_hole,
+            self.heights,
+        )
+
+
+@define
+class ExtrudedMeshes:
+    """Extruded buildings sharing one set of vertex, face and color buffers.
+
+    Vertices and faces are laid out building by building, building ``b``
+    owns ``vertices[vertex_offsets[b]:vertex_offsets[b+1]]`` and the face
+    entries ``faces[face_offsets[b]:face_offsets[b+1]]``. Face entries use
+    the Speckle encoding (vertex count followed by the indices), indices
+    into the shared vertex buffer; ``face_index`` marks entries that are
+    vertex indices rather than counts.
+    """
+
+    vertices: np.ndarray  # (V, 3)
+    faces: np.ndarray  # (F,)
+    face_index: np.ndarray  # (F,) bool
+    colors: np.ndarray  # (V,)
+    vertex_offsets: np.ndarray  # (B + 1,)
+    face_offsets: np.ndarray  # (B + 1,)
+
+    def merged(self) -> Mesh:
+        """All buildings as a single mesh."""
+        return _mesh(self.vertices, self.faces, self.colors)
+
+    def meshes(self) -> List[Mesh]:
+        """One mesh per building, sliced from the shared buffers."""
+        base = np.repeat(self.vertex_offsets[:-1], np.diff(self.face_offsets))
+        local = np.where(self.face_index, self.faces - base, self.faces)
+        return [
+            _mesh(
+                self.vertices[v0:v1],
+                local[f0:f1],
+                self.colors[v0:v1],
+            )
+            for v0, v1, f0, f1 in zip(
+                self.vertex_offsets[:-1],
+                self.vertex_offsets[1:],
+                self.face_offsets[:-1],
+                self.face_offsets[1:],
+            )
+        ]
+
+
+def _mesh(vertices: np.ndarray, faces: np.ndarray, colors: np.ndarray) -> Mesh:
+    obj = Mesh.create(
+        vertices=vertices.ravel().tolist(),
+        faces=faces.tolist(),
+        colors=colors.tolist(),
+    )
+    obj.units = "m"
+    return obj
+
+
+def _group(sections: List[np.ndarray], owners: List[np.ndarray]):
+    """Stable reorder of stacked sections so entries of a building are contiguous."""
+    owner = np.concatenate(owners)
+    order = np.argsort(owner, kind="stable")
+    return np.concatenate(sections)[order], owner[order], order
+
+
+def extrudeFootprints(footprints: Footprints, color: int = COLOR_BLD) -> ExtrudedMeshes:
+    """Extrude all footprints at once into flat-shaded prisms.
+
+    Per building the vertices are the bottom rings, the top rings and four
+    vertices per wall quad. Floor and roof are triangulated around the
+    courtyards of inner rings, whose walls face into the courtyard.
+    """
+    fp = footprints.oriented()
+    n = len(fp.coords)
+    ring = fp.ring_of_vertex()
+    building = fp.ring_building[ring]
+    height = fp.heights[building]
+
+    start = fp.ring_offsets[:-1][ring]
+    end = fp.ring_offsets[1:][ring]
+    nxt = np.arange(n) + 1
+    nxt[nxt == end] = start[nxt == end]
+
+    # vertices: [bottom | top | walls], walls as (a0, b0, b1, a1) per edge
+    zero = np.zeros(n)
+    bottom = np.column_stack([fp.coords, zero])
+    top = np.column_stack([fp.coords, height])
+    walls = np.stack(
+        [bottom, np.column_stack([fp.coords[nxt], zero]), top[nxt], top], axis=1
+    ).reshape(-1, 3)
+    vertices, vertex_owner, order = _group(
+        [bottom, top, walls], [building, building, np.repeat(building, 4)]
+    )
+    new_index = np.empty_like(order)
+    new_index[order] = np.arange(len(order))
+
+    # faces: triangulated floor (clockwise seen from above) and roof per building
+    tris, tri_building = triangulateRings(
+        fp.coords, fp.ring_offsets, fp.ring_building, fp.ring_hole
+    )
+    three = np.full((len(tris), 1), 3)
+    floor = np.hstack([three, new_index[tris[:, ::-1]]]).ravel()
+    roof = np.hstack([three, new_index[tris + n]]).ravel()
+    cap_owner = np.repeat(tri_building, 4)
+    cap_index = np.tile([False, True, True, True], len(tris))
+
+    quads = np.column_stack(
+        [np.full(n, 4), new_index[2 * n + 4 * np.arange(n)[:, None] + np.arange(4)]]
+    ).ravel()
+    quad_index = np.tile([False, True, True, True, True], n)
+
+    faces, face_owner, face_order = _group(
+        [floor, roof, quads], [cap_owner, cap_owner, np.repeat(building, 5)]
+    )
+    face_index = np.concatenate([cap_index, cap_index, quad_index])[face_order]
+
+    buildings = np.arange(fp.count + 1)
+    return ExtrudedMeshes(
+        vertices=vertices,
+        faces=faces.astype(np.int64),
+        face_index=face_index,
+        colors=np.full(len(vertices), color, dtype=np.int64),
+        vertex_offsets=np.searchsorted(vertex_owner, buildings),
+        face_offsets=np.searchsorted(face_owner, buildings),
+    )
+
+
+def fillFootprints(footprints: Footprints, colors=COLOR_BLD) -> ExtrudedMeshes:
+    """Flat triangulated surfaces of the footprints at z = 0, facing up.
+
+    ``colors`` is one ARGB color for all surfaces or one per footprint.
+    """
+    fp = footprints.oriented()
+    owner = fp.ring_building[fp.ring_of_vertex()]
+    vertices = np.column_stack([fp.coords, np.zeros(len(fp.coords))])
+
+    tris, tri_owner = triangulateRings(
+        fp.coords, fp.ring_offsets, fp.ring_building, fp.ring_hole
+    )
+    faces, face_owner, _ = _group(
+        [np.hstack([np.full((len(tris), 1), 3), tris]).ravel()],
+        [np.repeat(tri_owner, 4)],
+    )
+
+    buildings = np.arange(fp.count + 1)
+    colors = np.broadcast_to(np.asarray(colors, dtype=np.int64), (fp.count,))
+    return ExtrudedMeshes(
+        vertices=vertices,
+        faces=faces.astype(np.int64),
+        face_index=np.tile([False, True, True, True], len(tris)),
+        colors=colors[owner],
+        vertex_offsets=np.searchsorted(owner, buildings),
+        face_offsets=np.searchsorted(face_owner, buildings),
+    )
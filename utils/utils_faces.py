@@ -0,0 +1,310 @@
+import weakref
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from attrs import define
+from specklepy.objects.geometry import Mesh
+
+PAIR_CHUNK = 1_000_000  # (point, edge) pairs tested at once
+
+_geometries = weakref.WeakKeyDictionary()  # MeshGeometry of every mesh seen
+
+
+def decodeFaces(faces: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Offsets and vertex indices of the faces in a Speckle face list.
+
+    Faces are ``[n, i0, ..., in-1, ...]``; the legacy counts 0 and 1 stand
+    for triangles and quads. The count entries are found by pointer
+    jumping: every entry points past the face it would head, and the
+    chain from entry 0 is followed in doubling steps, all entries at once.
+    Returns ``offsets`` (F + 1,) into ``index``, the vertex indices.
+    """
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1)
+    total = len(faces)
+    sizes = np.where(faces == 0, 3, np.where(faces == 1, 4, faces))
+    jump = np.append(np.clip(np.arange(total) + sizes + 1, 0, total), total)
+    head = np.zeros(total + 1, dtype=bool)
+    head[0] = True
+    while jump[0] < total:
+        head[jump[head]] = True
+        jump = jump[jump]
+    starts = np.flatnonzero(head[:total])
+
+    counts = np.minimum(sizes[starts], total - starts - 1)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    k = np.arange(offsets[-1]) - np.repeat(offsets[:-1], counts)
+    index = faces[np.repeat(starts + 1, counts) + k]
+    return offsets, index
+
+
+def fanTriangles(
+    offsets: np.ndarray, index: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(T, 3) fan triangles of decoded faces and the face each belongs to."""
+    sizes = np.diff(offsets)
+    fans = np.maximum(sizes - 2, 0)
+    face = np.repeat(np.arange(len(sizes)), fans)
+    k = np.arange(int(fans.sum())) - np.repeat(np.cumsum(fans) - fans, fans) + 1
+    first = offsets[:-1][face]
+    tris = np.column_stack([index[first], index[first + k], index[first + k + 1]])
+    return tris, face
+
+
+@define
+class FaceFrames:
+    """Planar polygon faces with a local 2D frame cached per face.
+
+    Face vertices are stacked in ``coords``, ``offsets`` delimits the faces.
+    Every face has an origin (its first vertex), a unit normal (Newell's
+    method, robust for non-convex and slightly warped faces) and in-plane
+    axes ``u`` and ``v``; ``coords2d`` are the vertices in that frame.
+    """
+
+    coords: np.ndarray  # (V, 3)
+    offsets: np.ndarray  # (F + 1,)
+    origin: np.ndarray  # (F, 3)
+    normal: np.ndarray  # (F, 3)
+    u: np.ndarray  # (F, 3)
+    v: np.ndarray  # (F, 3)
+    coords2d: np.ndarray  # (V, 2)
+
+    @classmethod
+    def from_polygons(
+        cls, polygons: Sequence[Sequence[Sequence[float]]]
+    ) -> "FaceFrames":
+        lengths = [len(p) for p in polygons]
+        rings = [np.asarray(p, dtype=float).reshape(-1, 3) for p in polygons]
+        coords = np.concatenate(rings) if rings else np.empty((0, 3))
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        return cls.from_arrays(coords, offsets)
+
+    @classmethod
+    def from_arrays(cls, coords: np.ndarray, offsets: np.ndarray) -> "FaceFrames":
+        coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        sizes = np.diff(offsets)
+        face = np.repeat(np.arange(len(sizes)), sizes)
+
+        # Newell normal: sum of the cross products of consecutive vertices
+        following = np.arange(len(coords)) + 1
+        following[offsets[1:][sizes > 0] - 1] = offsets[:-1][sizes > 0]
+        normal = np.zeros((len(sizes), 3))
+        np.add.at(normal, face, np.cross(coords, coords[following]))
+        normal /= np.maximum(np.linalg.norm(normal, axis=1), 1e-300)[:, None]
+
+        # u along the first edge, as createPlane does, v completes the frame
+        starts = offsets[:-1][sizes > 1]
+        origin = np.zeros((len(sizes), 3))
+        u = np.zeros((len(sizes), 3))
+        origin[sizes > 1] = coords[starts]
+        u[sizes > 1] = coords[starts + 1] - coords[starts]
+        u -= normal * np.einsum("ij,ij->i", u, normal)[:, None]
+        u /= np.maximum(np.linalg.norm(u, axis=1), 1e-300)[:, None]
+        v = np.cross(normal, u)
+        relative = coords - origin[face]
+
+        return cls(
+            coords=coords,
+            offsets=offsets,
+            origin=origin,
+            normal=normal,
+            u=u,
+            v=v,
+            coords2d=np.column_stack(
+                [
+                    np.einsum("ij,ij->i", relative, u[face]),
+                    np.einsum("ij,ij->i", relative, v[face]),
+                ]
+            ),
+        )
+
+    @property
+    def count(self) -> int:
+        return len(self.offsets) - 1
+
+    def project(self, points: np.ndarray, faces: np.ndarray) -> np.ndarray:
+        """(P, 2) coordinates of points in the frame of their paired face."""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        frames = np.stack([self.u[faces], self.v[faces]], axis=1)  # (P, 2, 3)
+        return np.einsum("pkj,pj->pk", frames, points - self.origin[faces])
+
+    def contains(self, points: np.ndarray, faces: np.ndarray) -> np.ndarray:
+        """Whether each point lies inside its paired face, seen along the normal.
+
+        Even-odd crossing test of the projected point against every edge of
+        the face, for all pairs at once.
+        """
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1)
+        xy = self.project(points, faces)
+        sizes = np.diff(self.offsets)[faces]
+        inside = np.zeros(len(faces), dtype=bool)
+
+        # chunks of points whose edges fit in PAIR_CHUNK pairs
+        ends = np.cumsum(sizes)
+        a = 0
+        while a < len(faces):
+            b = max(int(np.searchsorted(ends, ends[a] - sizes[a] + PAIR_CHUNK)), a + 1)
+            inside[a:b] = self._crossings(xy[a:b], faces[a:b], sizes[a:b]) % 2 == 1
+            a = b
+        return inside
+
+    def _crossings(self, xy: np.ndarray, faces: np.ndarray, sizes: np.ndarray):
+        pair = np.repeat(np.arange(len(faces)), sizes)
+        k = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        start = self.offsets[faces][pair]
+        p0 = self.coords2d[start + k]
+        p1 = self.coords2d[start + (k + 1) % sizes[pair]]
+        x, y = xy[pair, 0], xy[pair, 1]
+
+        straddles = (p0[:, 1] > y) != (p1[:, 1] > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cross_x = p0[:, 0] + (y - p0[:, 1]) * (p1[:, 0] - p0[:, 0]) / (
+                p1[:, 1] - p0[:, 1]
+            )
+        hits = straddles & (x < cross_x)
+        return np.bincount(pair[hits], minlength=len(faces))
+
+
+def planeHits(
+    origins: np.ndarray,
+    directions: np.ndarray,
+    frames: FaceFrames,
+    faces: np.ndarray,
+    epsilon: float = 1e-6,
+) -> np.ndarray:
+    """Ray parameter where each ray meets the plane of its paired face.
+
+    NaN where the ray runs parallel to the plane; negative values lie
+    behind the ray origin.
+    """
+    normal = frames.normal[faces]
+    ndotu = np.einsum("ij,ij->i", normal, directions)
+    w = origins - frames.origin[faces]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = -np.einsum("ij,ij->i", normal, w) / ndotu
+    return np.where(np.abs(ndotu) < epsilon, np.nan, t)
+
+
+@define
+class MeshGeometry:
+    """A Speckle mesh compiled to arrays, built once and shared by all queries.
+
+    ``index[offsets[f]:offsets[f+1]]`` are the vertices of face ``f``. Faces
+    carry their frames (see FaceFrames), bounding boxes and fan triangles.
+    """
+
+    vertices: np.ndarray  # (N, 3)
+    offsets: np.ndarray  # (F + 1,)
+    index: np.ndarray  # vertex of every face corner
+    frames: FaceFrames
+    lo: np.ndarray  # (F, 3) face box minimum
+    hi: np.ndarray  # (F, 3) face box maximum
+    triangles: np.ndarray  # (T, 3) vertex indices
+    triangle_face: np.ndarray  # (T,)
+    source: tuple  # vertex and face lists the arrays were built from
+
+    @classmethod
+    def from_meshes(cls, meshes: Sequence[Mesh]) -> List["MeshGeometry"]:
+        """Compile many meshes in one pass over their stacked buffers."""
+        vertices = [np.asarray(m.vertices, dtype=float).reshape(-1, 3) for m in meshes]
+        faces = [np.asarray(m.faces, dtype=np.int64).reshape(-1) for m in meshes]
+        vertex_offsets = np.cumsum([0] + [len(v) for v in vertices])
+        entry_offsets = np.cumsum([0] + [len(f) for f in faces])
+
+        # faces never span two meshes, so the stacked face lists decode as one
+        stacked = np.concatenate(faces) if faces else np.empty(0, dtype=np.int64)
+        offsets, index = decodeFaces(stacked)
+        starts = offsets[:-1] + np.arange(len(offsets) - 1)  # entry of every count
+        face_offsets = np.searchsorted(starts, entry_offsets)
+        corner_offsets = offsets[face_offsets]
+        sizes = np.diff(offsets)
+        face_mesh = np.repeat(np.arange(len(meshes)), np.diff(face_offsets))
+        index = index + np.repeat(vertex_offsets[:-1][face_mesh], sizes)
+
+        allVertices = np.concatenate(vertices) if vertices else np.empty((0, 3))
+        corners = allVertices[index]
+        frames = FaceFrames.from_arrays(corners, offsets)
+        lo = np.zeros((len(sizes), 3))
+        hi = np.zeros((len(sizes), 3))
+        lo[sizes > 0] = np.minimum.reduceat(corners, offsets[:-1][sizes > 0], axis=0)
+        hi[sizes > 0] = np.maximum.reduceat(corners, offsets[:-1][sizes > 0], axis=0)
+        triangles, triangle_face = fanTriangles(offsets, index)
+        triangle_offsets = np.searchsorted(triangle_face, face_offsets)
+
+        # back to mesh-local vertex and face numbers
+        index -= np.repeat(vertex_offsets[:-1][face_mesh], sizes)
+        triangles -= vertex_offsets[:-1][face_mesh[triangle_face]][:, None]
+        triangle_face -= face_offsets[:-1][face_mesh[triangle_face]]
+
+        geometries = []
+        for k, mesh in enumerate(meshes):
+            f0, f1 = face_offsets[k], face_offsets[k + 1]
+            c0, c1 = corner_offsets[k], corner_offsets[k + 1]
+            t0, t1 = triangle_offsets[k], triangle_offsets[k + 1]
+            local = offsets[f0 : f1 + 1] - c0
+            geometries.append(
+                cls(
+                    vertices=vertices[k],
+                    offsets=local,
+                    index=index[c0:c1],
+                    frames=FaceFrames(
+                        coords=corners[c0:c1],
+                        offsets=local,
+                        origin=frames.origin[f0:f1],
+                        normal=frames.normal[f0:f1],
+                        u=frames.u[f0:f1],
+                        v=frames.v[f0:f1],
+                        coords2d=frames.coords2d[c0:c1],
+                    ),
+                    lo=lo[f0:f1],
+                    hi=hi[f0:f1],
+                    triangles=triangles[t0:t1],
+                    triangle_face=triangle_face[t0:t1],
+                    source=(mesh.vertices, mesh.faces),
+                )
+            )
+        return geometries
+
+    @property
+    def face_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def bbox(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Box of all face vertices, empty meshes give an inverted box."""
+        if not len(self.lo):
+            return np.full(3, np.inf), np.full(3, -np.inf)
+        return self.lo.min(axis=0), self.hi.max(axis=0)
+
+    def polygons(self) -> List[List[List[float]]]:
+        """Vertex lists of the faces."""
+        corners = self.vertices[self.index].tolist()
+        return [corners[a:b] for a, b in zip(self.offsets[:-1], self.offsets[1:])]
+
+
+def _current(geometry: MeshGeometry, mesh: Mesh) -> bool:
+    return (
+        geometry is not None
+        and geometry.source[0] is mesh.vertices
+        and geometry.source[1] is mesh.faces
+    )
+
+
+def meshGeometries(meshes: Sequence[Mesh]) -> List[MeshGeometry]:
+    """Compiled geometry of every mesh, cached for as long as the mesh lives.
+
+    Meshes not seen before are compiled together. The cache follows
+    reassigned ``vertices``/``faces`` lists, lists edited in place are not
+    noticed.
+    """
+    geometries = [_geometries.get(mesh) for mesh in meshes]
+    stale = [
+        k for k, (mesh, g) in enumerate(zip(meshes, geometries)) if not _current(g, mesh)
+    ]
+    compiled = MeshGeometry.from_meshes([meshes[k] for k in stale])
+    for k, geometry in zip(stale, compiled):
+        _geometries[meshes[k]] = geometries[k] = geometry
+    return geometries
+
+
+def meshGeometry(mesh: Mesh) -> MeshGeometry:
+    return meshGeometries([mesh])[0]
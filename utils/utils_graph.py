@@ -0,0 +1,205 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from attrs import define
+
+from utils.utils_overpass import OsmElements
+
+
+def splitWays(
+    offsets: np.ndarray, refs: np.ndarray, network: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split ways into edges at every node where the network branches.
+
+    ``refs[offsets[w]:offsets[w+1]]`` are the node IDs of way ``w``. A way
+    is cut at each interior node that occurs more than once in the whole
+    network: junctions with other ways and self-intersections of loops.
+    The cut node ends one edge and starts the next. One linear pass apart
+    from the node count.
+
+    When the ways are only part of a network, ``network`` holds the node IDs
+    of all its ways, and they are counted instead of ``refs``, so the part
+    is cut exactly as in the whole.
+
+    Returns the edge offsets, the edge node IDs and the way of every edge.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    refs = np.asarray(refs, dtype=np.int64)
+    lengths = np.diff(offsets)
+    way = np.repeat(np.arange(len(lengths)), lengths)
+
+    if network is None:
+        _, inverse, counts = np.unique(refs, return_inverse=True, return_counts=True)
+        shared = counts[inverse] > 1
+    else:
+        network = np.asarray(network, dtype=np.int64)
+        nodes, counts = np.unique(network, return_counts=True)
+        pos = np.searchsorted(nodes, refs)
+        known = pos < len(nodes)
+        known[known] = nodes[pos[known]] == refs[known]
+        shared = np.zeros(len(refs), dtype=bool)
+        shared[known] = counts[pos[known]] > 1
+    interior = np.ones(len(refs), dtype=bool)
+    interior[offsets[:-1][lengths > 0]] = False
+    interior[offsets[1:][lengths > 0] - 1] = False
+    cut = interior & shared
+
+    # cut nodes are written twice, as the end of one edge and the start of the next
+    copies = 1 + cut.astype(np.int64)
+    first_copy = np.cumsum(copies) - copies
+    edge_refs = np.repeat(refs, copies)
+    way_starts = first_copy[offsets[:-1][lengths > 0]]
+    starts = np.concatenate([way_starts, first_copy[cut] + 1])
+    starts.sort()
+    edge_offsets = np.concatenate([starts, [len(edge_refs)]]).astype(np.int64)
+    edge_way = way[np.searchsorted(first_copy, starts, side="right") - 1]
+    return edge_offsets, edge_refs, edge_way
+
+
+@define
+class RoadGraph:
+    """Undirected road network in compressed sparse row form.
+
+    Graph nodes are the junctions and dead ends of the network, edges are
+    the way pieces between them (see splitWays). The adjacency of node
+    ``n`` is ``indices[indptr[n]:indptr[n+1]]``, with the edge taken to each
+    neighbour in ``adjacent_edges``. Edge geometry is kept as OSM node IDs
+    and lengths are in projected metres along the geometry.
+    """
+
+    node_ids: np.ndarray  # (N,) OSM ID of every graph node
+    coords: np.ndarray  # (N, 2) projected
+    indptr: np.ndarray  # (N + 1,)
+    indices: np.ndarray  # (2E,) neighbour nodes
+    adjacent_edges: np.ndarray  # (2E,)
+    edge_nodes: np.ndarray  # (E, 2) graph node at either end
+    edge_length: np.ndarray  # (E,)
+    edge_class: np.ndarray  # (E,) index into classes
+    classes: List[str]
+    edge_way: np.ndarray  # (E,) OSM way ID
+    edge_offsets: np.ndarray  # (E + 1,)
+    edge_refs: np.ndarray  # OSM node IDs along every edge
+    edge_ref_coords: np.ndarray  # (len(edge_refs), 2) projected
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_length)
+
+    def degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def edge_coords(self, edge: int) -> np.ndarray:
+        """(K, 2) projected polyline of an edge."""
+        a, b = self.edge_offsets[edge], self.edge_offsets[edge + 1]
+        return self.edge_ref_coords[a:b]
+
+    @classmethod
+    def from_elements(
+        cls, elements: OsmElements, projectedCrs, keyword: str = "highway"
+    ) -> "RoadGraph":
+        """Graph of the ways tagged with keyword, areas (area=yes) left out."""
+        rows = [
+            r
+            for r in elements.way_rows(keyword)
+            if elements.way_tags(r).get("area") != "yes"
+        ]
+        classes, way_class = np.unique(
+            [elements.way_tags(r)[keyword] for r in rows], return_inverse=True
+        )
+        rows = np.asarray(rows, dtype=np.int64)
+
+        # node IDs of the selected ways, without nodes missing from the response
+        starts = elements.way_offsets[rows]
+        lengths = elements.way_offsets[rows + 1] - starts
+        way = np.repeat(np.arange(len(rows)), lengths)
+        refs = elements.way_refs[
+            np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            + np.arange(int(lengths.sum()))
+        ]
+        known = elements.node_rows(refs) >= 0
+        refs, way = refs[known], way[known]
+        offsets = np.searchsorted(way, np.arange(len(rows) + 1))
+        return cls.from_ways(
+            offsets,
+            refs,
+            elements.node_coords(projectedCrs)[elements.node_rows(refs)],
+            elements.way_ids[rows],
+            way_class,
+            [str(c) for c in classes],
+        )
+
+    @classmethod
+    def from_ways(
+        cls,
+        offsets: np.ndarray,
+        refs: np.ndarray,
+        ref_coords: np.ndarray,
+        way_ids: np.ndarray,
+        way_class: np.ndarray,
+        classes: List[str],
+    ) -> "RoadGraph":
+        """Graph of ways given as node ID runs with a coordinate per node."""
+        offsets = np.asarray(offsets, dtype=np.int64)
+        refs = np.asarray(refs, dtype=np.int64)
+        edge_offsets, edge_refs, edge_way = splitWays(offsets, refs)
+        # coordinates follow the refs, cut nodes are duplicated the same way
+        lengths = np.diff(offsets)
+        interior = np.ones(len(refs), dtype=bool)
+        _, inverse, counts = np.unique(refs, return_inverse=True, return_counts=True)
+        interior[offsets[:-1][lengths > 0]] = False
+        interior[offsets[1:][lengths > 0] - 1] = False
+        copies = 1 + (interior & (counts[inverse] > 1))
+        ref_coords = np.asarray(ref_coords, dtype=float).reshape(-1, 2)
+        coords = np.repeat(ref_coords, copies, axis=0)
+
+        # drop single-node edges, they carry no movement
+        sizes = np.diff(edge_offsets)
+        keep = sizes >= 2
+        keep_ref = np.repeat(keep, sizes)
+        edge_refs, coords = edge_refs[keep_ref], coords[keep_ref]
+        edge_way, sizes = edge_way[keep], sizes[keep]
+        edge_offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+        step = np.hypot(*np.diff(coords, axis=0).T)
+        within = np.ones(len(step), dtype=bool)
+        within[edge_offsets[1:-1] - 1] = False
+        edge_of_step = np.repeat(np.arange(len(sizes)), sizes)[:-1]
+        edge_length = np.bincount(
+            edge_of_step, weights=np.where(within, step, 0.0), minlength=len(sizes)
+        )
+
+        first, last = edge_offsets[:-1], edge_offsets[1:] - 1
+        ends = np.column_stack([edge_refs[first], edge_refs[last]])
+        node_ids, edge_nodes = np.unique(ends, return_inverse=True)
+        edge_nodes = edge_nodes.reshape(-1, 2)
+        node_coords = np.empty((len(node_ids), 2))
+        node_coords[edge_nodes[:, 0]] = coords[first]
+        node_coords[edge_nodes[:, 1]] = coords[last]
+
+        # both directions of every edge, grouped by source node
+        edge = np.arange(len(sizes))
+        src = np.concatenate([edge_nodes[:, 0], edge_nodes[:, 1]])
+        dst = np.concatenate([edge_nodes[:, 1], edge_nodes[:, 0]])
+        order = np.argsort(src, kind="stable")
+        degree = np.bincount(src, minlength=len(node_ids))
+        indptr = np.concatenate([[0], np.cumsum(degree)])
+
+        return cls(
+            node_ids=node_ids,
+            coords=node_coords,
+            indptr=indptr.astype(np.int64),
+            indices=dst[order],
+            adjacent_edges=np.concatenate([edge, edge])[order],
+            edge_nodes=edge_nodes,
+            edge_length=edge_length,
+            edge_class=np.asarray(way_class, dtype=np.int64)[edge_way],
+            classes=list(classes),
+            edge_way=np.asarray(way_ids, dtype=np.int64)[edge_way],
+            edge_offsets=edge_offsets,
+            edge_refs=edge_refs,
+            edge_ref_coords=coords,
+        )
@@ -0,0 +1,457 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from attrs import define, field
+from specklepy.objects import Base
+from specklepy.objects.geometry import Mesh
+from specklepy.objects.other import Collection
+from specklepy.transports.abstract_transport import AbstractTransport
+
+from utils.utils_cache import DISABLED, TILE_DEGREES, quantizeBbox, splitTiles
+from utils.utils_extrusion import ExtrudedMeshes
+from utils.utils_osm import extrudedBuildings, getRoads, roadNetwork, roadWays
+from utils.utils_overpass import OsmElements, OsmRelation
+from utils.utils_pyproj import getBbox
+from utils.utils_speckle import (
+    Closure,
+    ObjectReference,
+    existingObjects,
+    shareGeometry,
+)
+from utils.utils_visibility import EYE_HEIGHT, visibilityLayer
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR_ENV = "CONTEXT_STATE_DIR"
+STATE_VERSION = 2  # bump when the layers change to rebuild every tile once
+TILE_METERS = 250.0  # side of the tiles rebuilt independently
+KEYWORDS = ["building", "highway"]
+
+TILE_LAYERS = ["buildings", "roads", "roadMeshes"]
+AREA_LAYERS = ["analysis", "visibility"]  # depend on every tile
+
+Tile = Tuple[int, int, int, int]
+SentObject = Tuple[str, Closure]
+
+
+@define
+class TileRecord:
+    """Content hash of a tile and the objects sent for it, by layer."""
+
+    hash: str
+    objects: Dict[str, SentObject] = field(factory=dict)
+
+
+@define
+class ContextRecords:
+    """What was sent for one location and set of options of a project."""
+
+    key: str
+    tiles: Dict[str, TileRecord] = field(factory=dict)
+    area: Optional[TileRecord] = None
+
+    def to_json(self) -> dict:
+        def record(r: TileRecord) -> dict:
+            return {"hash": r.hash, "objects": r.objects}
+
+        return {
+            "key": self.key,
+            "tiles": {t: record(r) for t, r in self.tiles.items()},
+            "area": record(self.area) if self.area is not None else None,
+        }
+
+    def verify(self, transport: AbstractTransport) -> None:
+        """Forget tiles and area whose objects or children transport lacks.
+
+        The forgotten tiles are rebuilt and sent again by the next run.
+        """
+        records = list(self.tiles.values())
+        if self.area is not None:
+            records.append(self.area)
+        ids = {
+            i
+            for record in records
+            for objId, closure in record.objects.values()
+            for i in [objId, *closure]
+        }
+        present = existingObjects(transport, sorted(ids))
+
+        def complete(record: TileRecord) -> bool:
+            return all(
+                present.get(objId) and all(present.get(c) for c in closure)
+                for objId, closure in record.objects.values()
+            )
+
+        self.tiles = {t: r for t, r in self.tiles.items() if complete(r)}
+        if self.area is not None and not complete(self.area):
+            self.area = None
+
+    @classmethod
+    def from_json(cls, data: dict) -> "ContextRecords":
+        def record(r: dict) -> TileRecord:
+            return TileRecord(r["hash"], {k: tuple(v) for k, v in r["objects"].items()})
+
+        area = data.get("area")
+        return cls(
+            data["key"],
+            {t: record(r) for t, r in data["tiles"].items()},
+            record(area) if area is not None else None,
+        )
+
+
+@define
+class ContextState:
+    """Records of the last context sent to every server and project, one file each."""
+
+    directory: Path
+
+    @classmethod
+    def from_env(cls) -> Optional["ContextState"]:
+        """State in CONTEXT_STATE_DIR, or the user cache dir; None if disabled.
+
+        CONTEXT_STATE_DIR must point at storage that outlives the run, such as
+        a mounted volume. The user cache dir is wiped with the Automate
+        container, so every run there starts from empty records and rebuilds
+        the whole context.
+        """
+        directory = os.environ.get(STATE_DIR_ENV)
+        if directory is None:
+            directory = str(Path.home() / ".cache" / "speckle_context" / "state")
+        if directory.strip().lower() in DISABLED:
+            return None
+        return cls(Path(directory))
+
+    def _path(self, server: str, projectId: str) -> Path:
+        name = f"{server.rstrip('/')}_{projectId}"
+        return self.directory / (re.sub(r"[^\w.-]", "_", name) + ".json")
+
+    def load(self, server: str, projectId: str, key: str) -> ContextRecords:
+        """Records of the project, empty if missing, unreadable or for another key.
+
+        The objects may have been deleted on the server since, check the
+        loaded records with ContextRecords.verify.
+        """
+        path = self._path(server, projectId)
+        try:
+            records = ContextRecords.from_json(json.loads(path.read_text()))
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.warning(
+                "No previous context records in %s, rebuilding every tile;"
+                " set %s to persistent storage to reuse them across runs",
+                path,
+                STATE_DIR_ENV,
+            )
+            return ContextRecords(key)
+        return records if records.key == key else ContextRecords(key)
+
+    def save(self, server: str, projectId: str, records: ContextRecords) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(server, projectId)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps(records.to_json()))
+        os.replace(tmp, path)
+
+
+def contextKey(
+    lat: float, lon: float, r: float, visibility: bool, analysis: bool
+) -> str:
+    """Everything besides the OSM data that shapes the context of a location."""
+    options = f"{int(visibility)}{int(analysis)}"
+    return f"v{STATE_VERSION}_{lat:.7f}_{lon:.7f}_{r:g}_{options}"
+
+
+def tileGrid(
+    lat: float, lon: float, r: float, tileMeters: float = TILE_METERS
+) -> List[Tile]:
+    """Tiles of the cache grid covering the area, about tileMeters wide."""
+    tiles = quantizeBbox(getBbox(lat, lon, r))
+    return splitTiles(tiles, max(1, math.ceil(2 * r / tileMeters)))
+
+
+def tileOwners(lats: np.ndarray, lons: np.ndarray, grid: List[Tile]) -> np.ndarray:
+    """Tile of every point, points outside the grid go to the nearest tile."""
+    ys = np.array(sorted({t[0] for t in grid} | {grid[-1][2]}), dtype=float)
+    xs = np.array(sorted({t[1] for t in grid} | {grid[-1][3]}), dtype=float)
+    i = np.searchsorted(ys, np.asarray(lats) / TILE_DEGREES, side="right") - 1
+    j = np.searchsorted(xs, np.asarray(lons) / TILE_DEGREES, side="right") - 1
+    i = np.clip(i, 0, len(ys) - 2)
+    j = np.clip(j, 0, len(xs) - 2)
+    return i * (len(xs) - 1) + j
+
+
+@define
+class TileFeatures:
+    """Way rows and relations owned by one tile, by keyword."""
+
+    rows: Dict[str, np.ndarray]
+    relations: Dict[str, List[OsmRelation]]
+    hash: str
+
+    @property
+    def empty(self) -> bool:
+        return not any(len(r) for r in self.rows.values()) and not any(
+            self.relations.values()
+        )
+
+
+def splitFeatures(
+    elements: OsmElements, grid: List[Tile], keywords: List[str] = KEYWORDS
+) -> List[TileFeatures]:
+    """Tagged ways and relations of every tile, with a hash of their content.
+
+    A feature belongs to the tile of its first node, a relation to that of
+    its first member way found. The hash covers IDs, tags, node lists and
+    node coordinates of everything a tile owns, so it changes exactly when
+    the tile has to be rebuilt.
+    """
+    lat, lon = elements.node_lat, elements.node_lon
+    offsets = elements.way_offsets
+    refs = elements.way_refs
+
+    def firstNode(rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        empty = offsets[rows + 1] == offsets[rows]
+        first = elements.node_rows(refs[np.minimum(offsets[rows], len(refs) - 1)])
+        return np.where(empty, -1, first)
+
+    def owners(nodeRows: np.ndarray) -> np.ndarray:
+        found = nodeRows >= 0
+        tiles = np.zeros(len(nodeRows), dtype=np.int64)
+        tiles[found] = tileOwners(lat[nodeRows[found]], lon[nodeRows[found]], grid)
+        return tiles
+
+    wayDigests: Dict[int, bytes] = {}
+
+    def wayDigest(row: int) -> bytes:
+        digest = wayDigests.get(row)
+        if digest is None:
+            nodes = elements.way_nodes(row)
+            found = elements.node_rows(nodes)
+            found = found[found >= 0]
+            h = hashlib.blake2b(digest_size=16)
+            h.update(int(elements.way_ids[row]).to_bytes(8, "little", signed=True))
+            h.update(json.dumps(elements.way_tags(row), sort_keys=True).encode())
+            h.update(nodes.tobytes())
+            h.update(lat[found].tobytes())
+            h.update(lon[found].tobytes())
+            digest = wayDigests[row] = h.digest()
+        return digest
+
+    tileRows = [{} for _ in grid]
+    tileRelations = [{} for _ in grid]
+    tileDigests = [[] for _ in grid]
+    for keyword in keywords:
+        rows = elements.way_rows(keyword)
+        owner = owners(firstNode(rows)) if len(refs) else np.zeros(len(rows), int)
+        order = np.argsort(owner, kind="stable")
+        cuts = np.searchsorted(owner[order], np.arange(len(grid) + 1))
+        for t in range(len(grid)):
+            tileRows[t][keyword] = rows[order[cuts[t] : cuts[t + 1]]]
+            tileDigests[t] += [wayDigest(r) for r in tileRows[t][keyword]]
+            tileRelations[t][keyword] = []
+
+        for relation in elements.tagged_relations(keyword):
+            members = [m.ref for m in relation.members if m.type == "way"]
+            memberRows = elements.way_rows_by_id(members)
+            memberRows = memberRows[memberRows >= 0]
+            t = int(owners(firstNode(memberRows[:1]))[0]) if len(memberRows) else 0
+            tileRelations[t][keyword].append(relation)
+            h = hashlib.blake2b(digest_size=16)
+            members = [[m.type, m.ref, m.role] for m in relation.members]
+            h.update(json.dumps([relation.id, relation.tags], sort_keys=True).encode())
+            h.update(json.dumps(members).encode())
+            for row in memberRows:
+                h.update(wayDigest(int(row)))
+            tileDigests[t].append(h.digest())
+
+    features = []
+    for rows, relations, digests in zip(tileRows, tileRelations, tileDigests):
+        h = hashlib.blake2b(digest_size=16)
+        for digest in sorted(digests):
+            h.update(digest)
+        features.append(TileFeatures(rows, relations, h.hexdigest()))
+    return features
+
+
+def _junctionHash(
+    elements: OsmElements, features: TileFeatures, junctions: np.ndarray
+) -> str:
+    # a road of another tile can add a junction that splits the roads of this one
+    ways, _ = roadWays(
+        elements, features.rows["highway"], features.relations["highway"]
+    )
+    nodes = np.fromiter((n for w in ways for n in w["nodes"]), dtype=np.int64)
+    h = hashlib.blake2b(features.hash.encode(), digest_size=16)
+    h.update(np.intersect1d(nodes, junctions).tobytes())
+    return h.hexdigest()
+
+
+def _layer(elements: list, collectionType: str) -> Collection:
+    return Collection(
+        elements=elements, units="m", name="Context", collectionType=collectionType
+    )
+
+
+def _tileObjects(
+    lat: float,
+    lon: float,
+    r: float,
+    elements: OsmElements,
+    features: TileFeatures,
+    buildings: ExtrudedMeshes,
+    network: np.ndarray,
+) -> Dict[str, Base]:
+    roads, meshes, _ = getRoads(
+        lat,
+        lon,
+        r,
+        elements,
+        rows=features.rows["highway"],
+        relations=features.relations["highway"],
+        network=network,
+    )
+    return {
+        "buildings": Base(units="m", displayValue=[buildings.merged()]),
+        "roads": _layer(roads, "RoadsTile"),
+        "roadMeshes": _layer(shareGeometry(meshes), "RoadMeshesTile"),
+    }
+
+
+def _tileBuildings(
+    lat: float, lon: float, r: float, elements: OsmElements, features: TileFeatures
+) -> ExtrudedMeshes:
+    return extrudedBuildings(
+        lat,
+        lon,
+        r,
+        elements,
+        rows=features.rows["building"],
+        relations=features.relations["building"],
+    )
+
+
+def _areaObjects(
+    lat: float,
+    lon: float,
+    r: float,
+    elements: OsmElements,
+    buildings: Optional[List[Mesh]],
+    analysis: bool,
+) -> Dict[str, Base]:
+    # the visibility layer is built from the separate building meshes, if given
+    objects = {}
+    if analysis:
+        # the analysis alone, no road ways of its own
+        noRows = np.empty(0, dtype=np.int64)
+        _, _, analysisMeshes = getRoads(
+            lat, lon, r, elements, analysis=True, rows=noRows, relations=[]
+        )
+        objects["analysis"] = _layer(analysisMeshes, "RoadAnalysisLayer")
+    if buildings is not None:
+        # separate building meshes, so the one at the location can be ignored
+        layer = visibilityLayer(buildings, [[0, 0, EYE_HEIGHT]], r)
+        objects["visibility"] = _layer([layer], "VisibilityLayer")
+    return objects
+
+
+@define
+class IncrementalContext:
+    """Root collection of an incremental run and what it rebuilt."""
+
+    root: Collection
+    records: ContextRecords
+    rebuilt: int
+    reused: int
+
+
+def incrementalContext(
+    lat: float,
+    lon: float,
+    r: float,
+    elements: OsmElements,
+    previous: ContextRecords,
+    send: Callable[[Base], SentObject],
+    visibility: bool = False,
+    analysis: bool = False,
+) -> IncrementalContext:
+    """Context collection that only rebuilds tiles whose OSM content changed.
+
+    Objects of the other tiles are taken from ``previous`` as references to
+    the IDs sent before. Every rebuilt object is sent right away through
+    ``send``, which returns its ID and closure; the returned root holds
+    nothing but references and is sent last. The optional road analysis and
+    visibility layer depend on the whole area and are rebuilt whenever any
+    tile changed.
+    """
+    grid = tileGrid(lat, lon, r)
+    features = splitFeatures(elements, grid)
+    # roads are split at their junctions with the roads of every tile
+    network = roadNetwork(elements)
+    nodes, counts = np.unique(network, return_counts=True)
+    junctions = nodes[counts > 1]
+    records = ContextRecords(previous.key)
+    layers = {name: [] for name in TILE_LAYERS + AREA_LAYERS}
+    rebuilt = reused = 0
+    # buildings extruded in this run by tile, reused for the visibility layer
+    extruded: Dict[str, ExtrudedMeshes] = {}
+
+    for tile, tileFeatures in zip(grid, features):
+        name = "_".join(str(t) for t in tile)
+        tileHash = _junctionHash(elements, tileFeatures, junctions)
+        record = previous.tiles.get(name)
+        if record is None or record.hash != tileHash:
+            objects = {}
+            if not tileFeatures.empty:
+                buildings = _tileBuildings(lat, lon, r, elements, tileFeatures)
+                if visibility:
+                    extruded[name] = buildings
+                built = _tileObjects(
+                    lat, lon, r, elements, tileFeatures, buildings, network
+                )
+                objects = {layer: send(obj) for layer, obj in built.items()}
+            record = TileRecord(tileHash, objects)
+            rebuilt += 1
+        else:
+            reused += 1
+        records.tiles[name] = record
+        for layer, (objId, closure) in record.objects.items():
+            layers[layer].append(ObjectReference.create(objId, closure))
+
+    areaHash = hashlib.blake2b(
+        "".join(f.hash for f in features).encode(), digest_size=16
+    ).hexdigest()
+    area = previous.area
+    if area is None or area.hash != areaHash:
+        buildings = None
+        if visibility:
+            # every building once: from its rebuilt tile, or extruded now
+            buildings = []
+            for tile, tileFeatures in zip(grid, features):
+                name = "_".join(str(t) for t in tile)
+                if name not in extruded and not tileFeatures.empty:
+                    extruded[name] = _tileBuildings(
+                        lat, lon, r, elements, tileFeatures
+                    )
+                if name in extruded:
+                    buildings.extend(extruded[name].meshes())
+        built = _areaObjects(lat, lon, r, elements, buildings, analysis)
+        area = TileRecord(areaHash, {layer: send(obj) for layer, obj in built.items()})
+    records.area = area
+    for layer, (objId, closure) in area.objects.items():
+        layers[layer].append(ObjectReference.create(objId, closure))
+
+    root = _layer([], "BuildingsLayer")
+    root.elements.append(_layer(layers["buildings"], "BuildingsLayer"))
+    root.elements.append(_layer(layers["roads"], "RoadsLayer"))
+    root.elements.append(_layer(layers["roadMeshes"], "RoadMeshesLayer"))
+    # the whole-area layers are collections themselves
+    root.elements.extend(layers["analysis"])
+    root.elements.extend(layers["visibility"])
+    return IncrementalContext(root, records, rebuilt, reused)
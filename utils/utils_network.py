@@ -1,78 +1,157 @@
-import math
-from typing import List
-#from pandana.loaders import osm
-import pandas as pd 
-
-from specklepy.objects import Base
-from specklepy.objects.geometry import Polyline, Point, Line 
-
-from utils.utils_pyproj import createCRS, getBbox, reprojectToCrs
-
-def calculateAccessibility(lat, lon, r):
-    y0,x0,y1,x1 = getBbox(lat, lon, r)
-    network = osm.pdna_network_from_bbox(y0,x0,y1,x1) 
-    #print(network.nodes_df.head()) 
-    #print(network.edges_df.head()) 
-
-    #nodes = network.get_node_ids(network.nodes_df["x"][0:3], network.nodes_df["y"][:3]).values
-    #print(network.nodes_df.columns)
-    #nodes = network.nodes_df.iloc[:,0][0:3].to_list()
-    nodes = network.node_ids.to_list()
-    origs = [o for o in nodes for d in nodes]
-    dests = [d for o in nodes for d in nodes]
-    #distances = network.shortest_path_lengths(origs, dests)
-    paths = network.shortest_paths(origs, dests)
-
-    id_counts = {}
-    for p in paths:
-        for p_id in p:
-            try: val = id_counts[p_id] + 1
-            except: val = 1
-            id_counts.update({ p_id: val })
-    #print(id_counts)
-    return network, id_counts
-    
-def colorSegments(lat, lon, r):
-    lines = []
-    maxCount = 0
-
-    projectedCrs = createCRS(lat, lon)
-
-    network, id_counts = calculateAccessibility(lat, lon, r)
-    nodesX = network.nodes_df.iloc[:,0].to_list()
-    nodesY = network.nodes_df.iloc[:,1].to_list()
-    nodesIds = network.node_ids.to_list()
-
-    for i in network.edges_df.index:
-        fromNode = i[0] # id 
-        toNode = i[1] # id 
-        
-        try:
-            fromNodeCount = id_counts[fromNode]
-            toNodeCount = id_counts[toNode]
-            count = None
-            if fromNodeCount is not None and toNodeCount is not None:
-                count = min(fromNodeCount, toNodeCount)
-                if count> maxCount: maxCount = count
-        
-            # get coordinates 
-            ind1 = nodesIds.index(fromNode)
-            lon1, lat1 = reprojectToCrs(nodesY[ind1], nodesX[ind1], "EPSG:4326", projectedCrs)
-            pt1 = Point.from_list([lon1, lat1, 0])
-
-            ind2 = nodesIds.index(toNode)
-            lon2, lat2 = reprojectToCrs(nodesY[ind2], nodesX[ind2], "EPSG:4326", projectedCrs)
-            pt2 = Point.from_list([lon2, lat2, 0])
-
-            length = math.sqrt( math.pow( (lon2-lon1),2) + math.pow( (lat2-lat1),2) )
-
-            if length<1: continue
-
-            line = Line(start =pt1, end=pt2, units = "m" )
-            line.length = length
-            line.count = count 
-            lines.append(line)
-        except: continue
-    
-    return lines, maxCount 
-        
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from heapq import heappop, heappush
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.utils_graph import RoadGraph
+from utils.utils_overpass import OsmElements, fetchElements
+from utils.utils_pyproj import createCRS
+
+ANALYSIS_SAMPLES = 250  # sources sampled for the road analysis layer
+POOL_MIN_SOURCES = 200  # fewer sources run faster without worker start-up
+TIE = 1e-6  # m, path lengths closer than this are equally short
+
+_adjacency = None  # (neighbour, edge, length) of every node, per worker process
+
+
+def _initWorker(
+    indptr: List[int], indices: List[int], edges: List[int], lengths: List[float]
+):
+    global _adjacency
+    _adjacency = [
+        [(indices[k], edges[k], lengths[edges[k]]) for k in range(a, b)]
+        for a, b in zip(indptr[:-1], indptr[1:])
+    ]
+
+
+def _accumulate(
+    sources: Sequence[int], radius: Optional[float], nodeCount: int, edgeCount: int
+):
+    """Brandes dependency accumulation of the given sources."""
+    adjacency = _adjacency
+    nodeBc = [0.0] * nodeCount
+    edgeBc = [0.0] * edgeCount
+    limit = float("inf") if radius is None else radius
+
+    for s in sources:
+        # Dijkstra counting shortest paths; dicts keep radius-limited searches local
+        dist = {s: 0.0}
+        sigma = {s: 1.0}
+        preds = {s: []}
+        order = []
+        heap = [(0.0, s)]
+        while heap:
+            d, v = heappop(heap)
+            if d > dist[v]: continue
+            order.append(v)
+            sv = sigma[v]
+            for w, e, length in adjacency[v]:
+                nd = d + length
+                if nd > limit: continue
+                old = dist.get(w)
+                if old is None or nd < old - TIE:
+                    dist[w] = nd
+                    sigma[w] = sv
+                    preds[w] = [(v, e)]
+                    heappush(heap, (nd, w))
+                elif nd <= old + TIE and nd > d:
+                    sigma[w] += sv
+                    preds[w].append((v, e))
+
+        delta = dict.fromkeys(order, 0.0)
+        for w in reversed(order):
+            coeff = (1.0 + delta[w]) / sigma[w]
+            for v, e in preds[w]:
+                c = sigma[v] * coeff
+                edgeBc[e] += c
+                delta[v] += c
+        delta[s] = 0.0
+        for w, dw in delta.items():
+            nodeBc[w] += dw
+
+    return np.array(nodeBc), np.array(edgeBc)
+
+
+def betweenness(
+    graph: RoadGraph,
+    samples: Optional[int] = None,
+    radius: Optional[float] = None,
+    workers: Optional[int] = None,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Node and edge betweenness of an undirected road graph (Brandes).
+
+    Shortest paths are measured along the edge lengths. ``samples`` limits
+    the search to that many random sources and scales the result up to
+    estimate all of them; ``radius`` only counts paths up to that length
+    in metres. Sources are spread over a process pool of ``workers``,
+    by default all CPUs once there are enough sources to pay for it.
+
+    Returns the number of shortest paths through every node and along
+    every edge, each node pair counted once.
+    """
+    n = graph.node_count
+    sources = np.arange(n)
+    scale = 0.5  # every pair is found from both of its ends
+    if samples is not None and samples < n:
+        rng = np.random.default_rng(seed)
+        sources = np.sort(rng.choice(n, samples, replace=False))
+        scale *= n / samples
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(sources) >= POOL_MIN_SOURCES else 1
+
+    csr = (
+        graph.indptr.tolist(),
+        graph.indices.tolist(),
+        graph.adjacent_edges.tolist(),
+        graph.edge_length.tolist(),
+    )
+    accumulate = partial(
+        _accumulate, radius=radius, nodeCount=n, edgeCount=graph.edge_count
+    )
+    if workers <= 1:
+        _initWorker(*csr)
+        nodeBc, edgeBc = accumulate(sources.tolist())
+    else:
+        chunks = [c.tolist() for c in np.array_split(sources, 4 * workers) if len(c)]
+        nodeBc, edgeBc = np.zeros(n), np.zeros(graph.edge_count)
+        pool = ProcessPoolExecutor(workers, initializer=_initWorker, initargs=csr)
+        with pool:
+            for nb, eb in pool.map(accumulate, chunks):
+                nodeBc += nb
+                edgeBc += eb
+    return nodeBc * scale, edgeBc * scale
+
+
+def calculateAccessibility(
+    lat: float,
+    lon: float,
+    r: float,
+    elements: OsmElements = None,
+    samples: Optional[int] = ANALYSIS_SAMPLES,
+    radius: Optional[float] = None,
+):
+    # through-movement of every road segment: sampled edge betweenness
+    if elements is None: elements = fetchElements(lat, lon, r, ["highway"])
+    graph = RoadGraph.from_elements(elements, createCRS(lat, lon))
+    _, edgeCounts = betweenness(graph, samples, radius)
+    return graph, edgeCounts
+
+
+def colorSegments(lat, lon, r, elements: OsmElements = None, minLength: float = 1.0):
+    """Through-movement of every road segment, as arrays over the graph edges.
+
+    Returns the projected polyline of every segment at least ``minLength``
+    long, their lengths and counts, and the largest count.
+    """
+    graph, edgeCounts = calculateAccessibility(lat, lon, r, elements)
+    maxCount = float(edgeCounts.max()) if len(edgeCounts) else 0
+
+    keep = np.flatnonzero(graph.edge_length >= minLength)
+    cuts = graph.edge_offsets[1:-1]
+    polylines = np.split(graph.edge_ref_coords, cuts)
+    lines = [polylines[e] for e in keep]
+    return lines, graph.edge_length[keep], edgeCounts[keep], maxCount
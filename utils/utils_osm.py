@@ -1,112 +1,81 @@
 
 from copy import copy
-import math
 from typing import List
-#from utils.utils_network import colorSegments
-from utils.utils_other import COLOR_BLD, COLOR_ROAD, cleanString, fillList
-from utils.utils_pyproj import createCRS, reprojectToCrs
+import numpy as np
+from utils.utils_colormap import colorize
+from utils.utils_extrusion import ExtrudedMeshes, Footprints, extrudeFootprints
+from utils.utils_graph import RoadGraph, splitWays
+from utils.utils_network import colorSegments
+from utils.utils_other import cleanString
+from utils.utils_overpass import OsmElements, OsmRelation, fetchElements
+from utils.utils_pyproj import createCRS
+from utils.utils_roads import roadSurfaces
 from specklepy.objects import Base
 from specklepy.objects.geometry import Polyline, Point, Mesh, Line 
 
-def getBuildings(lat: float, lon: float, r: float):
+def getBuildings(lat: float, lon: float, r: float, elements: OsmElements = None, merged: bool = False, rows: np.ndarray = None, relations: List[OsmRelation] = None):
     # https://towardsdatascience.com/loading-data-from-openstreetmap-with-python-and-the-overpass-api-513882a27fd0 
-    import requests
-    import json
+    extruded = extrudedBuildings(lat, lon, r, elements, rows, relations)
+    if merged: return [ extruded.merged() ]
+    return extruded.meshes()
+
+
+def extrudedBuildings(lat: float, lon: float, r: float, elements: OsmElements = None, rows: np.ndarray = None, relations: List[OsmRelation] = None) -> ExtrudedMeshes:
+    # all buildings extruded once, to take both the merged mesh and the separate meshes from
+    # rows/relations limit the buildings to those way rows and relations (one tile of the area)
+    keyword = "building"
+    if elements is None: elements = fetchElements(lat, lon, r, [keyword])
 
     projectedCrs = createCRS(lat, lon)
-    lonPlus1, latPlus1 = reprojectToCrs(1, 1, projectedCrs, "EPSG:4326")
-    scaleX = lonPlus1 - lon
-    scaleY = latPlus1 - lat
-    #r = RADIUS #meters
-
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    overpass_query = f"""[out:json];
-    (node["building"]({lat-r*scaleY},{lon-r*scaleX},{lat+r*scaleY},{lon+r*scaleX});
-    way["building"]({lat-r*scaleY},{lon-r*scaleX},{lat+r*scaleY},{lon+r*scaleX});
-    relation["building"]({lat-r*scaleY},{lon-r*scaleX},{lat+r*scaleY},{lon+r*scaleX});
-    );out body;>;out skel qt;"""
-
-    response = requests.get(overpass_url, params={'data': overpass_query})
-    data = response.json()
-    features = data['elements']
+    nodeCoords = elements.node_coords(projectedCrs)
+
+    if rows is None: rows = elements.way_rows(keyword)
+    if relations is None: relations = elements.tagged_relations(keyword)
+
+    # extrude all footprints in one pass
+    return extrudeFootprints( buildingFootprints(elements, nodeCoords, rows, relations) )
 
+
+def buildingFootprints(elements: OsmElements, nodeCoords: np.ndarray, rows: np.ndarray, relations: List[OsmRelation]) -> Footprints:
+    """Projected footprint rings and heights of the building ways and relations."""
     ways = []
     tags = []
 
-    rel_outer_ways = []
-    rel_outer_ways_tags = []
-
-    ways_part = []
-    nodes = []
-
-    for feature in features:
-        # ways
-        if feature['type'] == 'way':
-            try:
-                feature['id']
-                feature['nodes']
-                
-                try: tags.append( { 'building': feature['tags']['building'], 'height': feature['tags']['height'] } )
-                except: 
-                    try: tags.append( { 'building': feature['tags']['building'], 'levels': feature['tags']['building:levels'] } )
-                    except:
-                        try:tags.append( { 'building': feature['tags']['building'], 'layer': feature['tags']['layer'] } )
-                        except: tags.append( { 'building': feature['tags']['building']} )
-                ways.append( { 'id': feature['id'], 'nodes': feature['nodes'] } )
+    # ways
+    for row in rows:
+        wayTags = elements.way_tags(row)
+        try: tags.append( { 'building': wayTags['building'], 'height': wayTags['height'] } )
+        except: 
+            try: tags.append( { 'building': wayTags['building'], 'levels': wayTags['building:levels'] } )
             except:
-                ways_part.append( { 'id': feature['id'], 'nodes': feature['nodes'] } )
-        
-        # relations 
-        elif feature['type'] == 'relation':
-            outer_ways = []
-            try: outer_ways_tags = { 'building': feature['tags']['building'], 'height': feature['tags']['height'] }
+                try:tags.append( { 'building': wayTags['building'], 'layer': wayTags['layer'] } )
+                except: tags.append( { 'building': wayTags['building']} )
+        ways.append( { 'id': int(elements.way_ids[row]), 'nodes': elements.way_nodes(row).tolist() } )
+    
+    # relations: member ways stitched into closed rings, every outer ring is a building
+    for feature in relations:
+        try: outer_ways_tags = { 'building': feature.tags['building'], 'height': feature.tags['height'] }
+        except: 
+            try: outer_ways_tags = { 'building': feature.tags['building'], 'levels': feature.tags['building:levels']}
             except: 
-                try: outer_ways_tags = { 'building': feature['tags']['building'], 'levels': feature['tags']['building:levels']}
-                except: 
-                    try: outer_ways_tags = { 'building': feature['tags']['building'], 'layer': feature['tags']['layer'] }
-                    except: outer_ways_tags = { 'building': feature['tags']['building'] }
-            
-            for n, x in enumerate(feature['members']):
-                # if several Outer ways, combine them
-                if feature['members'][n]['type'] == 'way' and feature['members'][n]['role'] == 'outer':
-                    outer_ways.append( { 'ref': feature['members'][n]['ref'] } )
-            rel_outer_ways.append( outer_ways )
-            rel_outer_ways_tags.append( outer_ways_tags )
-        
-        # get nodes (that don't have tags)
-        elif feature['type'] == 'node':
-            try: feature['tags']
-            except: nodes.append( { 'id': feature['id'], 'lat': feature['lat'], 'lon': feature['lon'] } )
-
-    # turn relations_OUTER into ways
-    for n, x in enumerate(rel_outer_ways):  
-        # there will be a list of "ways" in each of rel_outer_ways
-        full_node_list = []
-        for m, y in enumerate(rel_outer_ways[n]): 
-            #find ways_parts with corresponding ID
-            for k, z in enumerate(ways_part): 
-                if k == len(ways_part): break
-                if rel_outer_ways[n][m]['ref'] == ways_part[k]['id']:
-                    full_node_list += ways_part[k]['nodes'] 
-                    ways_part.pop(k) # remove used ways_parts
-                    k -= 1 # reset index
-                    break
-        ways.append( { 'nodes': full_node_list } ) 
-        try: tags.append( { 'building': rel_outer_ways_tags[n]['building'], 'height': rel_outer_ways_tags[n]['height'] } )
-        except:
-            try:tags.append( { 'building': rel_outer_ways_tags[n]['building'], 'levels': rel_outer_ways_tags[n]['levels'] } )
-            except:
-                try:tags.append( { 'building': rel_outer_ways_tags[n]['building'], 'layer': rel_outer_ways_tags[n]['layer'] } )
-                except: tags.append( { 'building': rel_outer_ways_tags[n]['building']} )
-        
-        buildingsCount = len(ways)
-        #print(buildingsCount)
+                try: outer_ways_tags = { 'building': feature.tags['building'], 'layer': feature.tags['layer'] }
+                except: outer_ways_tags = { 'building': feature.tags['building'] }
+
+        outer_rings, inner_rings = elements.relation_rings(feature)
+        holes = assignHoles(
+            [getWayCoords(ring, elements, nodeCoords) for ring in outer_rings],
+            [getWayCoords(ring, elements, nodeCoords) for ring in inner_rings],
+        )
+        for ring, ringHoles in zip(outer_rings, holes):
+            ways.append( { 'nodes': ring, 'holes': [inner_rings[h] for h in ringHoles] } )
+            tags.append( dict(outer_ways_tags) )
 
     # get coords of Ways
-    objectGroup = []
+    outers = []
+    holes = []
+    heights = []
     for i, x in enumerate(ways): # go through each Way: 2384
         ids = ways[i]['nodes']
-        coords = [] # replace node IDs with actual coords for each Way
         height = 3
         tags[i]['building']: height = 9
         try: height = float( cleanString(tags[i]['levels'].split( ',' )[0].split( ';' )[0] )) * 3
@@ -117,66 +86,36 @@ def getBuildings(lat: float, lon: float, r: float):
                     if float( cleanString(tags[i]['layer'].split( ',' )[0].split( ';' )[0]) ) < 0: height = -1 * height
                 except: pass
 
-        for k, y in enumerate(ids): # go through each node of the Way
-            if k==len(ids)-1: continue # ignore last 
-            for n, z in enumerate(nodes): # go though all nodes
-                if ids[k] == nodes[n]['id']: 
-                    x, y = reprojectToCrs(nodes[n]['lat'], nodes[n]['lon'], "EPSG:4326", projectedCrs)
-                    coords.append( { 'x': x, 'y': y } )
-                    break
+        outers.append( getWayCoords(ids[:-1], elements, nodeCoords) ) # ignore last 
+        holes.append( [ getWayCoords(h[:-1], elements, nodeCoords) for h in ways[i].get('holes', []) ] )
+        heights.append( height )
 
-        obj = extrudeBuildings( coords, height )
-        objectGroup.append( obj )
-        coords = None
-        height = None   
-    return objectGroup
+    return Footprints.from_rings(outers, heights, holes)
 
 
-def extrudeBuildings(coords: List[dict], height: float) -> Mesh:
-    from specklepy.objects.geometry import Mesh 
-    vertices = []
-    faces = []
-    colors = []
-    
-    color = COLOR_BLD #(255<<24) + (100<<16) + (100<<8) + 100 # argb
-    
-    # bottom
-    reversed_vert_indices = list(range(int(len(vertices)/3), int(len(vertices)/3) + len(coords)))
-    for c in coords: 
-        vertices.extend([c['x'], c['y'], 0])
-        colors.append(color)
-
-    polyBorder = [ (vertices[ind*3], vertices[ind*3+1], vertices[ind*3+2] ) for ind in reversed_vert_indices]
-    reversed_vert_indices, inverse = fix_orientation(polyBorder, reversed_vert_indices)
-    faces.extend( [len(coords)] + reversed_vert_indices)
-
-    # top
-    reversed_vert_indices = list(range(int(len(vertices)/3), int(len(vertices)/3) + len(coords)))
-    for c in coords: 
-        vertices.extend([c['x'], c['y'], height])
-        colors.append(color)
-
-    polyBorder = [ (vertices[ind*3], vertices[ind*3+1], vertices[ind*3+2] ) for ind in reversed_vert_indices]
-    reversed_vert_indices, inverse = fix_orientation(polyBorder, reversed_vert_indices)
-    reversed_vert_indices.reverse()
-    faces.extend( [len(coords)] + reversed_vert_indices)
-
-    # sides
-    for i,c in enumerate(coords):
-        if i != len(coords)-1: nextC = coords[i+1] #i+1
-        else: nextC = coords[0] #0
-
-        reversed_vert_indices = list(range(int(len(vertices)/3), int(len(vertices)/3) + 4))
-        faces.extend([4] + reversed_vert_indices)
-        if inverse is False:
-            vertices.extend([c['x'],c['y'],0,c['x'],c['y'],height, nextC['x'],nextC['y'],height, nextC['x'],nextC['y'],0])
-        else:
-            vertices.extend([c['x'],c['y'],0, nextC['x'],nextC['y'],0, nextC['x'],nextC['y'],height,c['x'],c['y'],height])
-        colors.extend([color, color, color, color])
-
-    obj = Mesh.create(faces = faces, vertices = vertices, colors = colors)
-    obj.units = "m"
-    return obj 
+def getWayCoords(ids: List[int], elements: OsmElements, nodeCoords: np.ndarray) -> np.ndarray:
+    """Replace node IDs of a Way with (N, 2) projected coords, skipping unknown nodes."""
+    rows = elements.node_rows(ids)
+    return nodeCoords[rows[rows >= 0]]
+
+
+def assignHoles(outers: List[np.ndarray], inners: List[np.ndarray]) -> List[List[int]]:
+    """Indices of the inner rings lying inside each outer ring."""
+    if len(outers) == 1: return [list(range(len(inners)))]
+    from shapely import Point, Polygon
+    polygons = [Polygon(o) if len(o) >= 3 else None for o in outers]
+    holes = [[] for _ in outers]
+    for k, inner in enumerate(inners):
+        if len(inner) == 0: continue
+        for n, polygon in enumerate(polygons):
+            if polygon is not None and polygon.contains(Point(inner[0])):
+                holes[n].append(k)
+                break
+    return holes
+
+
+def extrudeBuildings(coords: np.ndarray, height: float, holes: List[np.ndarray] = None) -> Mesh:
+    return extrudeFootprints( Footprints.from_rings([coords], [height], [holes or []]) ).meshes()[0]
 
 def fix_orientation(polyBorder, reversed_vert_indices, positive = True, coef = 1): 
     
@@ -195,106 +134,74 @@ def fix_orientation(polyBorder, reversed_vert_indices, positive = True, coef = 1
         inverse = True
     return reversed_vert_indices, inverse
 
-def getRoads(lat: float, lon: float, r: float):
+def getRoads(lat: float, lon: float, r: float, elements: OsmElements = None, union: bool = False, analysis: bool = False, rows: np.ndarray = None, relations: List[OsmRelation] = None, network: np.ndarray = None):
     # https://towardsdatascience.com/loading-data-from-openstreetmap-with-python-and-the-overpass-api-513882a27fd0 
-    import requests
-    import json
+    # rows/relations limit the roads as in getBuildings, the analysis always covers all elements
+    # with network (see roadNetwork) a part of the roads is split at its junctions with all the others
     keyword = "highway"
+    if elements is None: elements = fetchElements(lat, lon, r, [keyword])
 
     projectedCrs = createCRS(lat, lon)
-    lonPlus1, latPlus1 = reprojectToCrs(1, 1, projectedCrs, "EPSG:4326")
-    scaleX = lonPlus1 - lon
-    scaleY = latPlus1 - lat
-    #r = RADIUS #meters
-
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    overpass_query = f"""[out:json];
-    (node["{keyword}"]({lat-r*scaleY},{lon-r*scaleX},{lat+r*scaleY},{lon+r*scaleX});
-    way["{keyword}"]({lat-r*scaleY},{lon-r*scaleX},{lat+r*scaleY},{lon+r*scaleX});
-    relation["{keyword}"]({lat-r*scaleY},{lon-r*scaleX},{lat+r*scaleY},{lon+r*scaleX});
-    );out body;>;out skel qt;"""
-
-    response = requests.get(overpass_url, params={'data': overpass_query})
-    data = response.json()
-    features = data['elements']
+    nodeCoords = elements.node_coords(projectedCrs)
+
+    if rows is None: rows = elements.way_rows(keyword)
+    if relations is None: relations = elements.tagged_relations(keyword)
+
+    objectGroup, lines, widths = roadLines(elements, nodeCoords, rows, relations, network)
+    analysisGroup = []
 
+    # all road surfaces from one buffer call, ignored "areas" are filtered out
+    meshGroup = [ m for m in roadSurfaces(lines, widths, union = union) if m is not None ]
+
+    # through-movement of every segment from the same elements
+    if analysis:
+        segments, _, counts, maxCount = colorSegments(lat, lon, r, elements)
+        analysisGroup = analysisSurfaces(segments, counts, maxCount, 2)
+
+    return objectGroup, meshGroup, analysisGroup
+
+def roadWays(elements: OsmElements, rows: np.ndarray, relations: List[OsmRelation]):
+    """Highway ways as node ID lists with their tags, relation members after the ways."""
+    keyword = "highway"
     ways = []
     tags = []
 
-    rel_outer_ways = []
-    rel_outer_ways_tags = []
-
-    ways_part = []
-    nodes = []
-
-    for feature in features:
-        # ways
-        if feature['type'] == 'way':
-            try:
-                feature['id']
-                feature['nodes']
-                
-                tags.append( { f'{keyword}': feature['tags'][keyword] } )
-                ways.append( { 'id': feature['id'], 'nodes': feature['nodes'] } )
-            except:
-                ways_part.append( { 'id': feature['id'], 'nodes': feature['nodes'] } )
-        
-        # relations 
-        elif feature['type'] == 'relation':
-            outer_ways = []
-            try:
-                outer_ways_tags = { f'{keyword}': feature['tags'][keyword], 'area': feature['tags']['area'] }
-            except:
-                outer_ways_tags = { f'{keyword}': feature['tags'][keyword] }
-                
-            
-            for n, x in enumerate(feature['members']):
-                # if several Outer ways, combine them
-                if feature['members'][n]['type'] == 'way': # and feature['members'][n]['role'] == 'inner':
-                    outer_ways.append( { 'ref': feature['members'][n]['ref'] } )
-
-            rel_outer_ways.append( outer_ways )
-            rel_outer_ways_tags.append( outer_ways_tags )
-        
-        # get nodes (that don't have tags)
-        elif feature['type'] == 'node':
-            try: 
-                feature['tags']
-                feature['tags'][keyword]
-            except: 
-                #if feature['tags'][keyword] != 'traffic_signals':
-                nodes.append( { 'id': feature['id'], 'lat': feature['lat'], 'lon': feature['lon'] } )
-
-    # turn relations_OUTER into ways
-    for n, x in enumerate(rel_outer_ways):  
-        # there will be a list of "ways" in each of rel_outer_ways
-        full_node_list = []
-        for m, y in enumerate(rel_outer_ways[n]): 
-            #find ways_parts with corresponding ID
-            for k, z in enumerate(ways_part): 
-                if k == len(ways_part): break
-                if rel_outer_ways[n][m]['ref'] == ways_part[k]['id']:
-                    full_node_list += ways_part[k]['nodes'] 
-                    ways_part.pop(k) # remove used ways_parts
-                    k -= 1 # reset index
-                    break
-        
-            # move inside the loop to separate the sections
-            ways.append( { 'nodes': full_node_list } ) 
-            try: tags.append( { f'{keyword}': rel_outer_ways_tags[n][keyword], 'area': rel_outer_ways_tags[n]['area'] } )
-            except: tags.append( { f'{keyword}': rel_outer_ways_tags[n][keyword] } )
-            # empty the list after each loop to start new part 
-            full_node_list = []
-        
-        roadsCount = len(ways)
-        #print(roadsCount)
+    # ways
+    for row in rows:
+        tags.append( { f'{keyword}': elements.way_tags(row)[keyword] } )
+        ways.append( { 'id': int(elements.way_ids[row]), 'nodes': elements.way_nodes(row).tolist() } )
+    
+    # relations: every member way is a separate section
+    for feature in relations:
+        try:
+            outer_ways_tags = { f'{keyword}': feature.tags[keyword], 'area': feature.tags['area'] }
+        except:
+            outer_ways_tags = { f'{keyword}': feature.tags[keyword] }
+
+        refs = [ member.ref for member in feature.members if member.type == 'way' ]
+        for row in elements.way_rows_by_id(refs):
+            if row < 0: continue
+            ways.append( { 'id': int(elements.way_ids[row]), 'nodes': elements.way_nodes(row).tolist() } )
+            tags.append( dict(outer_ways_tags) )
+    return ways, tags
+
+def roadNetwork(elements: OsmElements) -> np.ndarray:
+    """Node IDs of all highway ways that split roads, areas excluded, one entry per way node."""
+    keyword = "highway"
+    ways, tags = roadWays(elements, elements.way_rows(keyword), elements.tagged_relations(keyword))
+    return np.fromiter( (n for w, t in zip(ways, tags) if t.get('area') != 'yes' for n in w['nodes']), dtype=np.int64 )
+
+def roadLines(elements: OsmElements, nodeCoords: np.ndarray, rows: np.ndarray, relations: List[OsmRelation], network: np.ndarray = None):
+    """Polylines of the highway ways split at intersections, with their buffer lines and widths."""
+    keyword = "highway"
+    ways, tags = roadWays(elements, rows, relations)
 
     # get coords of Ways
     objectGroup = []
-    meshGroup = []
-    analysisGroup = []
+    lines = []
+    widths = []
 
-    ways, tags = splitWaysByIntersection(ways, tags)
+    ways, tags = splitWaysByIntersection(ways, tags, network)
 
     for i, x in enumerate(ways): # go through each Way: 2384
         ids = ways[i]['nodes']
@@ -309,138 +216,78 @@ def getRoads(lat: float, lon: float, r: float):
                 continue
         except: pass 
 
-        closed = False
-        for k, y in enumerate(ids): # go through each node of the Way
-            if k==len(ids)-1 and y == ids[0]: 
-                closed = True
-                continue
-            for n, z in enumerate(nodes): # go though all nodes
-                if ids[k] == nodes[n]['id']: 
-                    x, y = reprojectToCrs(nodes[n]['lat'], nodes[n]['lon'], "EPSG:4326", projectedCrs)
-                    coords.append( { 'x': x, 'y': y } )
-                    break
+        closed = len(ids) > 1 and ids[-1] == ids[0]
+        if closed: ids = ids[:-1]
+        coords = getWayCoords(ids, elements, nodeCoords)
 
         obj = joinRoads( coords, closed, 0 )
         objectGroup.append( obj )
+        # buffer the closed ring, not just the open chain
+        lines.append( np.vstack([coords, coords[:1]]) if closed else coords )
+        widths.append( value )
 
-        objMesh = roadBuffer(obj, value)
-        # filter out ignored "areas"
-        if objMesh is not None: meshGroup.append( objMesh )
-        
-        coords = None
-        height = None   
-    
-    
-    #objAnalysis, maxCount = colorSegments(lat, lon, r)
-    #for ob in objAnalysis:
-    #    mesh = lineColorBuffer(ob, maxCount, 2)
-    #    analysisGroup.append(mesh)
+    return objectGroup, lines, widths
 
-    return objectGroup, meshGroup, [] #analysisGroup
+def getRoadGraph(lat: float, lon: float, r: float, elements: OsmElements = None) -> RoadGraph:
+    # same elements as getRoads: pass them in to avoid a second download
+    keyword = "highway"
+    if elements is None: elements = fetchElements(lat, lon, r, [keyword])
+    return RoadGraph.from_elements(elements, createCRS(lat, lon), keyword)
 
 def lineColorBuffer(poly: Line, maxCount: float, value: float):
-    import json
-    import matplotlib as mpl
-    import matplotlib.pyplot as plt
-    from shapely import offset_curve, buffer, to_geojson, LineString, Point, Polygon, BufferCapStyle, BufferJoinStyle
     if value is None: return
-    line = LineString([(p.x, p.y) for p in [poly.start, poly.end] ])
-    area = to_geojson(buffer(line, value, cap_style="square")) # POLYGON to geojson 
-    area = json.loads(area)
-    vertices = []
-    colors = []
-    vetricesTuples = []
-
-    fraction = math.pow( poly.count / maxCount, 0.4)
-    #cmap_names = sorted(m for m in plt.colormaps if not m.endswith("_r"))
-    #cmap = mpl.cm.RdYlGn.reversed()
-    cmap = mpl.colormaps['jet']
-    map = cmap(fraction)
-    r = int(map[0]*255) # int(poly.count / maxCount)*255
-    g = int(map[1]*255) # int(poly.count / maxCount)*255
-    #if poly.count>=maxCount/2: g = 255 - int(poly.count / maxCount)*255
-    b = int(map[2]*255) # 255 - int( poly.count / maxCount)*255
-
-    color = (255<<24) + (r<<16) + (g<<8) + b # argb
-
-    for i,c in enumerate(area["coordinates"][0]):
-        if i != len(area["coordinates"][0])-1:
-            vertices.extend(c+[0])
-            vetricesTuples.append(c)
-            colors.append(color)
-    
-    face_list = list(range(len(vetricesTuples)))
-    face_list, inverse = fix_orientation(vetricesTuples, face_list)
-    face_list.reverse()
+    coords = [(p.x, p.y) for p in [poly.start, poly.end]]
+    return analysisSurfaces([coords], [poly.count], maxCount, value)[0]
 
-    mesh = Mesh.create(vertices=vertices, colors = colors, faces = [len(vetricesTuples)] + face_list )
-    mesh.units = "m"
-    mesh.count = poly.count / maxCount
+def analysisSurfaces(lines: List[np.ndarray], counts: np.ndarray, maxCount: float, value: float) -> List[Base]:
+    # all segments colored by count and buffered in one call
+    counts = np.asarray(counts, dtype=float)
+    colors = colorize(counts, maxCount, gamma = 0.4)
 
-    return Base(units = "m", displayValue = [mesh], width = 2*value)
+    objs = roadSurfaces(lines, [value] * len(lines), colors)
+    for obj, count in zip(objs, counts):
+        obj.displayValue[0].count = count / maxCount if maxCount > 0 else 0
+    return objs
 
 def roadBuffer(poly: Polyline, value: float):
-    import json
-    from shapely import offset_curve, buffer, to_geojson, LineString, Point, Polygon, BufferCapStyle, BufferJoinStyle
     if value is None: return
-    line = LineString([(p.x, p.y) for p in poly.as_points()])
-    area = to_geojson(buffer(line, value, cap_style="square")) # POLYGON to geojson 
-    area = json.loads(area)
-    vertices = []
-    colors = []
-    vetricesTuples = []
-
-    color = COLOR_ROAD #(255<<24) + (150<<16) + (150<<8) + 150 # argb
-
-    for i,c in enumerate(area["coordinates"][0]):
-        if i != len(area["coordinates"][0])-1:
-            vertices.extend(c+[0])
-            vetricesTuples.append(c)
-            colors.append(color)
-    
-    face_list = list(range(len(vetricesTuples)))
-    face_list, inverse = fix_orientation(vetricesTuples, face_list)
-    face_list.reverse()
-
-    mesh = Mesh.create(vertices=vertices, colors = colors, faces = [len(vetricesTuples)] + face_list )
-    mesh.units = "m"
-
-    return Base(units = "m", displayValue = [mesh], width = 2*value)
-
-def splitWaysByIntersection(ways: list, tags: list):
-    splitWays = []
-    splitTags = []
-
+    coords = [(p.x, p.y) for p in poly.as_points()]
+    return roadSurfaces([coords], [value])[0]
+
+def splitWaysByIntersection(ways: list, tags: list, network: np.ndarray = None):
+    # areas are kept whole and do not split the roads they touch
+    # network: node IDs of the whole road network when the ways are only a part of it
+    roads = [ i for i in range(len(ways)) if tags[i].get('area') != 'yes' ]
+
+    lengths = [ len(ways[i]['nodes']) for i in roads ]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    refs = np.fromiter( (n for i in roads for n in ways[i]['nodes']), dtype=np.int64, count=int(offsets[-1]) )
+    edgeOffsets, edgeRefs, edgeWay = splitWays(offsets, refs, network)
+    firstEdge = np.searchsorted(edgeWay, np.arange(len(roads) + 1))
+    edgeOf = dict(zip(roads, range(len(roads))))
+
+    outWays = []
+    outTags = []
     for i, w in enumerate(ways):
-        ids = w['nodes']
-
-        try:
-            if tags[i]['area'] == 'yes': 
-                splitWays.append(w) 
-                splitTags.append(tags[i])
-                continue
-        except: pass 
-
-        if len(list(set(ids))) < len(ids): # if there are repetitions
-            wList = fillList(ids, [])
-            for item in wList:
-                x = copy(w)
-                x['nodes'] = item
-                splitWays.append(x) 
-                splitTags.append(tags[i])
-        else:
-            splitWays.append(w) 
-            splitTags.append(tags[i])
+        if i not in edgeOf:
+            outWays.append(w)
+            outTags.append(tags[i])
+            continue
+        for e in range(firstEdge[edgeOf[i]], firstEdge[edgeOf[i] + 1]):
+            x = copy(w)
+            x['nodes'] = edgeRefs[edgeOffsets[e]:edgeOffsets[e+1]].tolist()
+            outWays.append(x)
+            outTags.append(tags[i])
 
-    return splitWays, splitTags
+    return outWays, outTags
 
 
-def joinRoads(coords: List[dict], closed: bool,  height: float):
+def joinRoads(coords: np.ndarray, closed: bool,  height: float):
     from specklepy.objects.geometry import Polyline, Point 
     points = []
     
-    for i,c in enumerate(coords): 
-        points.append(Point.from_list([c['x'], c['y'], 0]))
+    for i,c in enumerate(np.asarray(coords, dtype=float).reshape(-1, 2).tolist()): 
+        points.append(Point.from_list([c[0], c[1], 0]))
 
     poly = Polyline.from_points(points)
     poly.closed = closed
@@ -1,5 +1,5 @@
 
-from copy import copy
+import math
 from typing import List
 import numpy as np
 from specklepy.objects.geometry import Point
@@ -9,36 +9,71 @@ COLOR_ROAD = (255<<24) + (50<<16) + (50<<8) + 50 # argb
 COLOR_BLD = (255<<24) + (230<<16) + (230<<8) + 230 # argb
 COLOR_VISIBILITY = (255<<24) + (255<<16) + (10<<8) + 10 # argb
 
-def findMeshesNearby(cleanPts: List[Point]) -> List[Point]:
-    # add indices of neighbouring meshes
-    mesh_nearby = []
-    for pt in cleanPts:
-        meshIds = []
-        all_mesh_dist = []
-        all_mesh_ids = []
-        for p in cleanPts:
-            distance = np.sqrt(np.sum(( np.array([p.x,p.y,p.z]) -np.array([pt.x,pt.y,pt.z]))**2, axis=0))
-            if distance ==0: continue
-            all_mesh_dist.append(distance)
-            all_mesh_ids.append(p.meshId)
-        minDist = min(all_mesh_dist)
-        meshIds = [ m for i,m in enumerate(all_mesh_ids) if all_mesh_dist[i] < minDist*2 ]
-        mesh_nearby.append(list(set(meshIds)))
-    return mesh_nearby
+def gridPairs(coords: np.ndarray, queries: np.ndarray, cell: float):
+    # (query, point) pairs in the 27 grid cells around every query point: all points closer than cell
+    cells = np.floor(coords / cell).astype(np.int64)
+    cells -= cells.min(axis=0) - 1 # keep a free cell around the grid for the offsets
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    cellKeys, cellStart, cellCount = np.unique(keys[order], return_index=True, return_counts=True)
 
-def sortPtsByMesh(cleanPts: List[Point]) -> List[Point]:
-    ptsGroups: List[List[np.array]] = []
-    
-    usedMeshIds = []
-    for pt in cleanPts:
-        if pt.meshId in usedMeshIds: continue
+    offsets = np.stack(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1]), axis=-1).reshape(-1, 3)
+    near = keys[queries][:, None] + (offsets[:, 0] * dims[1] + offsets[:, 1]) * dims[2] + offsets[:, 2]
+    pos = np.minimum(np.searchsorted(cellKeys, near.ravel()), len(cellKeys) - 1)
+    start = cellStart[pos]
+    count = np.where(cellKeys[pos] == near.ravel(), cellCount[pos], 0)
 
-        meshId = pt.meshId
-        morePts = [ p for p in cleanPts if p.meshId == meshId]
-        ptsGroups.append(morePts)
-        usedMeshIds.append(meshId)
+    query = np.repeat(np.repeat(queries, len(offsets)), count)
+    first = np.repeat(start - np.cumsum(count) + count, count)
+    point = order[first + np.arange(int(count.sum()))]
+    return query, point
+
+def findMeshesNearby(cleanPts: List[Point]) -> List[List[int]]:
+    # mesh IDs of the points closer than twice the distance to the nearest other point
+    if len(cleanPts) == 0: return []
+    coords = np.array([[p.x, p.y, p.z] for p in cleanPts], dtype=float)
+    meshIds = np.array([p.meshId for p in cleanPts])
+    return nearbyMeshIds(coords, meshIds)
+
+def nearbyMeshIds(coords: np.ndarray, meshIds: np.ndarray) -> List[List[int]]:
+    # findMeshesNearby on a grid index: query cells grow until the search radius fits inside them
+    n = len(coords)
+    extent = np.sort(np.ptp(coords, axis=0))
+    # hit points lie on surfaces, so size the cells for a 2D spread
+    cell = max(math.sqrt(extent[1] * extent[2] / n), extent[2] / n, 1e-9)
+    meshNames, meshRows = np.unique(meshIds, return_inverse=True)
+    nearby = [[] for _ in range(n)]
+    pending = np.arange(n)
+    while len(pending):
+        query, point = gridPairs(coords, pending, cell)
+        dist = np.linalg.norm(coords[query] - coords[point], axis=1)
+        other = dist > 0
+        query, point, dist = query[other], point[other], dist[other]
 
-    return ptsGroups
+        minDist = np.full(n, np.inf)
+        np.minimum.at(minDist, query, dist)
+        # complete once every point within twice the nearest distance is inside the searched cells
+        done = np.zeros(n, dtype=bool)
+        done[pending] = 2 * minDist[pending] <= cell
+        if cell > 2 * extent[2]: done[pending] = True
+
+        keep = done[query] & (dist < 2 * minDist[query])
+        pairs = np.unique(query[keep] * len(meshNames) + meshRows[point[keep]])
+        queryOf, meshOf = np.divmod(pairs, len(meshNames))
+        bounds = np.flatnonzero(np.diff(queryOf)) + 1
+        for i, group in zip(queryOf[np.r_[0, bounds]] if len(pairs) else [], np.split(meshNames[meshOf], bounds)):
+            nearby[i] = group.tolist()
+        pending = pending[~done[pending]]
+        cell *= 2
+    return nearby
+
+def sortPtsByMesh(cleanPts: List[Point]) -> List[List[Point]]:
+    # group points by mesh ID, meshes in order of their first point
+    ptsGroups = {}
+    for pt in cleanPts:
+        ptsGroups.setdefault(pt.meshId, []).append(pt)
+    return list(ptsGroups.values())
 
 def cleanPtsList(pt_origin, all_pts, usedVectors):
     
@@ -89,17 +124,3 @@ def cleanString(text: str) -> str:
     for s in symbols:
         new_text = new_text.split(s)[0]#.replace(s, "")
     return new_text
-
-def fillList(vals: list, lsts: list) -> List[list]:
-    if len(vals)>1: 
-        lsts.append([])
-    else: return
-
-    for i, v in enumerate(vals):
-        if v not in lsts[len(lsts)-1]: lsts[len(lsts)-1].append(v)
-        else: 
-            if len(lsts[len(lsts)-1])<=1: lsts.pop(len(lsts)-1)
-            vals = copy(vals[i-1:])
-            fillList(vals, lsts)
-    return lsts 
-    
\ No newline at end of file
@@ -0,0 +1,454 @@
+import codecs
+import itertools
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from attrs import define, field
+
+from utils.utils_cache import (
+    CacheWriter,
+    OverpassCache,
+    quantizeBbox,
+    splitTiles,
+    tileBbox,
+)
+from utils.utils_pyproj import Reprojector, getBbox
+
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "http://overpass-api.de/api/interpreter")
+OVERPASS_QUERY_VERSION = 1  # bump when the query changes to invalidate cached responses
+TILE_METERS = 1000.0  # areas wider than this are fetched as a grid of tiles
+MAX_CONCURRENT_REQUESTS = 2  # overpass-api.de grants two slots per client
+CHUNK_SIZE = 1 << 16
+
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+@define
+class OsmMember:
+    type: str
+    ref: int
+    role: str
+
+
+@define
+class OsmRelation:
+    id: int
+    members: List[OsmMember]
+    tags: Dict[str, str] = field(factory=dict)
+
+
+@define
+class OsmElements:
+    """Columnar store of an Overpass response, shared by the building and road builders.
+
+    Nodes are parallel ID/lat/lon columns, way node lists are stored CSR-style
+    (offsets into one flat column of node IDs) and way tags as key/value
+    indices into a table of interned strings. Columns grow in ``array.array``
+    buffers while elements stream in and are read back as NumPy arrays, so
+    add everything before reading: a live view blocks further appends.
+    Relations are few and stay as typed objects.
+    """
+
+    relations: List[OsmRelation] = field(factory=list)
+    _node_id: array = field(factory=lambda: array("q"))
+    _node_lat: array = field(factory=lambda: array("d"))
+    _node_lon: array = field(factory=lambda: array("d"))
+    _way_id: array = field(factory=lambda: array("q"))
+    _way_offsets: array = field(factory=lambda: array("q", [0]))
+    _way_refs: array = field(factory=lambda: array("q"))
+    _tag_offsets: array = field(factory=lambda: array("q", [0]))
+    _tag_keys: array = field(factory=lambda: array("q"))
+    _tag_values: array = field(factory=lambda: array("q"))
+    _strings: Dict[str, int] = field(factory=dict)
+    _string_list: List[str] = field(factory=list)
+    _way_ids: set = field(factory=set)
+    _relation_ids: set = field(factory=set)
+    _columns: Dict[object, object] = field(factory=dict)
+
+    @classmethod
+    def from_features(cls, features: Iterable[dict]) -> "OsmElements":
+        elements = cls()
+        for feature in features:
+            elements.add(feature)
+        return elements
+
+    def add(self, feature: dict) -> None:
+        """Add one Overpass element, elements seen before are skipped by ID."""
+        kind = feature["type"]
+        if kind == "node":
+            # duplicates are dropped when the node columns are first read
+            self._node_id.append(feature["id"])
+            self._node_lat.append(feature["lat"])
+            self._node_lon.append(feature["lon"])
+        elif kind == "way":
+            if feature["id"] in self._way_ids:
+                return
+            self._way_ids.add(feature["id"])
+            self._way_id.append(feature["id"])
+            self._way_refs.extend(feature["nodes"])
+            self._way_offsets.append(len(self._way_refs))
+            for k, v in feature.get("tags", {}).items():
+                self._tag_keys.append(self._intern(k))
+                self._tag_values.append(self._intern(v))
+            self._tag_offsets.append(len(self._tag_keys))
+        elif kind == "relation":
+            if feature["id"] in self._relation_ids:
+                return
+            self._relation_ids.add(feature["id"])
+            members = [
+                OsmMember(m["type"], m["ref"], m.get("role", ""))
+                for m in feature.get("members", [])
+            ]
+            self.relations.append(
+                OsmRelation(feature["id"], members, feature.get("tags", {}))
+            )
+        else:
+            return
+        self._columns.clear()
+
+    def _intern(self, text: str) -> int:
+        index = self._strings.get(text)
+        if index is None:
+            index = self._strings[text] = len(self._string_list)
+            self._string_list.append(text)
+        return index
+
+    def _column(self, name: str, build: Callable[[], object]):
+        if name not in self._columns:
+            self._columns[name] = build()
+        return self._columns[name]
+
+    def _nodes(self) -> Tuple[np.ndarray, np.ndarray]:
+        def build():
+            ids = np.frombuffer(self._node_id, dtype=np.int64)
+            unique, first = np.unique(ids, return_index=True)
+            return unique, first
+
+        return self._column("nodes", build)
+
+    @property
+    def node_ids(self) -> np.ndarray:
+        """Sorted unique node IDs, row order of all node columns."""
+        return self._nodes()[0]
+
+    @property
+    def node_lat(self) -> np.ndarray:
+        return np.frombuffer(self._node_lat, dtype=float)[self._nodes()[1]]
+
+    @property
+    def node_lon(self) -> np.ndarray:
+        return np.frombuffer(self._node_lon, dtype=float)[self._nodes()[1]]
+
+    def node_rows(self, ids) -> np.ndarray:
+        """Rows of the given node IDs, -1 for IDs not in the response."""
+        node_ids = self.node_ids
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(node_ids) == 0:
+            return np.full(ids.shape, -1)
+        rows = np.searchsorted(node_ids, ids)
+        rows[rows == len(node_ids)] = 0
+        return np.where(node_ids[rows] == ids, rows, -1)
+
+    def node_coords(self, projectedCrs) -> np.ndarray:
+        """(N, 2) projected coords in node row order, projected once per CRS."""
+
+        def build():
+            reprojector = Reprojector.from_crs("EPSG:4326", projectedCrs)
+            xs, ys = reprojector.reproject_arrays(self.node_lon, self.node_lat)
+            return np.column_stack([xs, ys])
+
+        return self._column(("coords", projectedCrs), build)
+
+    @property
+    def way_ids(self) -> np.ndarray:
+        return np.frombuffer(self._way_id, dtype=np.int64)
+
+    @property
+    def way_offsets(self) -> np.ndarray:
+        return np.frombuffer(self._way_offsets, dtype=np.int64)
+
+    @property
+    def way_refs(self) -> np.ndarray:
+        """Node IDs of all ways, way i spans way_offsets[i]:way_offsets[i + 1]."""
+        return np.frombuffer(self._way_refs, dtype=np.int64)
+
+    def way_nodes(self, row: int) -> np.ndarray:
+        return self.way_refs[self._way_offsets[row] : self._way_offsets[row + 1]]
+
+    def way_tags(self, row: int) -> Dict[str, str]:
+        start, end = self._tag_offsets[row], self._tag_offsets[row + 1]
+        return {
+            self._string_list[k]: self._string_list[v]
+            for k, v in zip(self._tag_keys[start:end], self._tag_values[start:end])
+        }
+
+    def way_rows(self, keyword: str, tagged: bool = True) -> np.ndarray:
+        """Rows of ways with (or, with tagged=False, without) the keyword tag."""
+
+        def build():
+            counts = np.diff(np.frombuffer(self._tag_offsets, dtype=np.int64))
+            owner = np.repeat(np.arange(len(counts)), counts)
+            key = self._strings.get(keyword, -1)
+            has_key = np.zeros(len(counts), dtype=bool)
+            has_key[owner[np.frombuffer(self._tag_keys, dtype=np.int64) == key]] = True
+            return has_key
+
+        has_key = self._column(("key", keyword), build)
+        return np.flatnonzero(has_key if tagged else ~has_key)
+
+    def way_rows_by_id(self, ids) -> np.ndarray:
+        """Rows of the given way IDs, -1 for IDs not in the response."""
+
+        def build():
+            order = np.argsort(self.way_ids, kind="stable")
+            return order, self.way_ids[order]
+
+        order, sorted_ids = self._column("way_order", build)
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(sorted_ids) == 0:
+            return np.full(ids.shape, -1)
+        pos = np.searchsorted(sorted_ids, ids)
+        pos[pos == len(sorted_ids)] = 0
+        return np.where(sorted_ids[pos] == ids, order[pos], -1)
+
+    def tagged_relations(self, keyword: str) -> List[OsmRelation]:
+        return [r for r in self.relations if keyword in r.tags]
+
+    def relation_rings(
+        self, relation: OsmRelation
+    ) -> Tuple[List[List[int]], List[List[int]]]:
+        """Closed outer and inner rings (node IDs) of a multipolygon relation.
+
+        Members with an empty role count as outer, as many older multipolygons
+        in OSM are tagged that way.
+        """
+        refs = {"outer": [], "inner": []}
+        for m in relation.members:
+            if m.type != "way":
+                continue
+            refs["inner" if m.role == "inner" else "outer"].append(m.ref)
+
+        rings = []
+        for role in ("outer", "inner"):
+            rows = self.way_rows_by_id(refs[role])
+            segments = [self.way_nodes(r).tolist() for r in rows if r >= 0]
+            rings.append(stitchRings(segments))
+        return rings[0], rings[1]
+
+
+def stitchRings(segments: List[List[int]]) -> List[List[int]]:
+    """Join way segments sharing end nodes into closed rings, in linear time.
+
+    Segments are reversed where needed; a chain that cannot be closed is
+    closed with a straight edge back to its first node.
+    """
+    rings = []
+    by_end: Dict[int, List[int]] = {}
+    for i, seg in enumerate(segments):
+        if len(seg) < 2:
+            continue
+        if seg[0] == seg[-1]:
+            rings.append(list(seg))
+            continue
+        by_end.setdefault(seg[0], []).append(i)
+        by_end.setdefault(seg[-1], []).append(i)
+
+    used = set()
+    for start, seg in enumerate(segments):
+        if start in used or len(seg) < 2 or seg[0] == seg[-1]:
+            continue
+        used.add(start)
+        ring = list(segments[start])
+        while ring[-1] != ring[0]:
+            candidates = [i for i in by_end.get(ring[-1], []) if i not in used]
+            if not candidates:
+                ring.append(ring[0])
+                break
+            nxt = candidates[0]
+            used.add(nxt)
+            seg = segments[nxt]
+            ring.extend(seg[1:] if seg[0] == ring[-1] else seg[-2::-1])
+        rings.append(ring)
+    return rings
+
+
+def overpassQuery(bbox: Tuple[float, float, float, float], keywords: List[str]) -> str:
+    """Union query for nodes, ways and relations tagged with any of the keywords."""
+    south, west, north, east = bbox
+    box = f"({south},{west},{north},{east})"
+    statements = "".join(
+        f"""
+    node["{k}"]{box};
+    way["{k}"]{box};
+    relation["{k}"]{box};"""
+        for k in keywords
+    )
+    return f"""[out:json];
+    ({statements}
+    );out body;>;out skel qt;"""
+
+
+def iterElements(chunks: Iterable[bytes], meta: Optional[dict] = None) -> Iterator[dict]:
+    """Yield the objects of the top-level "elements" array as chunks arrive.
+
+    Only the undecoded tail of the body is buffered, so memory is bounded by
+    the chunk size and the largest single element. Top-level keys following
+    the array (Overpass puts "remark" there) are decoded into meta.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    state = "head"
+    tail = []
+
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        buffer = buffer[pos:] + utf8.decode(b"" if final else chunk, final=final)
+        pos = 0
+
+        if state == "head":
+            start = buffer.find('"elements"')
+            if start < 0:
+                # keep enough to match the key across a chunk border
+                pos = max(0, len(buffer) - len('"elements"'))
+                continue
+            bracket = buffer.find("[", start)
+            if bracket < 0:
+                pos = start
+                continue
+            pos = bracket + 1
+            state = "array"
+
+        if state == "array":
+            while True:
+                pos = _SEPARATORS.match(buffer, pos).end()
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == "]":
+                    pos += 1
+                    state = "tail"
+                    break
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # element continues in the next chunk
+                pos = end
+                yield element
+
+        if state == "tail":
+            tail.append(buffer[pos:])
+            pos = len(buffer)
+
+    if state != "tail":
+        raise ValueError("Overpass response has no complete elements array")
+    if meta is not None:
+        rest = "".join(tail).strip().lstrip(",").strip()
+        if rest.startswith('"'):
+            try:
+                meta.update(json.loads("{" + rest))
+            except json.JSONDecodeError:
+                pass
+
+
+def fetchElements(
+    lat: float,
+    lon: float,
+    r: float,
+    keywords: Optional[List[str]] = None,
+    cache: Optional[OverpassCache] = None,
+    tileMeters: Optional[float] = TILE_METERS,
+    maxWorkers: int = MAX_CONCURRENT_REQUESTS,
+) -> OsmElements:
+    """Query Overpass for all keywords and parse the response once.
+
+    The bbox is snapped to the cache tile grid, so repeated runs for the same
+    location are served from the on-disk cache without touching the network.
+    Areas wider than tileMeters are split into a grid of tiles fetched by at
+    most maxWorkers threads; elements repeated across tiles are merged by ID.
+    Responses are decoded while they download, element by element.
+    """
+    if keywords is None:
+        keywords = ["building", "highway"]
+    if cache is None:
+        cache = OverpassCache.from_env()
+
+    tiles = quantizeBbox(getBbox(lat, lon, r))
+    splits = math.ceil(2 * r / tileMeters) if tileMeters else 1
+    grid = splitTiles(tiles, splits)
+
+    elements = OsmElements()
+    if len(grid) == 1:
+        _fetchTile(grid[0], keywords, cache, elements.add)
+        return elements
+
+    lock = threading.Lock()
+
+    def add(feature: dict) -> None:
+        with lock:
+            elements.add(feature)
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        list(pool.map(lambda t: _fetchTile(t, keywords, cache, add), grid))
+    return elements
+
+
+def _fetchTile(
+    tiles: Tuple[int, int, int, int],
+    keywords: List[str],
+    cache: Optional[OverpassCache],
+    sink: Callable[[dict], None],
+) -> None:
+    key = OverpassCache.key(tiles, keywords, OVERPASS_QUERY_VERSION)
+
+    reader = cache.open(key) if cache is not None else None
+    if reader is not None:
+        try:
+            with reader:
+                for element in iterElements(iter(lambda: reader.read(CHUNK_SIZE), b"")):
+                    sink(element)
+            return
+        except (OSError, EOFError, ValueError):
+            # corrupt entry, refetch; elements already added are deduplicated by ID
+            cache.discard(key)
+
+    writer = cache.writer(key) if cache is not None else None
+    meta = {}
+    try:
+        for element in iterElements(_streamOverpass(tileBbox(tiles), keywords, writer), meta):
+            sink(element)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        # Overpass reports timeouts and quota errors as a remark next to partial data
+        if "remark" in meta:
+            writer.abort()
+        else:
+            writer.commit()
+
+
+def _streamOverpass(
+    bbox: Tuple[float, float, float, float],
+    keywords: List[str],
+    writer: Optional[CacheWriter] = None,
+) -> Iterator[bytes]:
+    import requests
+
+    query = overpassQuery(bbox, keywords)
+    with requests.get(OVERPASS_URL, params={"data": query}, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if writer is not None:
+                writer.write(chunk)
+            yield chunk
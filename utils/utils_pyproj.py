@@ -1,6 +1,8 @@
 from abc import abstractmethod
+from functools import lru_cache
 from typing import Callable, Protocol
 
+import numpy as np
 from attrs import define
 from pyproj import CRS, Transformer
 from specklepy.objects.other import Any
@@ -21,8 +23,14 @@ def _create_coordinate_reference_system(location: Location) -> CRS:
     return crs
 
 
+@lru_cache(maxsize=16)
+def _get_transformer(crs_from, crs_to) -> Transformer:
+    """Build a transformer once per CRS pair, creating one is expensive."""
+    return Transformer.from_crs(crs_from, crs_to, always_xy=True)
+
+
 def _reproject_to_crs(location: Location, crs_from, crs_to, direction="FORWARD"):
-    transformer = Transformer.from_crs(crs_from, crs_to, always_xy=True)
+    transformer = _get_transformer(crs_from, crs_to)
     pt = transformer.transform(
         location.longitude, location.latitude, direction=direction
     )
@@ -30,6 +38,31 @@ def _reproject_to_crs(location: Location, crs_from, crs_to, direction="FORWARD")
     return pt[0], pt[1]
 
 
+@define
+class _LatLon:
+    latitude: float
+    longitude: float
+
+
+def createCRS(lat: float, lon: float) -> CRS:
+    """Create a local transverse mercator CRS centered at lat, lon."""
+    return _create_coordinate_reference_system(_LatLon(lat, lon))
+
+
+def reprojectToCrs(lat: float, lon: float, crs_from, crs_to, direction="FORWARD"):
+    """Reproject a single lat, lon (or y, x) pair between two CRS."""
+    return _reproject_to_crs(_LatLon(lat, lon), crs_from, crs_to, direction)
+
+
+def getBbox(lat: float, lon: float, r: float) -> tuple[float, float, float, float]:
+    """Get (south, west, north, east) of a square with half-size r meters."""
+    projectedCrs = createCRS(lat, lon)
+    lonPlus1, latPlus1 = reprojectToCrs(1, 1, projectedCrs, "EPSG:4326")
+    scaleX = lonPlus1 - lon
+    scaleY = latPlus1 - lat
+    return lat - r * scaleY, lon - r * scaleX, lat + r * scaleY, lon + r * scaleX
+
+
 TransformerCallable = Callable[[float, float, bool, bool, str], tuple[float, float]]
 
 
@@ -45,6 +78,10 @@ class Reprojector:
 
         return Reprojector(transformer.transform)  # type: ignore
 
+    @classmethod
+    def from_crs(cls, crs_from, crs_to) -> "Reprojector":
+        return Reprojector(_get_transformer(crs_from, crs_to).transform)  # type: ignore
+
     def reproject(self, location: Location, direction="FORWARD") -> tuple[float, float]:
         try:
             p1, p2 = self._transformer(
@@ -54,6 +91,20 @@ class Reprojector:
             raise ValueError("Wrong key")
         return p1, p2
 
+    def reproject_arrays(
+        self, longitudes: np.ndarray, latitudes: np.ndarray, direction="FORWARD"
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Reproject whole coordinate arrays in a single transformer call."""
+        try:
+            xs, ys = self._transformer(  # type: ignore
+                np.asarray(longitudes, dtype=float),
+                np.asarray(latitudes, dtype=float),
+                direction=direction,
+            )
+        except KeyError:
+            raise ValueError("Wrong key")
+        return np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+
 
 class LocationWithRadius(Protocol):
     latitude: float
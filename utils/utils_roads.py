@@ -0,0 +1,100 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+import shapely
+from specklepy.objects import Base
+
+from utils.utils_extrusion import Footprints, fillFootprints
+from utils.utils_other import COLOR_ROAD
+
+CLIP_CELL = 50.0  # m, bounds the polygons handed to ear clipping
+
+
+def unionByGrid(polygons: np.ndarray, cell: float) -> np.ndarray:
+    """Union of polygons, cut along a square grid into small polygons.
+
+    A merged street network is one polygon with a hole per block. Clipping
+    every polygon to the cells it overlaps and merging cell by cell keeps
+    both the union and the triangulation of the pieces linear in the size
+    of the network.
+    """
+    polygons = polygons[~shapely.is_empty(polygons)]
+    if len(polygons) == 0:
+        return np.empty(0, dtype=object)
+    xmin, ymin, xmax, ymax = shapely.total_bounds(polygons)
+    xs = np.arange(xmin, xmax + cell, cell)
+    ys = np.arange(ymin, ymax + cell, cell)
+    x0, y0 = (a.ravel() for a in np.meshgrid(xs[:-1], ys[:-1]))
+    x1, y1 = (a.ravel() for a in np.meshgrid(xs[1:], ys[1:]))
+    cells = shapely.box(x0, y0, x1, y1)
+
+    cell_of, polygon_of = shapely.STRtree(polygons).query(cells, predicate="intersects")
+    clipped = shapely.intersection(polygons[polygon_of], cells[cell_of])
+    bounds = np.flatnonzero(np.diff(cell_of)) + 1
+    merged = [shapely.union_all(group) for group in np.split(clipped, bounds)]
+    pieces = shapely.get_parts(np.asarray(merged, dtype=object))
+    return pieces[shapely.get_type_id(pieces) == 3]
+
+
+def polygonRings(polygons: np.ndarray) -> Footprints:
+    """Rings of shapely polygons as flat footprints, one per polygon.
+
+    Empty polygons keep their slot and produce no rings.
+    """
+    rings, ring_polygon = shapely.get_rings(polygons, return_index=True)
+    coords, ring_of_coord = shapely.get_coordinates(rings, return_index=True)
+    lengths = np.bincount(ring_of_coord, minlength=len(rings))
+
+    # rings come back closed, drop the repeated end point
+    keep = np.ones(len(coords), dtype=bool)
+    keep[np.cumsum(lengths) - 1] = False
+    lengths = lengths - 1
+
+    first = np.ones(len(rings), dtype=bool)
+    first[1:] = ring_polygon[1:] != ring_polygon[:-1]
+    return Footprints(
+        coords=coords[keep],
+        ring_offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        ring_building=ring_polygon.astype(np.int64),
+        ring_hole=~first,
+        heights=np.zeros(len(polygons)),
+    )
+
+
+def roadSurfaces(
+    lines: Sequence[np.ndarray],
+    halfWidths: Sequence[Optional[float]],
+    colors=COLOR_ROAD,
+    union: bool = False,
+) -> List[Optional[Base]]:
+    """Road surface meshes of all centerlines from one vectorized buffer call.
+
+    ``lines`` are (N, 2) coordinates, ``halfWidths`` the buffer distance of
+    each; roads with no width or fewer than two points give None. With
+    ``union`` the buffers are merged where roads overlap and a single
+    surface for the whole network is returned instead of one per road.
+    """
+    lines = [np.asarray(c, dtype=float).reshape(-1, 2) for c in lines]
+    widths = np.array([np.nan if w is None else w for w in halfWidths], dtype=float)
+    valid = np.array([len(c) >= 2 for c in lines], dtype=bool) & ~np.isnan(widths)
+    picked = np.flatnonzero(valid)
+    colors = np.broadcast_to(np.asarray(colors, dtype=np.int64), (len(lines),))
+
+    if len(picked):
+        coords = np.concatenate([lines[i] for i in picked])
+        index = np.repeat(np.arange(len(picked)), [len(lines[i]) for i in picked])
+        centerlines = shapely.linestrings(coords, indices=index)
+        polygons = shapely.buffer(centerlines, widths[picked], cap_style="square")
+    else:
+        polygons = np.empty(0, dtype=object)
+
+    if union:
+        pieces = unionByGrid(polygons, CLIP_CELL)
+        mesh = fillFootprints(polygonRings(pieces), COLOR_ROAD).merged()
+        return [Base(units="m", displayValue=[mesh])]
+
+    surfaces = fillFootprints(polygonRings(polygons), colors[picked]).meshes()
+    result: List[Optional[Base]] = [None] * len(lines)
+    for i, mesh in zip(picked, surfaces):
+        result[i] = Base(units="m", displayValue=[mesh], width=2 * float(widths[i]))
+    return result
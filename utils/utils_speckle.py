@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+from attrs import define, field
+from specklepy.objects import Base
+from specklepy.objects.geometry import Mesh, Polyline
+from specklepy.objects.other import BlockDefinition, BlockInstance, Transform
+from specklepy.serialization.base_object_serializer import BaseObjectSerializer
+from specklepy.transports.abstract_transport import AbstractTransport
+from specklepy.transports.server import ServerTransport
+
+from utils.utils_cache import DISABLED
+
+Closure = Dict[str, int]  # every detached descendant of an object with its depth
+SentObject = Tuple[str, Closure]
+
+GEOMETRY_QUANTUM = 1e-3  # m, meshes closer than this count as the same geometry
+OBJECT_CACHE_DIR_ENV = "OBJECT_CACHE_DIR"
+PRIMITIVES = (int, float, str, bool)
+KEYED_TYPES = (Mesh, Polyline)  # geometry stored and reused by content key
+_COORDINATE_MEMBERS = {"vertices", "value"}  # flat xyz lists
+_GEOMETRY_MEMBERS = {"vertices", "faces", "colors", "textureCoordinates"}
+_IGNORED_MEMBERS = {"id", "totalChildrenCount"}
+
+
+class ObjectReference(Base, speckle_type="Speckle.Context.ObjectReference"):
+    """Stand-in for an object sent before, written as a reference to its ID.
+
+    Only ReferenceSerializer knows it; it must sit in a detached property
+    (such as ``Collection.elements``) so the reference resolves on receive.
+    """
+
+    referencedId: str = None
+
+    @classmethod
+    def create(cls, referencedId: str, closure: Closure) -> "ObjectReference":
+        reference = cls(referencedId=referencedId)
+        reference._closure = dict(closure)
+        return reference
+
+
+def _quantized(coordinates: Optional[List[float]], quantum: float) -> np.ndarray:
+    coordinates = np.asarray(coordinates or [], dtype=float).reshape(-1, 3)
+    return np.rint(coordinates / quantum).astype(np.int64)
+
+
+def geometryKey(
+    geometry: Base,
+    quantum: float = GEOMETRY_QUANTUM,
+    corner: Optional[np.ndarray] = None,
+) -> Optional[str]:
+    """Content hash of a mesh or polyline with its points snapped to ``quantum``.
+
+    With ``corner`` (in quanta) the points are taken relative to it, so
+    translated copies share a key. None for other objects and for geometry
+    carrying members other than primitives, number lists and objects of
+    primitives, which the hash does not cover.
+    """
+    if not isinstance(geometry, KEYED_TYPES):
+        return None
+    h = hashlib.blake2b(digest_size=16)
+    others = {}
+    for name in geometry.get_serializable_attributes():
+        value = getattr(geometry, name, None)
+        if name in _IGNORED_MEMBERS:
+            continue
+        if name in _COORDINATE_MEMBERS:
+            points = _quantized(value, quantum)
+            if corner is not None:
+                points = points - corner
+            h.update(name.encode() + points.tobytes())
+        elif isinstance(value, list):
+            numbers = np.asarray(value)
+            if numbers.dtype.kind not in "iuf":
+                return None
+            h.update(name.encode() + numbers.astype(float).tobytes())
+        elif value is None or isinstance(value, PRIMITIVES):
+            others[name] = value
+        elif isinstance(value, Base):
+            # small members such as a polyline domain
+            members = {n: getattr(value, n, None) for n in value.get_member_names()}
+            values = members.values()
+            if not all(v is None or isinstance(v, PRIMITIVES) for v in values):
+                return None
+            others[name] = members
+        else:
+            return None
+    h.update(json.dumps(others, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def _displayedMesh(obj: Base) -> Optional[Mesh]:
+    # plain meshes and plain Bases showing one mesh, as the layer builders make them
+    if isinstance(obj, Mesh):
+        return obj
+    display = getattr(obj, "displayValue", None)
+    if type(obj) is Base and isinstance(display, list) and len(display) == 1:
+        if isinstance(display[0], Mesh):
+            return display[0]
+    return None
+
+
+def shareGeometry(
+    objects: List[Base], quantum: float = GEOMETRY_QUANTUM
+) -> List[Base]:
+    """Objects whose meshes repeat, as instances of one shared definition.
+
+    Meshes are compared by their geometryKey relative to their lowest
+    corner. Every group of two or more becomes one BlockDefinition, detached
+    and sent once, and a BlockInstance per object translating it into place;
+    members of a wrapping Base (such as the road width) move to the instance.
+    Objects without a repeat are returned as they are.
+    """
+    groups: Dict[str, List[Tuple[int, np.ndarray]]] = {}
+    for k, obj in enumerate(objects):
+        mesh = _displayedMesh(obj)
+        if mesh is None:
+            continue
+        vertices = _quantized(mesh.vertices, quantum)
+        if not len(vertices):
+            continue
+        corner = vertices.min(axis=0)
+        key = geometryKey(mesh, quantum, corner)
+        if key is not None:
+            groups.setdefault(key, []).append((k, corner))
+
+    shared = list(objects)
+    for key, group in groups.items():
+        if len(group) < 2:
+            continue
+        first, corner = group[0]
+        mesh = _displayedMesh(objects[first])
+        vertices = (_quantized(mesh.vertices, quantum) - corner) * quantum
+        local = Mesh.create(
+            vertices=vertices.ravel().tolist(),
+            faces=list(mesh.faces),
+            colors=list(mesh.colors or []),
+            texture_coordinates=list(mesh.textureCoordinates or []),
+        )
+        for name in mesh.get_serializable_attributes():
+            if name not in _GEOMETRY_MEMBERS and name not in _IGNORED_MEMBERS:
+                setattr(local, name, getattr(mesh, name, None))
+        units = objects[first].units
+        definition = BlockDefinition(name=key, geometry=[local], units=units)
+
+        for k, corner in group:
+            x, y, z = (corner * quantum).tolist()
+            instance = BlockInstance(
+                definition=definition,
+                transform=Transform(
+                    matrix=[1, 0, 0, x, 0, 1, 0, y, 0, 0, 1, z, 0, 0, 0, 1],
+                    units=objects[k].units,
+                ),
+                units=objects[k].units,
+            )
+            if not isinstance(objects[k], Mesh):
+                for name in objects[k].get_dynamic_member_names():
+                    if name != "displayValue":
+                        setattr(instance, name, getattr(objects[k], name))
+            shared[k] = instance
+    return shared
+
+
+@define
+class GeometryIndex:
+    """Sent geometry by content key: known from earlier runs, and used in this one."""
+
+    known: Dict[str, SentObject] = field(factory=dict)
+    used: Dict[str, SentObject] = field(factory=dict)
+
+    def get(self, key: str) -> Optional[SentObject]:
+        sent = self.used.get(key) or self.known.get(key)
+        if sent is not None:
+            self.used[key] = sent
+        return sent
+
+    def add(self, key: str, sent: SentObject) -> None:
+        self.used[key] = sent
+
+    def verify(self, transport: AbstractTransport) -> None:
+        """Forget known geometry whose object or children transport lacks.
+
+        The forgotten geometry is written again in full the next time it is sent.
+        """
+        ids = {i for objId, closure in self.known.values() for i in [objId, *closure]}
+        present = existingObjects(transport, sorted(ids))
+        self.known = {
+            key: (objId, closure)
+            for key, (objId, closure) in self.known.items()
+            if present.get(objId) and all(present.get(c) for c in closure)
+        }
+
+
+def existingObjects(transport: AbstractTransport, ids: List[str]) -> Dict[str, bool]:
+    """Which of the IDs a transport holds.
+
+    ServerTransport.has_objects reports every ID as missing, so the server is
+    asked through the diff endpoint its uploads use; if that request fails
+    every ID counts as missing.
+    """
+    if isinstance(transport, MeteredTransport):
+        transport = transport.transport
+    if not ids or not isinstance(transport, ServerTransport):
+        return transport.has_objects(ids) if ids else {}
+    try:
+        response = transport.session.post(
+            f"{transport.url}/api/diff/{transport.stream_id}",
+            data={"objects": json.dumps(ids)},
+        )
+        response.raise_for_status()
+        present = response.json()
+    except (requests.RequestException, ValueError):
+        present = {}
+    return {i: bool(present.get(i)) for i in ids}
+
+
+@define
+class ObjectIdCache:
+    """IDs of the geometry sent to every project, one JSON file per server and project.
+
+    Only the geometry used by the last run is kept, so a project's entry
+    stays as large as its context. The objects may have been deleted on the
+    server since, check the loaded index with GeometryIndex.verify.
+    """
+
+    directory: Path
+
+    @classmethod
+    def from_env(cls) -> Optional["ObjectIdCache"]:
+        """Cache in OBJECT_CACHE_DIR, or the user cache dir; None if disabled."""
+        directory = os.environ.get(OBJECT_CACHE_DIR_ENV)
+        if directory is None:
+            directory = str(Path.home() / ".cache" / "speckle_context" / "objects")
+        if directory.strip().lower() in DISABLED:
+            return None
+        return cls(Path(directory))
+
+    def _path(self, server: str, projectId: str) -> Path:
+        name = f"{server.rstrip('/')}_{projectId}"
+        return self.directory / (re.sub(r"[^\w.-]", "_", name) + ".json")
+
+    def load(self, server: str, projectId: str) -> GeometryIndex:
+        try:
+            data = json.loads(self._path(server, projectId).read_text())
+            known = {k: (v[0], dict(v[1])) for k, v in data.items()}
+        except (OSError, ValueError, TypeError, IndexError, AttributeError):
+            known = {}
+        return GeometryIndex(known)
+
+    def save(self, server: str, projectId: str, index: GeometryIndex) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(server, projectId)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps(index.used))
+        os.replace(tmp, path)
+
+
+class MeteredTransport(AbstractTransport):
+    """Passes writes on to another transport, counting objects and bytes."""
+
+    def __init__(self, transport: AbstractTransport):
+        self.transport = transport
+        self.objects = 0
+        self.bytes = 0
+
+    @property
+    def name(self) -> str:
+        return f"Metered{self.transport.name}"
+
+    def begin_write(self) -> None:
+        self.transport.begin_write()
+
+    def end_write(self) -> None:
+        self.transport.end_write()
+
+    def save_object(self, id: str, serialized_object: str) -> None:
+        self.objects += 1
+        self.bytes += len(serialized_object.encode())
+        self.transport.save_object(id, serialized_object)
+
+    def save_object_from_transport(
+        self, id: str, source_transport: AbstractTransport
+    ) -> None:
+        self.transport.save_object_from_transport(id, source_transport)
+
+    def get_object(self, id: str) -> Optional[str]:
+        return self.transport.get_object(id)
+
+    def has_objects(self, id_list: List[str]) -> Dict[str, bool]:
+        return self.transport.has_objects(id_list)
+
+    def copy_object_and_children(
+        self, id: str, target_transport: AbstractTransport
+    ) -> str:
+        return self.transport.copy_object_and_children(id, target_transport)
+
+
+class ReferenceSerializer(BaseObjectSerializer):
+    """Serializer that writes every object once and links it afterwards.
+
+    ObjectReferences are linked instead of traversed, and so is any object
+    already written during this send, like a definition shared by many
+    instances. With a GeometryIndex, meshes and polylines are stored as objects
+    of their own, and those whose content key was sent before, in this run or
+    an earlier one, are linked to that object instead of being written again. Linked
+    objects' closures are merged into the closures of all parents.
+    """
+
+    def __init__(
+        self,
+        write_transports: Optional[List[AbstractTransport]] = None,
+        geometry: Optional[GeometryIndex] = None,
+    ) -> None:
+        super().__init__(write_transports=write_transports)
+        self.geometry = geometry
+        self._written: Dict[int, Tuple[Base, str, Closure]] = {}
+
+    def _link(self, ref_id: str, closure: Closure) -> Tuple[str, Dict]:
+        detached = self.detach_lineage.pop()
+        depth = len(self.detach_lineage)
+        for parent in self.lineage:
+            tree = self.family_tree.setdefault(parent, {})
+            for child, below in closure.items():
+                if tree.get(child, depth + below + 1) > depth + below:
+                    tree[child] = depth + below
+        # a detaching caller writes the reference itself from the ID
+        if detached:
+            return ref_id, {"id": ref_id}
+        return ref_id, self.detach_helper(ref_id=ref_id)
+
+    def _traverse_base(self, base: Base) -> Tuple[str, Dict]:
+        if isinstance(base, ObjectReference):
+            return self._link(base.referencedId, base._closure)
+        written = self._written.get(id(base))
+        if written is not None:
+            return self._link(written[1], written[2])
+
+        # geometry below the root, by content key
+        key = None
+        nested = len(self.detach_lineage) > 1 and self.write_transports
+        if self.geometry is not None and nested:
+            key = geometryKey(base)
+            sent = self.geometry.get(key) if key is not None else None
+            if sent is not None:
+                return self._link(*sent)
+
+        if key is not None:
+            forced = not self.detach_lineage[-1]
+            self.detach_lineage[-1] = True
+
+        detached = bool(self.detach_lineage) and self.detach_lineage[-1]
+        obj_id, obj = super()._traverse_base(base)
+        if detached and self.write_transports:
+            closure = obj.get("__closure", {})
+            self._written[id(base)] = (base, obj_id, closure)
+            if key is not None:
+                self.geometry.add(key, (obj_id, closure))
+                if forced:
+                    return obj_id, self.detach_helper(ref_id=obj_id)
+        return obj_id, obj
+
+
+def sendObject(
+    base: Base,
+    transports: List[AbstractTransport],
+    geometry: Optional[GeometryIndex] = None,
+) -> SentObject:
+    """Send an object that may contain ObjectReferences; its ID and closure."""
+    serializer = ReferenceSerializer(write_transports=transports, geometry=geometry)
+    obj_id, obj = serializer.traverse_base(base)
+    return obj_id, obj.get("__closure", {})
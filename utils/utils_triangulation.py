@@ -0,0 +1,231 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+Point2 = Tuple[float, float]
+
+
+def _area2(a: Point2, b: Point2, c: Point2) -> float:
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def _inTriangle(p: Point2, a: Point2, b: Point2, c: Point2) -> bool:
+    return _area2(a, b, p) >= 0 and _area2(b, c, p) >= 0 and _area2(c, a, p) >= 0
+
+
+def _clean(pts: List[Point2], ring: List[int]) -> List[int]:
+    """Drop repeated and collinear vertices, they can never be ears."""
+    out: List[int] = []
+    for i in ring:
+        if out and pts[out[-1]] == pts[i]:
+            continue
+        while len(out) >= 2 and _area2(pts[out[-2]], pts[out[-1]], pts[i]) == 0:
+            out.pop()
+        out.append(i)
+    # the seam between the last and the first vertex
+    while len(out) > 3:
+        a, b, c, d = (pts[out[k]] for k in (-2, -1, 0, 1))
+        if b == c or _area2(a, b, c) == 0:
+            out.pop()
+        elif _area2(b, c, d) == 0:
+            out.pop(0)
+        else:
+            break
+    return out
+
+
+def _locallyInside(pts: List[Point2], poly: List[int], k: int, p: Point2) -> bool:
+    """Whether the direction from polygon vertex k to p starts inside the polygon."""
+    u, v, w = pts[poly[k - 1]], pts[poly[k]], pts[poly[(k + 1) % len(poly)]]
+    if _area2(u, v, w) > 0:
+        return _area2(u, v, p) >= 0 and _area2(v, w, p) >= 0
+    return _area2(u, v, p) >= 0 or _area2(v, w, p) >= 0
+
+
+def _bridge(pts: List[Point2], poly: List[int], hole: List[int]) -> List[int]:
+    """Splice a hole into the outer polygon through a mutually visible vertex pair.
+
+    A ray is cast to the right from the rightmost hole vertex; the bridge
+    goes to the hit edge's right end point, or to the polygon vertex inside
+    the triangle spanned by the ray that makes the smallest angle with it.
+    """
+    j = max(range(len(hole)), key=lambda k: pts[hole[k]][0])
+    hx, hy = pts[hole[j]]
+
+    best, target = np.inf, None
+    for k in range(len(poly)):
+        p, q = pts[poly[k]], pts[poly[(k + 1) % len(poly)]]
+        if p[1] == q[1] or (p[1] - hy) * (q[1] - hy) > 0:
+            continue
+        x = p[0] + (hy - p[1]) * (q[0] - p[0]) / (q[1] - p[1])
+        if hx <= x < best:
+            best = x
+            target = k if p[0] > q[0] else (k + 1) % len(poly)
+    if target is None:
+        return poly
+
+    h0 = pts[hole[j]]
+    m = pts[poly[target]]
+    if best != m[0] or hy != m[1]:
+        hit = (best, hy)
+        tri = (h0, m, hit) if m[1] < hy else (h0, hit, m)
+        tan_min = np.inf
+        for k, i in enumerate(poly):
+            p = pts[i]
+            if p[0] <= hx or p == m or not _inTriangle(p, *tri):
+                continue
+            tan = abs(hy - p[1]) / (p[0] - hx)
+            if tan < tan_min and _locallyInside(pts, poly, k, h0):
+                tan_min, target = tan, k
+
+    # earlier bridges duplicate vertices, take the copy that faces the hole
+    m = pts[poly[target]]
+    for k, i in enumerate(poly):
+        if pts[i] == m and _locallyInside(pts, poly, k, h0):
+            target = k
+            break
+
+    h = hole[j:] + hole[:j]
+    return poly[: target + 1] + h + [h[0]] + poly[target:]
+
+
+def earClip(pts: List[Point2], poly: List[int]) -> List[Tuple[int, int, int]]:
+    """Triangulate a simple counter-clockwise polygon given as indices into pts.
+
+    Vertices are kept in a linked list and only reflex vertices, the only
+    ones that can lie inside a convex corner, are tested against ears.
+    """
+    n = len(poly)
+    if n < 3:
+        return []
+    prv = [k - 1 for k in range(n)]
+    prv[0] = n - 1
+    nxt = [k + 1 for k in range(n)]
+    nxt[-1] = 0
+    xy = [pts[i] for i in poly]
+
+    def isReflex(k: int) -> bool:
+        return _area2(xy[prv[k]], xy[k], xy[nxt[k]]) <= 0
+
+    reflex = {k for k in range(n) if isReflex(k)}
+
+    def isEar(k: int) -> bool:
+        if k in reflex:
+            return False
+        a, b, c = xy[prv[k]], xy[k], xy[nxt[k]]
+        x0, x1 = min(a[0], b[0], c[0]), max(a[0], b[0], c[0])
+        y0, y1 = min(a[1], b[1], c[1]), max(a[1], b[1], c[1])
+        for r in reflex:
+            p = xy[r]
+            if p[0] < x0 or p[0] > x1 or p[1] < y0 or p[1] > y1:
+                continue
+            if p != a and p != b and p != c and _inTriangle(p, a, b, c):
+                return False
+        return True
+
+    triangles = []
+    k = 0
+    misses = 0
+    while n > 3:
+        # a full round without an ear means a degenerate polygon, clip anyway
+        if isEar(k) or misses > n:
+            a, c = prv[k], nxt[k]
+            triangles.append((poly[a], poly[k], poly[c]))
+            nxt[a], prv[c] = c, a
+            reflex.discard(k)
+            for j in (a, c):
+                if isReflex(j):
+                    reflex.add(j)
+                else:
+                    reflex.discard(j)
+            n -= 1
+            misses = 0
+            k = a
+        else:
+            k = nxt[k]
+            misses += 1
+    triangles.append((poly[prv[k]], poly[k], poly[nxt[k]]))
+    return triangles
+
+
+def triangulatePolygon(
+    outer: np.ndarray, holes: Sequence[np.ndarray] = ()
+) -> np.ndarray:
+    """(T, 3) triangles of a polygon with holes by ear clipping.
+
+    The outer ring is expected counter-clockwise and the holes clockwise.
+    Indices refer to the outer ring followed by the holes, in order.
+    """
+    pts = [tuple(p) for p in np.asarray(outer, dtype=float).reshape(-1, 2).tolist()]
+    poly = _clean(pts, range(len(pts)))
+    rings = []
+    for hole in holes:
+        start = len(pts)
+        pts += [tuple(p) for p in np.asarray(hole, dtype=float).reshape(-1, 2).tolist()]
+        ring = _clean(pts, range(start, len(pts)))
+        if len(ring) >= 3:
+            rings.append(ring)
+
+    for ring in sorted(rings, key=lambda r: -max(pts[i][0] for i in r)):
+        poly = _bridge(pts, poly, ring)
+    if len(poly) < 3:
+        return np.empty((0, 3), dtype=np.int64)
+    return np.asarray(earClip(pts, poly), dtype=np.int64).reshape(-1, 3)
+
+
+def triangulateRings(
+    coords: np.ndarray,
+    ring_offsets: np.ndarray,
+    ring_polygon: np.ndarray,
+    ring_hole: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Triangles of many polygons stacked as flat rings, indices into coords.
+
+    Every polygon has one outer ring followed by its holes, ``ring_polygon``
+    is non-decreasing; outer rings run counter-clockwise and holes clockwise.
+    Convex polygons without holes, most building footprints, are fanned in
+    one vectorized pass; the rest is ear clipped.
+    Returns the (T, 3) triangles and the polygon of every triangle.
+    """
+    lengths = np.diff(ring_offsets)
+    n = len(coords)
+    ring = np.repeat(np.arange(len(lengths)), lengths)
+    start = ring_offsets[:-1][ring]
+    end = ring_offsets[1:][ring]
+    idx = np.arange(n)
+    nxt = np.where(idx + 1 == end, start, idx + 1)
+    prv = np.where(idx == start, end - 1, idx - 1)
+    d0 = coords - coords[prv]
+    d1 = coords[nxt] - coords
+    turn = d0[:, 0] * d1[:, 1] - d0[:, 1] * d1[:, 0]
+    # collinear vertices come out of projections and buffers with rounding noise
+    scale = np.hypot(*d0.T) * np.hypot(*d1.T)
+    reflex = turn < -1e-9 * scale
+    concave = np.bincount(ring, weights=reflex, minlength=len(lengths)) > 0
+
+    has_hole = np.zeros(len(lengths), dtype=bool)
+    holed = np.unique(ring_polygon[ring_hole])
+    has_hole[~ring_hole] = np.isin(ring_polygon[~ring_hole], holed)
+    fan = ~ring_hole & ~concave & ~has_hole & (lengths >= 3)
+
+    # fan triangles (s, s + k, s + k + 1)
+    fan_len = lengths[fan] - 2
+    fan_ring = np.repeat(np.flatnonzero(fan), fan_len)
+    k = np.arange(len(fan_ring)) - np.repeat(np.cumsum(fan_len) - fan_len, fan_len) + 1
+    s = ring_offsets[:-1][fan_ring]
+    triangles = [np.column_stack([s, s + k, s + k + 1])]
+    owners = [ring_polygon[fan_ring]]
+
+    rest = ~fan & ~ring_hole & (lengths >= 3)
+    first = np.searchsorted(ring_polygon, ring_polygon, side="left")
+    last = np.searchsorted(ring_polygon, ring_polygon, side="right")
+    for r in np.flatnonzero(rest):
+        holes = [h for h in range(first[r], last[r]) if ring_hole[h]]
+        ranges = [np.arange(ring_offsets[r], ring_offsets[r + 1])]
+        ranges += [np.arange(ring_offsets[h], ring_offsets[h + 1]) for h in holes]
+        local = np.concatenate(ranges)
+        tris = triangulatePolygon(coords[ranges[0]], [coords[h] for h in ranges[1:]])
+        triangles.append(local[tris])
+        owners.append(np.full(len(tris), ring_polygon[r]))
+
+    return np.concatenate(triangles).astype(np.int64), np.concatenate(owners)
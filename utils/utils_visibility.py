@@ -1,35 +1,27 @@
 
 import math
+import os
 import random
 from typing import List
 import numpy as np
 from numpy import cross, eye, dot
 from numpy.linalg import norm
-from operator import add, sub
+from specklepy.objects import Base
 from specklepy.objects.geometry import Mesh, Point
-from utils.vectors import createPlane, normalize 
-from utils.convex_shape import remapPt
-from shapely.geometry import Point
-from shapely.geometry.polygon import Polygon
-from utils.scipy_replacement import expm
+from utils.utils_faces import FaceFrames, meshGeometries, meshGeometry, planeHits
+from utils.utils_other import COLOR_VISIBILITY, cleanPtsList, findMeshesNearby, sortPtsByMesh
+from utils.utils_raycast import Bvh, Triangles, castRays
 
 def getAllPlanes(mesh: Mesh) -> List[list]:
     meshList = []
     if isinstance(mesh, Mesh):
-        i = 0
-        fs = mesh.faces
-        for count, f in enumerate(fs):
-            if i >= len(fs)-1: break
-            current_face_index = fs[i]
-            pt_list = []
-            for x in range(i+1, i+fs[i]+1):
-                ind = int(fs[x])
-                pt_list.append( [mesh.vertices[3*ind], mesh.vertices[3*ind+1], mesh.vertices[3*ind+2]] )
-            meshList.append(pt_list)
-            i += fs[i] + 1 
+        meshList.extend(meshGeometry(mesh).polygons())
     elif isinstance(mesh, List):
+        meshes = [m for m in mesh if isinstance(m, Mesh)]
+        geometries = iter(meshGeometries(meshes))
         for m in mesh:
-            meshList.extend(getAllPlanes(m))
+            if isinstance(m, Mesh): meshList.extend(next(geometries).polygons())
+            else: meshList.extend(getAllPlanes(m))
     return meshList
     
 def LinePlaneCollision(planeNormal, planePoint, rayDirection, rayPoint, epsilon=1e-6):
@@ -45,100 +37,74 @@ def LinePlaneCollision(planeNormal, planePoint, rayDirection, rayPoint, epsilon=
     return Psi
 
 def containsPoint(pt: np.array, mesh: List):
-    
-    plane3d = createPlane(*mesh[:3])
-    vert2d = remapPt(pt, True, plane3d)
-    mesh2d = [ remapPt(m, True, plane3d) for m in mesh ]
-
-    point = Point(vert2d[0], vert2d[1])
-    polygon = Polygon([ (m[0], m[1]) for m in mesh2d ])
-    result = polygon.contains(point)
-    return result
+    # single point against a single face, see FaceFrames.contains for batches
+    return bool(FaceFrames.from_polygons([mesh]).contains(np.asarray(pt, dtype=float), [0])[0])
 
 
 def M(axis, theta):
-    # https://stackoverflow.com/questions/6802577/rotation-of-3d-vector
-    
-    return expm(cross(eye(3), axis/norm(axis)*theta))
+    # closed form of expm(cross(eye(3), k*theta)) for a unit axis k (Rodrigues)
+    K = cross(eye(3), axis/norm(axis))
+    return eye(3) + math.sin(theta)*K + (1 - math.cos(theta))*dot(K, K)
 
-def rotate_vector(pt_origin, vector, half_angle_degrees=70, step = 10):
+def rodrigues(vectors: np.ndarray, axes: np.ndarray, thetas: np.ndarray) -> np.ndarray:
+    # rotate every vector around its axis by its angle, (N,3) at once
+    k = axes / norm(axes, axis=-1, keepdims=True)
+    cos = np.cos(thetas)[..., None]
+    sin = np.sin(thetas)[..., None]
+    kv = np.sum(k*vectors, axis=-1, keepdims=True)
+    return vectors*cos + np.cross(k, vectors)*sin + k*kv*(1 - cos)
 
-    half_angle = np.deg2rad(half_angle_degrees)
-
-    vectors = []
-    axis = vector # direction
-    #vectors.append( np.array( list( map(add, pt_origin, vector) )) )
+def rotateXY(vectors: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    # rotate (N,3) vectors in the xy plane
+    cos, sin = np.cos(angles), np.sin(angles)
+    x = vectors[..., 0]*cos - vectors[..., 1]*sin
+    y = vectors[..., 0]*sin + vectors[..., 1]*cos
+    return np.stack([x, y, np.broadcast_to(vectors[..., 2], x.shape)], axis=-1)
 
+def rayFan(vector, half_angle_degrees=70, step = 10) -> np.ndarray:
+    # (N,3) directions of a view cone: rings tilted away from the vector, each spun around it
+    vector = np.asarray(vector, dtype=float)
     count = int(half_angle_degrees/step) # horizontal expansion 
-    for c in range(0, count+1):
-        # xy plane
-        x = vector[0] * math.cos(half_angle*c/count) - vector[1] * math.sin(half_angle*c/count)
-        y = vector[0] * math.sin(half_angle*c/count) + vector[1] * math.cos(half_angle*c/count)
-        
-        v = [x,y,vector[2]]
-        if c==0:
-            vectors.append( np.array( list( map(add, pt_origin, v) )) ) 
-            continue 
-        
-        coeff = 1- math.pow( (count+1 - c) / (count+1), 100)
-        step2 = int( coeff * (count+1 - c) * step ) 
-        if step2 == 0: step2 = 1
-
-        for a in range(0,360,step2): 
-            theta = a*math.pi / 180 
-            M0 = M(vector, theta)
-            newDir = dot(M0,v)
-            vectors.append( np.array( list( map(add, pt_origin, newDir) )) ) 
-
-    return vectors
-
-def projectToPolygon(point: List[float], vectors: List[List[float]], usedVectors: dict, m, index):
-    
-    allIntersections = []
-
-    #meshes = getAllPlanes(mesh)
-    #for x, m in enumerate(meshes): 
-
-    pt1, pt2, pt3 = m[:3]
-    plane = createPlane(pt1, pt2, pt3)
+    if count == 0: return vector[None, :].copy()
 
-    #Define plane
-    planeNormal = np.array(plane["normal"])
-    planePoint = np.array(plane["origin"]) #Any point on the plane
+    c = np.arange(1, count+1)
+    coeff = 1 - np.power( (count+1 - c) / (count+1), 100)
+    step2 = np.maximum( (coeff * (count+1 - c) * step).astype(np.int64), 1 )
+    sizes = -(-360 // step2) # len(range(0, 360, step2))
 
-    #Define ray
-    for i, direct in enumerate(vectors):
-        rayPoint = np.array(point) #Any point along the ray
-        dir = np.array(direct) - rayPoint
+    ring = np.repeat(c, sizes)
+    a = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    thetas = np.deg2rad( a * np.repeat(step2, sizes) )
+    tilted = rotateXY(vector, np.deg2rad(half_angle_degrees) * ring / count)
+    spun = rodrigues(tilted, np.broadcast_to(vector, tilted.shape), thetas)
+    return np.vstack([vector, spun])
 
-        # check collision and its direction 
-        normalOriginal = normalize( dir )
-        collision = LinePlaneCollision(planeNormal, planePoint, dir, rayPoint)
-        if collision is None: continue 
-        normC = normalize( collision-rayPoint )
-        #if int(normalCollision[0]*1000) != int(normalOriginal[0]*1000): 
-        compare1 = normalOriginal[0]*normC[0]
-        compare2 = normalOriginal[1]*normC[1]
-        compare3 = normalOriginal[2]*normC[2]
-        if (compare1>=0 and compare2>=0 and compare3>=0): # or (compare1<0 and compare2<0 and compare3<0) : 
-            pass 
-        else:
-            continue # if different direction 
-
-        result = containsPoint(collision, m)
+def rotate_vector(pt_origin, vector, half_angle_degrees=70, step = 10):
+    # end points of the view cone rays
+    return np.asarray(pt_origin, dtype=float) + rayFan(vector, half_angle_degrees, step)
 
-        if result is True:
+def projectToPolygon(point: List[float], vectors: List[List[float]], usedVectors: dict, m, index, frames: FaceFrames = None, face: int = 0):
+    # all rays against one face at once: plane hits in front of the point, then point-in-polygon
+    # pass the frames of prepared faces to skip rebuilding the plane of m
+    allIntersections = []
+    if frames is None: frames, face = FaceFrames.from_polygons([m]), 0
 
-            pt_intersect = Point.from_list([collision[0], collision[1], collision[2]])
-            pt_intersect.vectorId = i
-            pt_intersect.meshId = index 
-            pt_intersect.distance = np.sqrt(np.sum(( np.array(point) -collision)**2, axis=0))
+    rayPoint = np.asarray(point, dtype=float)
+    dirs = np.asarray(vectors, dtype=float).reshape(-1, 3) - rayPoint
+    faces = np.full(len(dirs), face, dtype=np.int64)
+    t = planeHits(rayPoint[None, :], dirs, frames, faces)
+    ahead = np.flatnonzero(t >= 0)
+    collisions = rayPoint + t[ahead, None] * dirs[ahead]
+    inside = frames.contains(collisions, faces[ahead])
 
-            allIntersections.append(pt_intersect)
+    for i, collision in zip(ahead[inside].tolist(), collisions[inside]):
+        pt_intersect = Point.from_list([collision[0], collision[1], collision[2]])
+        pt_intersect.vectorId = i
+        pt_intersect.meshId = index 
+        pt_intersect.distance = float(norm(rayPoint - collision))
 
-            try: val = usedVectors[i] + 1
-            except: val = 1
-            usedVectors.update({i:val})
+        allIntersections.append(pt_intersect)
+        usedVectors[i] = usedVectors.get(i, 0) + 1
 
     return allIntersections, usedVectors
 
@@ -153,32 +119,141 @@ def expandPtsList(pt_origin, all_pts, usedVectors, step_original, all_geom, mesh
         return
     half_angle = np.deg2rad(half_angle_degrees)
 
+    # 6 rays around every point, tilted by half the original step, all at once
+    origin = np.asarray(pt_origin, dtype=float)
+    axes = np.array([[p.x, p.y, p.z] for p in all_pts]).reshape(-1, 3) - origin
+    tilted = rotateXY(axes, half_angle)
+    offsets = np.array([random.randint(0,10) for _ in all_pts]).reshape(-1, 1)
+    thetas = np.deg2rad( offsets + np.arange(0, 360, 60) )
+    shape = thetas.shape + (3,)
+    allVectors = origin + rodrigues(
+        np.broadcast_to(tilted[:, None, :], shape), np.broadcast_to(axes[:, None, :], shape), thetas
+    )
+
+    frames = FaceFrames.from_polygons(all_geom)
     for i, ptSpeckle in enumerate(all_pts):
-        vectors = []
-        pt = [ptSpeckle.x, ptSpeckle.y, ptSpeckle.z]
-        vector =  np.array( list(map(sub, pt, pt_origin)) ) # direction
-        # xy plane
-        x = vector[0] * math.cos(half_angle) - vector[1] * math.sin(half_angle)
-        y = vector[0] * math.sin(half_angle) + vector[1] * math.cos(half_angle)
-        
-        v = [x,y,vector[2]]
-        axis = vector
-        
-        ran = random.randint(0,10)
-        for a in range(ran,360+ran,60): 
-            theta = a*math.pi / 180 
-            M0 = M(axis, theta)
-            newDir = dot(M0,v)
-            vectors.append( np.array( list( map(add, pt_origin, newDir) )) ) 
+        vectors = allVectors[i]
     
         # project rays 
-        count = 0
-        for mesh in all_geom:
-            if count in ([ptSpeckle.meshId] + mesh_nearby[i]):  
-                pts, usedVectors = projectToPolygon(pt_origin, vectors, {}, mesh, count) #Mesh.create(vertices = [0,0,0,5,0,0,5,19,0,0,14,0], faces=[4,0,1,2,3]))
-                new_pts.extend( pts )
-            count +=1
-        #break
+        for count in sorted(set([ptSpeckle.meshId] + mesh_nearby[i])):
+            if not 0 <= count < len(all_geom): continue
+            pts, usedVectors = projectToPolygon(pt_origin, vectors, {}, all_geom[count], count, frames, count)
+            new_pts.extend( pts )
     return new_pts, usedVectors
 
 
+EYE_HEIGHT = 1.6 # m above the ground
+VISIBILITY_RAYS = 20000 # per viewpoint and analysis
+MAX_VISIBILITY_RAYS = 400000 # whole run, bounds the runtime for many viewpoints
+SURFACE_OFFSET = 0.05 # m, lifts the visible faces off the buildings
+EDGE_RAYS = 6 # finer rays around every hit next to another building
+
+def sphereRays(n: int) -> np.ndarray:
+    # (n,3) unit directions evenly spread over the sphere (Fibonacci lattice)
+    k = np.arange(n) + 0.5
+    z = 1 - 2*k/n
+    r = np.sqrt(1 - z*z)
+    phi = k * math.pi * (3 - math.sqrt(5))
+    return np.column_stack([r*np.cos(phi), r*np.sin(phi), z])
+
+def skyRays(n: int) -> np.ndarray:
+    # (n,3) cosine-weighted upper hemisphere: the share of them reaching the sky is the sky-view factor
+    k = np.arange(n) + 0.5
+    r = np.sqrt(k/n)
+    phi = k * math.pi * (3 - math.sqrt(5))
+    return np.column_stack([r*np.cos(phi), r*np.sin(phi), np.sqrt(1 - r*r)])
+
+def hitPoints(origins: np.ndarray, directions: np.ndarray, hits, ids: np.ndarray) -> List[Point]:
+    # the hits of the rays ids as points tagged for the point helpers in utils_other
+    ends = origins[ids] + directions[ids] * hits.distance[ids, None]
+    pts = []
+    for i, end in zip(ids.tolist(), ends.tolist()):
+        pt = Point.from_list(end)
+        pt.vectorId = i
+        pt.meshId = int(hits.mesh[i])
+        pt.distance = float(hits.distance[i])
+        pts.append(pt)
+    return pts
+
+def edgeCone(axes: np.ndarray, angle: float) -> np.ndarray:
+    # (N*EDGE_RAYS,3) directions tilted by angle around every axis, evenly spun
+    axes = np.asarray(axes, dtype=float).reshape(-1, 3)
+    side = np.cross(axes, [0, 0, 1])
+    vertical = norm(side, axis = 1) < 1e-9
+    side[vertical] = np.cross(axes[vertical], [1, 0, 0])
+    tilted = rodrigues(axes, side, np.full(len(axes), angle))
+    thetas = np.deg2rad(np.arange(0, 360, 360 // EDGE_RAYS))
+    shape = (len(axes), len(thetas), 3)
+    return rodrigues(np.broadcast_to(tilted[:, None], shape), np.broadcast_to(axes[:, None], shape), thetas).reshape(-1, 3)
+
+def visibilityLayer(meshes: List[Mesh], viewpoints: List[List[float]], radius: float, rays: int = VISIBILITY_RAYS, workers: int = None) -> Base:
+    # building faces seen from the viewpoints and the sky-view factor of each viewpoint
+    viewpoints = np.asarray(viewpoints, dtype=float).reshape(-1, 3)
+    if len(viewpoints) == 0: return visibilityBase(np.empty((0, 3, 3)), viewpoints, [])
+    rays = max(1, min(rays, MAX_VISIBILITY_RAYS // (2*len(viewpoints))))
+    if workers is None: workers = os.cpu_count() or 1
+
+    # buildings around a viewpoint (usually the model's own) would hide everything
+    tris = Triangles.from_meshes(meshes)
+    boxes = [g.bbox() for g in meshGeometries(meshes)]
+    lo = np.array([b[0][:2] for b in boxes]).reshape(-1, 2)
+    hi = np.array([b[1][:2] for b in boxes]).reshape(-1, 2)
+    xy = viewpoints[None, :, :2]
+    inside = ((xy >= lo[:, None]) & (xy <= hi[:, None])).all(axis = 2).any(axis = 1)
+    bvh = Bvh.build(tris.take(np.flatnonzero(~inside[tris.mesh])))
+    # nothing left to hide the sky or to be seen
+    if bvh.triangles.count == 0: return visibilityBase(np.empty((0, 3, 3)), viewpoints, np.ones(len(viewpoints)))
+
+    # surface and sky rays of all viewpoints in one batch, large enough for the process pool
+    origins = np.repeat(viewpoints, 2*rays, axis = 0)
+    directions = np.tile(np.vstack([sphereRays(rays), skyRays(rays)]), (len(viewpoints), 1))
+    hits = castRays(bvh, origins, directions, radius, workers)
+    sky = (np.arange(len(origins)) // rays) % 2 == 1
+    skyViewFactor = 1 - hits.hit[sky].reshape(len(viewpoints), rays).mean(axis = 1)
+
+    # hits next to another building mark an edge, a cone at half the ray spacing around them finds the faces in between
+    step = math.sqrt(4*math.pi/rays) # rad between neighbouring sphere rays
+    surface = np.flatnonzero(~sky)
+    points, edges = [], []
+    for v, viewpoint in enumerate(viewpoints):
+        ids = surface[v*rays:(v+1)*rays]
+        pts = hitPoints(origins, directions, hits, ids[hits.hit[ids]])
+        # every ray has one nearest hit, cleanPtsList only drops the ones at the viewpoint
+        cleanPts = cleanPtsList(viewpoint, pts, {p.vectorId: 1 for p in pts})
+        nearby = findMeshesNearby(cleanPts)
+        edges.extend(p.vectorId for p, meshIds in zip(cleanPts, nearby) if any(m != p.meshId for m in meshIds))
+        points.extend(cleanPts)
+    coneOrigins = np.repeat(origins[edges], EDGE_RAYS, axis = 0)
+    coneDirections = edgeCone(directions[edges], step/2)
+    cone = castRays(bvh, coneOrigins, coneDirections, radius, workers)
+    points.extend(hitPoints(coneOrigins, coneDirections, cone, np.flatnonzero(cone.hit)))
+    visibleBuildings = [group[0].meshId for group in sortPtsByMesh(points)]
+
+    # every triangle of a face that was hit, offset towards the viewpoint that saw it
+    tris = bvh.triangles
+    span = tris.face.max(initial = 0) + 1
+    seen = hits.hit & ~sky
+    hitMesh = np.concatenate([hits.mesh[seen], cone.mesh[cone.hit]])
+    hitFace = np.concatenate([hits.face[seen], cone.face[cone.hit]])
+    hitFrom = np.concatenate([origins[seen], coneOrigins[cone.hit]])
+    keys, first = np.unique(hitMesh*span + hitFace, return_index = True)
+    triKeys = tris.mesh*span + tris.face
+    visible = np.flatnonzero(np.isin(triKeys, keys))
+    seenBy = hitFrom[first][np.searchsorted(keys, triKeys[visible])]
+    faces = tris.take(visible)
+
+    normals = np.cross(faces.e1, faces.e2)
+    normals /= np.maximum(norm(normals, axis = 1), 1e-12)[:, None]
+    normals[np.sum(normals * (seenBy - faces.v0), axis = 1) < 0] *= -1
+    corners = np.stack([faces.v0, faces.v0 + faces.e1, faces.v0 + faces.e2], axis = 1)
+    corners += SURFACE_OFFSET * normals[:, None, :]
+
+    return visibilityBase(corners, viewpoints, skyViewFactor, len(keys), visibleBuildings, len(coneDirections))
+
+def visibilityBase(corners: np.ndarray, viewpoints: np.ndarray, skyViewFactor: np.ndarray, visibleFaces: int = 0, visibleBuildings: List[int] = None, edgeRays: int = 0) -> Base:
+    # the layer object: one COLOR_VISIBILITY mesh of (N,3,3) triangle corners and the results
+    count = len(corners)
+    triangles = np.column_stack([np.full(count, 3), np.arange(3*count).reshape(-1, 3)])
+    mesh = Mesh.create(vertices = np.asarray(corners, dtype=float).reshape(-1).tolist(), faces = triangles.reshape(-1).tolist(), colors = [COLOR_VISIBILITY] * (3*count))
+    mesh.units = "m"
+    return Base(units = "m", displayValue = [mesh], viewpoints = viewpoints.tolist(), skyViewFactor = np.asarray(skyViewFactor, dtype=float).tolist(), visibleFaces = visibleFaces, visibleBuildings = visibleBuildings or [], edgeRays = edgeRays)